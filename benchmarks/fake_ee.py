@@ -0,0 +1,152 @@
+import copy
+import json
+import sys
+import types
+
+
+class Geometry:
+    """Client-side geometry: keeps its own copy of the GeoJSON, as ee.Geometry does"""
+
+    def __init__(self, geo_json):
+        if geo_json.get('type') not in ('Polygon', 'MultiPolygon'):
+            raise ValueError(f"Unsupported geometry type: {geo_json.get('type')}")
+        self.geo_json = copy.deepcopy(geo_json)
+
+    def serialize(self):
+        return json.dumps(self.geo_json, separators=(',', ':'))
+
+
+class Feature:
+    def __init__(self, feature):
+        self.geometry = Geometry(feature['geometry'])
+        self.id = feature.get('id')
+        self.properties = dict(feature.get('properties') or {})
+
+    def encode(self):
+        return {'type': 'Feature', 'id': self.id, 'geometry': self.geometry.geo_json,
+                'properties': self.properties}
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        self.features = list(features)
+
+    def serialize(self):
+        """The request payload the real client would send"""
+        return json.dumps({'type': 'FeatureCollection',
+                           'features': [feature.encode() for feature in self.features]},
+                          separators=(',', ':'))
+
+
+class Reducer:
+    """Mean, stdDev and count reducers and their combinations, by output name"""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    @staticmethod
+    def mean():
+        return Reducer(['mean'])
+
+    @staticmethod
+    def stdDev():
+        return Reducer(['stdDev'])
+
+    @staticmethod
+    def count():
+        return Reducer(['count'])
+
+    def combine(self, reducer2, sharedInputs=False):
+        return Reducer(self.outputs + reducer2.outputs)
+
+    def serialize(self):
+        return json.dumps({'reducer': self.outputs})
+
+
+class Image:
+    """Image whose bands are each one constant value, reducible locally.
+
+    A band reduces to its value as the mean, 0 as the standard deviation
+    and PIXELS_PER_REGION as the count in every region.
+    """
+
+    PIXELS_PER_REGION = 100
+
+    def __init__(self, value=0):
+        if isinstance(value, Image):
+            self.bands = dict(value.bands)
+        elif isinstance(value, dict):
+            self.bands = dict(value)
+        else:
+            self.bands = {'constant': float(value)}
+
+    def select(self, selectors):
+        names = list(self.bands)
+        picked = [names[s] if isinstance(s, int) else s for s in selectors]
+        return Image({name: self.bands[name] for name in picked})
+
+    def rename(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], list) else names
+        return Image(dict(zip(names, self.bands.values())))
+
+    @staticmethod
+    def cat(*images):
+        images = images[0] if len(images) == 1 and isinstance(images[0], list) else images
+        bands = {}
+        for image in images:
+            bands.update(Image(image).bands)
+        return Image(bands)
+
+    def serialize(self):
+        return json.dumps({'image': self.bands}, sort_keys=True)
+
+    def reduceRegions(self, collection, reducer, scale=None):
+        values = {'mean': lambda v: v, 'stdDev': lambda v: 0.0,
+                  'count': lambda v: self.PIXELS_PER_REGION}
+        outputs = {}
+        for band, value in self.bands.items():
+            for output in reducer.outputs:
+                # Earth Engine's naming: one band keeps the reducer's output
+                # names, several bands get them prefixed (or, for a single
+                # output, replaced) by the band name
+                if len(self.bands) == 1:
+                    name = output
+                elif len(reducer.outputs) == 1:
+                    name = band
+                else:
+                    name = f"{band}_{output}"
+                outputs[name] = values[output](value)
+        return ReducedRegions([dict(feature.properties, **outputs)
+                               for feature in collection.features])
+
+
+class ReducedRegions:
+    """Server-side result of reduceRegions; ``getInfo`` returns the GeoJSON"""
+
+    def __init__(self, properties):
+        self.properties = properties
+
+    def select(self, propertySelectors=None, retainGeometry=True):
+        return self
+
+    def getInfo(self):
+        return {'type': 'FeatureCollection',
+                'features': [{'type': 'Feature', 'geometry': None, 'properties': props}
+                             for props in self.properties]}
+
+
+def install():
+    """Register this stand-in as the ``ee`` module for the current process.
+
+    Call before importing any module of the repo that does ``import ee``.
+    Besides the client-side constructors used when building requests,
+    constant images and mean/stdDev/count reducers can be reduced locally.
+    """
+    module = types.ModuleType('ee')
+    module.Geometry = Geometry
+    module.Feature = Feature
+    module.FeatureCollection = FeatureCollection
+    module.Image = Image
+    module.Reducer = Reducer
+    sys.modules['ee'] = module
+    return module
@@ -0,0 +1,247 @@
+"""Scaling benchmarks for geometry conversion, zonal extraction, rendering and export.
+
+    python -m benchmarks.run run [--scales 1 10 100 1000] [--only CASE ...] [--repeat N]
+                                 [--output PATH]
+    python -m benchmarks.run compare OLD.json NEW.json [--threshold RATIO]
+
+Cases run on synthetic tessellations of the city at multiples of the real
+ward count (see benchmarks.synthetic), each in a fresh process, with a
+local stand-in for the Earth Engine client and an offline basemap. The
+JSON report records wall time, throughput and peak memory per case and
+scale, tagged with the commit, so two reports can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+DEFAULT_SCALES = (1, 10, 100, 1000)
+# Slowdown ratio above which `compare` reports a regression
+DEFAULT_THRESHOLD = 1.2
+
+# What a case times, and whether it reads the synthetic raster
+Case = namedtuple('Case', ['name', 'description', 'uses_raster'])
+
+CASES = [
+    Case('extract_raster_values', 'ee_simple.extract_raster_values (zonal mean)', True),
+    Case('gdf_to_ee_fc', 'ee_data_extraction.gdf_to_ee_fc at 1 km, serialized', False),
+    Case('geometry_to_ee', 'ee_geometry.geometry_to_ee per ward, serialized', False),
+    Case('create_map_ee_simple', 'ee_simple.create_map', False),
+    Case('create_map_ee_extraction', 'ee_data_extraction.create_map', False),
+    Case('create_indicator_map', 'ee_static_analysis.create_indicator_map', False),
+    Case('create_single_map', 'visualize_hvi.create_single_map', False),
+    Case('create_interactive_map', 'visualize_hvi.create_interactive_map', False),
+]
+
+MAP_ARGS = ('LST', 'Land Surface Temperature', 'RdYlBu_r', 'Temperature (°C)')
+
+
+def case_function(name, gdf, raster_path, workdir):
+    """The call timed for case ``name``; imports happen here, outside the timing"""
+    if name == 'extract_raster_values':
+        import ee_simple
+        return lambda: ee_simple.extract_raster_values(gdf, raster_path)
+    if name == 'gdf_to_ee_fc':
+        import ee_data_extraction
+        return lambda: ee_data_extraction.gdf_to_ee_fc(gdf, scale=1000).serialize()
+    if name == 'geometry_to_ee':
+        import ee_geometry
+        return lambda: [ee_geometry.geometry_to_ee(geom).serialize() for geom in gdf.geometry]
+    if name == 'create_interactive_map':
+        import visualize_hvi
+        return lambda: visualize_hvi.create_interactive_map(gdf)
+
+    gdf_3857 = gdf.to_crs(epsg=3857)
+    output_path = os.path.join(workdir, f"{name}.png")
+    if name == 'create_single_map':
+        import visualize_hvi
+        return lambda: visualize_hvi.create_single_map(*MAP_ARGS, output_path, gdf=gdf_3857)
+    module_name, function_name = {
+        'create_map_ee_simple': ('ee_simple', 'create_map'),
+        'create_map_ee_extraction': ('ee_data_extraction', 'create_map'),
+        'create_indicator_map': ('ee_static_analysis', 'create_indicator_map'),
+    }[name]
+    function = getattr(__import__(module_name), function_name)
+    return lambda: function(gdf_3857, *MAP_ARGS, output_path)
+
+
+def run_case(name, scale, seed, repeat):
+    """Time one case in this (fresh) process; returns its report entry"""
+    from benchmarks import fake_ee
+    fake_ee.install()
+    import matplotlib
+    matplotlib.use('Agg')
+    import shapely
+    import rasterio
+    import tile_cache
+    from benchmarks.synthetic import synthetic_raster, synthetic_wards
+
+    gdf = synthetic_wards(scale, seed)
+    case = next(case for case in CASES if case.name == name)
+    raster_path = os.path.abspath(synthetic_raster(gdf, scale, seed)) if case.uses_raster else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Basemaps come from an empty local store, so no case touches the network
+        tile_cache.configure(offline=True, tile_dir=None,
+                             store_dir=os.path.join(workdir, 'tiles'))
+        os.chdir(workdir)
+        function = case_function(name, gdf, raster_path, workdir)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # Later repeats see warm in-process caches (prepared ward layers, mosaics)
+        warm = []
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            function()
+            warm.append(time.perf_counter() - start)
+
+    entry = {
+        'case': name,
+        'scale': scale,
+        'seed': seed,
+        'wards': len(gdf),
+        'vertices': int(shapely.get_num_coordinates(gdf.geometry.values).sum()),
+        'seconds': seconds,
+        'warm_seconds': min(warm) if warm else None,
+        'wards_per_second': len(gdf) / seconds,
+        'peak_traced_mb': peak_traced / 2 ** 20,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if raster_path is not None:
+        with rasterio.open(raster_path) as src:
+            entry['pixels'] = src.width * src.height
+        entry['pixels_per_second'] = entry['pixels'] / seconds
+    return entry
+
+
+def prepare_data(scales, seed):
+    """Generate (or reuse) the synthetic wards and rasters before any timing"""
+    from benchmarks.synthetic import synthetic_raster, synthetic_wards
+    for scale in scales:
+        start = time.perf_counter()
+        gdf = synthetic_wards(scale, seed)
+        if any(case.uses_raster for case in CASES):
+            synthetic_raster(gdf, scale, seed)
+        print(f"x{scale}: {len(gdf)} wards ready in {time.perf_counter() - start:.1f}s")
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', None
+    return commit, dirty
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, cases=None, repeat=1, seed=0, output=None):
+    """Run every case at every scale and write the JSON report; returns it"""
+    cases = [case.name for case in CASES if cases is None or case.name in cases]
+    prepare_data(scales, seed)
+    commit, dirty = git_commit()
+
+    results = []
+    for scale in scales:
+        for name in cases:
+            # A fresh process per case keeps caches and peak memory separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                try:
+                    entry = pool.submit(run_case, name, scale, seed, repeat).result()
+                except Exception as e:
+                    print(f"Error running {name} at x{scale}: {str(e)}")
+                    continue
+            results.append(entry)
+            print(f"{name:<26} x{scale:<5} {entry['wards']:>7} wards  {entry['seconds']:8.3f}s  "
+                  f"{entry['wards_per_second']:10.0f} wards/s  {entry['peak_rss_mb']:7.0f} MB")
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if output is None:
+        from benchmarks.synthetic import DATA_DIR
+        output = os.path.join(DATA_DIR, f"report-{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Report written to {output}")
+    return report
+
+
+def compare_reports(old, new, threshold=DEFAULT_THRESHOLD):
+    """Print per-case time ratios of two reports; returns the regressed (case, scale) keys"""
+    old_results = {(r['case'], r['scale']): r for r in old['results']}
+    print(f"{'case':<26} {'scale':>6} {old['commit']:>10} {new['commit']:>10}  ratio")
+    regressions = []
+    for entry in new['results']:
+        key = (entry['case'], entry['scale'])
+        if key not in old_results:
+            continue
+        ratio = entry['seconds'] / old_results[key]['seconds']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(key)
+            flag = '  slower'
+        print(f"{key[0]:<26} {'x' + str(key[1]):>6} {old_results[key]['seconds']:9.3f}s "
+              f"{entry['seconds']:9.3f}s  {ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Run the benchmarks and write a JSON report')
+    run.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                     help='multiples of the real ward count (default: 1 10 100 1000)')
+    run.add_argument('--only', nargs='+', choices=[case.name for case in CASES],
+                     help='run only these cases')
+    run.add_argument('--repeat', type=int, default=1,
+                     help='runs per case; repeats after the first are reported as warm times')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--output', help='report path (default: .hvi_cache/benchmarks/report-<commit>.json)')
+
+    compare = subparsers.add_parser('compare', help='Compare two reports')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help=f'slowdown ratio counted as a regression (default: {DEFAULT_THRESHOLD})')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run_benchmarks(args.scales, args.only, max(1, args.repeat), args.seed, args.output)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        if compare_reports(old, new, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from ward_data import CACHE_DIR, WARD_SOURCE, load_wards, source_hash
+
+DATA_DIR = os.path.join(CACHE_DIR, 'benchmarks')
+# Raster pixels generated per synthetic ward, so extraction cost scales with the wards
+PIXELS_PER_WARD = 400
+# Relative spread of the noise added to the values inherited from the real wards
+ATTRIBUTE_NOISE = 0.05
+
+
+def voronoi_wards(n_wards, outline, rng):
+    """About ``n_wards`` Voronoi cells filling ``outline`` (points sampled inside it)"""
+    minx, miny, maxx, maxy = outline.bounds
+    # Oversample the bounding box by the outline's share of it
+    fill = outline.area / ((maxx - minx) * (maxy - miny))
+    points = np.column_stack([rng.uniform(minx, maxx, int(n_wards / fill * 1.05) + 1),
+                              rng.uniform(miny, maxy, int(n_wards / fill * 1.05) + 1)])
+    shapely.prepare(outline)
+    points = points[shapely.contains_xy(outline, points[:, 0], points[:, 1])][:n_wards]
+
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points),
+                                                       extend_to=shapely.box(minx, miny, maxx, maxy)))
+    cells = shapely.intersection(cells, outline)
+    # Clipping can leave slivers as lines or points; keep the polygon parts
+    parts, cell_index = shapely.get_parts(cells, return_index=True)
+    polygonal = shapely.get_type_id(parts) == 3
+    cells = shapely.multipolygons(parts[polygonal], indices=cell_index[polygonal])
+    cells = cells[~shapely.is_missing(cells)]
+    single = shapely.get_num_geometries(cells) == 1
+    cells[single] = shapely.get_geometry(cells[single], 0)
+    return cells
+
+
+def synthetic_wards(scale, seed=0, source=WARD_SOURCE):
+    """A tessellation of the city with ``scale`` times its ward count, in EPSG:4326.
+
+    Cells inherit every numeric attribute of the real ward containing their
+    centre, with a little multiplicative noise, so maps and indices keep the
+    city's spatial structure. ``WardID_`` is a fresh sequential id. Cached
+    as GeoParquet per source, scale and seed.
+    """
+    path = os.path.join(DATA_DIR, f"wards-{source_hash(source)[:12]}-x{scale}-s{seed}.parquet")
+    if os.path.exists(path):
+        return gpd.read_parquet(path)
+
+    real = load_wards()
+    rng = np.random.default_rng(seed)
+    outline = shapely.union_all(real.geometry.values)
+    if scale == 1:
+        cells = real.geometry.values
+    else:
+        cells = voronoi_wards(len(real) * scale, outline, rng)
+
+    # Parent ward of each cell, by the point guaranteed to lie inside it
+    parents = np.zeros(len(cells), dtype=np.int64)
+    inside, ward = shapely.STRtree(real.geometry.values).query(
+        shapely.point_on_surface(cells), predicate='within')
+    parents[inside] = ward
+
+    numeric = real.select_dtypes('number')
+    values = numeric.to_numpy(dtype=float)[parents]
+    values *= 1 + rng.normal(0, ATTRIBUTE_NOISE, values.shape)
+    gdf = gpd.GeoDataFrame(values, columns=numeric.columns, geometry=cells, crs='EPSG:4326')
+    gdf.insert(0, 'WardID_', [str(i + 1) for i in range(len(gdf))])
+    gdf['LISA_Cluster'] = gdf['LISA_Cluster'].round().astype('int32')
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    gdf.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    return gdf
+
+
+def synthetic_raster(gdf, scale, seed=0, pixels_per_ward=PIXELS_PER_WARD):
+    """A float32 GeoTIFF over the wards with ``pixels_per_ward`` pixels per ward.
+
+    Values are a smooth temperature-like field plus noise, written one
+    block row at a time so even the largest scales stay within memory.
+    Returns the raster path (cached per scale, seed and pixel density).
+    """
+    path = os.path.join(DATA_DIR, f"raster-x{scale}-s{seed}-p{pixels_per_ward}.tif")
+    if os.path.exists(path):
+        return path
+
+    minx, miny, maxx, maxy = gdf.total_bounds
+    pixel_size = np.sqrt((maxx - minx) * (maxy - miny) / (pixels_per_ward * len(gdf)))
+    width = int(np.ceil((maxx - minx) / pixel_size))
+    height = int(np.ceil((maxy - miny) / pixel_size))
+    profile = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'width': width,
+               'height': height, 'crs': 'EPSG:4326', 'nodata': -9999.0,
+               'transform': from_origin(minx, maxy, pixel_size, pixel_size),
+               'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate'}
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 6 * np.pi, width)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with rasterio.open(tmp_path, 'w', **profile) as dst:
+        for top in range(0, height, 256):
+            rows = min(256, height - top)
+            y = np.linspace(0, 6 * np.pi, height)[top:top + rows, None]
+            block = 28 + 6 * np.sin(x)[None, :] * np.cos(y) + rng.normal(0, 1, (rows, width))
+            dst.write(block.astype('float32'), 1, window=Window(0, top, width, rows))
+    os.replace(tmp_path, path)
+    return path
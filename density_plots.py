@@ -0,0 +1,198 @@
+import math
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+from raster_io import WindowedRaster
+from zonal_stats import rasterize_labels, valid_mask
+
+DEFAULT_BINS = 200
+# Hexagons across the x range, as matplotlib's hexbin gridsize
+HEX_GRIDSIZE = 100
+
+
+class BinnedDensity:
+    """Fixed 2D bins (rectangular or hexagonal) filled chunk by chunk.
+
+    Keeps only per-bin counts, and the sum and count of an optional
+    colouring value, so memory depends on the number of bins and not on
+    how many points are streamed through ``add``.
+    """
+
+    def __init__(self, x_range, y_range, bins=DEFAULT_BINS, hexagonal=False):
+        self.x_range = (float(x_range[0]), float(x_range[1]))
+        self.y_range = (float(y_range[0]), float(y_range[1]))
+        self.hexagonal = hexagonal
+        if hexagonal:
+            # Two offset lattices, laid out exactly as matplotlib's hexbin
+            self.nx = int(bins)
+            self.ny = max(int(self.nx / math.sqrt(3)), 1)
+            n_cells = (self.nx + 1) * (self.ny + 1) + self.nx * self.ny
+        else:
+            self.nx, self.ny = (bins, bins) if np.isscalar(bins) else bins
+            n_cells = self.nx * self.ny
+        self.sx = (self.x_range[1] - self.x_range[0]) / self.nx or 1.0
+        self.sy = (self.y_range[1] - self.y_range[0]) / self.ny or 1.0
+
+        self.counts = np.zeros(n_cells, dtype=np.int64)
+        self.value_sums = np.zeros(n_cells)
+        self.value_counts = np.zeros(n_cells, dtype=np.int64)
+
+    def bin_index(self, x, y):
+        """Flat bin index of each point; -1 for points outside the ranges"""
+        ix = (x - self.x_range[0]) / self.sx
+        iy = (y - self.y_range[0]) / self.sy
+        inside = (ix >= 0) & (ix <= self.nx) & (iy >= 0) & (iy <= self.ny)
+
+        if not self.hexagonal:
+            col = np.minimum(ix, self.nx - 1).astype(np.int64)
+            row = np.minimum(iy, self.ny - 1).astype(np.int64)
+            return np.where(inside, row * self.nx + col, -1)
+
+        ix1, iy1 = np.round(ix), np.round(iy)
+        ix2, iy2 = np.floor(ix), np.floor(iy)
+        d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+        d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+        first = d1 < d2
+        ix2, iy2 = np.minimum(ix2, self.nx - 1), np.minimum(iy2, self.ny - 1)
+        index = np.where(first,
+                         ix1 * (self.ny + 1) + iy1,
+                         ix2 * self.ny + iy2 + (self.nx + 1) * (self.ny + 1))
+        return np.where(inside, index, -1).astype(np.int64)
+
+    def add(self, x, y, values=None):
+        """Accumulate one chunk of points (and their colouring values)"""
+        index = self.bin_index(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        keep = index >= 0
+        index = index[keep]
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        if values is not None:
+            values = np.asarray(values, dtype=float)[keep]
+            finite = np.isfinite(values)
+            self.value_sums += np.bincount(index[finite], weights=values[finite],
+                                           minlength=len(self.counts))
+            self.value_counts += np.bincount(index[finite], minlength=len(self.counts))
+
+    def mean(self):
+        """Mean colouring value per bin (NaN where a bin has none)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.value_counts > 0, self.value_sums / self.value_counts, np.nan)
+
+    def hexagon_polygons(self, index):
+        """Vertices of the given hexagonal bins in data coordinates"""
+        n_first = (self.nx + 1) * (self.ny + 1)
+        first = index < n_first
+        i = np.where(first, index // (self.ny + 1), (index - n_first) // self.ny)
+        j = np.where(first, index % (self.ny + 1), (index - n_first) % self.ny)
+        offset = np.where(first, 0.0, 0.5)
+        centres = np.stack([self.x_range[0] + (i + offset) * self.sx,
+                            self.y_range[0] + (j + offset) * self.sy], axis=-1)
+        hexagon = np.array([[0.5, -0.5], [0.5, 0.5], [0.0, 1.0],
+                            [-0.5, 0.5], [-0.5, -0.5], [0.0, -1.0]]) * [self.sx, self.sy / 3.0]
+        return centres[:, None, :] + hexagon[None, :, :]
+
+    def draw(self, ax, values, cmap='viridis', norm=None, min_count=1):
+        """Draw non-empty bins coloured by ``values`` (one per bin); returns the collection"""
+        shown = (self.counts >= min_count) & np.isfinite(values)
+        if not self.hexagonal:
+            # Square bins are one mesh, far cheaper to render than separate polygons
+            grid = np.ma.masked_where(~shown, values).reshape(self.ny, self.nx)
+            x_edges = np.linspace(*self.x_range, self.nx + 1)
+            y_edges = np.linspace(*self.y_range, self.ny + 1)
+            return ax.pcolormesh(x_edges, y_edges, grid, cmap=cmap, norm=norm)
+
+        index = np.flatnonzero(shown)
+        collection = PolyCollection(self.hexagon_polygons(index), array=values[index],
+                                    cmap=cmap, norm=norm, edgecolors='face', linewidths=0)
+        ax.add_collection(collection)
+        ax.set_xlim(*self.x_range)
+        ax.set_ylim(*self.y_range)
+        return collection
+
+
+class BinnedHistogram:
+    """1D histogram accumulated chunk by chunk over fixed edges"""
+
+    def __init__(self, value_range, bins=DEFAULT_BINS):
+        self.edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, values):
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def draw(self, ax, color='#440154', **kwargs):
+        return ax.stairs(self.counts, self.edges, fill=True, color=color, **kwargs)
+
+
+def aligned_reader(path, reference):
+    """Read ``path`` on the grid of ``reference`` (a WindowedRaster).
+
+    Rasters already on that grid share its block cache; others are
+    resampled on the fly through a WarpedVRT, window by window; pixels
+    the raster does not cover read as nodata (or NaN) and are dropped.
+    """
+    raster = WindowedRaster(path)
+    if raster.same_grid(reference):
+        return raster.read_window, raster.nodata, raster.close
+
+    vrt = raster.warped(reference)
+
+    def close():
+        vrt.close()
+        raster.close()
+    return (lambda window, cached=True: raster.read_warped(vrt, window)), raster.nodata, close
+
+
+def pixel_chunks(x_path, y_path, value_path=None, gdf=None, value_column=None, bounds=None):
+    """Yield (x, y, values) arrays of valid pixels, one block-row strip at a time.
+
+    ``x_path`` defines the grid; ``y_path`` (and ``value_path``) are read on
+    it. Without a value raster each pixel takes ``value_column`` of the ward
+    it falls in, rasterized per strip. Pixels outside every ward, or nodata
+    in x or y, are dropped.
+    """
+    with WindowedRaster(x_path) as x_raster:
+        readers = [aligned_reader(y_path, x_raster)]
+        if value_path is not None:
+            readers.append(aligned_reader(value_path, x_raster))
+        elif gdf is not None:
+            if gdf.crs is not None and x_raster.crs is not None and gdf.crs != x_raster.crs:
+                gdf = gdf.to_crs(x_raster.crs)
+            geometries = gdf.geometry.values
+            ward_values = np.concatenate([[np.nan], gdf[value_column].to_numpy(dtype=float)])
+
+        try:
+            for window in x_raster.iter_windows(bounds):
+                x = x_raster.read_window(window, cached=False)
+                mask = valid_mask(x, x_raster.nodata)
+                read_y, y_nodata, _ = readers[0]
+                y = read_y(window, cached=False)
+                mask &= valid_mask(y, y_nodata)
+
+                if value_path is not None:
+                    read_values, values_nodata, _ = readers[1]
+                    values = read_values(window, cached=False).astype(float)
+                    values[~valid_mask(values, values_nodata)] = np.nan
+                elif gdf is not None:
+                    labels = rasterize_labels(geometries, x.shape, x_raster.window_transform(window))
+                    mask &= labels > 0
+                    values = ward_values[labels]
+                else:
+                    values = None
+
+                if mask.any():
+                    yield x[mask], y[mask], None if values is None else values[mask]
+        finally:
+            for _, _, close in readers:
+                close()
+
+
+def value_ranges(x_path, y_path, bounds=None, **kwargs):
+    """Streaming min/max of x and y over the pixels ``pixel_chunks`` yields"""
+    x_range, y_range = [np.inf, -np.inf], [np.inf, -np.inf]
+    for x, y, _ in pixel_chunks(x_path, y_path, bounds=bounds, **kwargs):
+        x_range = [min(x_range[0], x.min()), max(x_range[1], x.max())]
+        y_range = [min(y_range[0], y.min()), max(y_range[1], y.max())]
+    if not np.isfinite(x_range[0]):
+        raise ValueError("No valid pixels to plot")
+    return tuple(x_range), tuple(y_range)
@@ -1,26 +1,11 @@
 import ee
-import geemap
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 import os
 
-def initialize_earth_engine():
-    """Initialize Earth Engine with proper authentication"""
-    try:
-        # Try to initialize Earth Engine
-        ee.Initialize()
-        print("Earth Engine initialized successfully!")
-    except Exception as e:
-        print("Authentication required. Please follow these steps:")
-        print("1. Go to https://code.earthengine.google.com/")
-        print("2. Sign in with your Google account")
-        print("3. Run 'earthengine authenticate' in your terminal")
-        raise Exception("Earth Engine authentication required") from e
-
-# Initialize Earth Engine
-initialize_earth_engine()
+from ee_scheduler import is_quota_error, run_requests
+from ee_session import initialize_earth_engine
 
 # Define Johannesburg region
 jhb_coords = [
@@ -30,7 +15,16 @@ jhb_coords = [
     [27.85, -26.25],  # NW
     [27.85, -26.55]   # SW (close polygon)
 ]
-johannesburg = ee.Geometry.Polygon([jhb_coords])
+
+def johannesburg_region():
+    """Johannesburg study area, initializing Earth Engine on first use"""
+    initialize_earth_engine()
+    return ee.Geometry.Polygon([jhb_coords])
+
+def create_jhb_map():
+    """Create an interactive map centred on Johannesburg"""
+    import geemap  # heavy, so only imported once a map is actually built
+    return geemap.Map(center=[-26.4, 28.0], zoom=10)
 
 def create_output_dir():
     """Create output directory if it doesn't exist"""
@@ -44,7 +38,7 @@ def visualize_lst_modis():
         print("Fetching MODIS LST data...")
         # Get MODIS LST data
         modis_lst = ee.ImageCollection("MODIS/006/MOD11A2") \
-            .filterBounds(johannesburg) \
+            .filterBounds(johannesburg_region()) \
             .filterDate('2023-01-01', '2023-12-31')
 
         # Convert to Celsius and get mean
@@ -54,7 +48,7 @@ def visualize_lst_modis():
             .subtract(273.15)
 
         # Create the map
-        Map = geemap.Map(center=[-26.4, 28.0], zoom=10)
+        Map = create_jhb_map()
         
         # Add LST layer
         vis_params = {
@@ -74,6 +68,8 @@ def visualize_lst_modis():
         print(f"LST map saved to {output_file}")
         
     except Exception as e:
+        if is_quota_error(e):
+            raise
         print(f"Error creating LST visualization: {str(e)}")
 
 def visualize_urban_heat_island():
@@ -82,11 +78,11 @@ def visualize_urban_heat_island():
         print("Fetching Urban Heat Island data...")
         # Get YCEO UHI data
         uhi = ee.ImageCollection("YALE/YCEO/UHI/UHI_all_averaged") \
-            .filterBounds(johannesburg) \
+            .filterBounds(johannesburg_region()) \
             .first()
 
         # Create the map
-        Map = geemap.Map(center=[-26.4, 28.0], zoom=10)
+        Map = create_jhb_map()
         
         # Add UHI layer
         vis_params = {
@@ -106,6 +102,8 @@ def visualize_urban_heat_island():
         print(f"UHI map saved to {output_file}")
         
     except Exception as e:
+        if is_quota_error(e):
+            raise
         print(f"Error creating UHI visualization: {str(e)}")
 
 def visualize_population_density():
@@ -114,12 +112,12 @@ def visualize_population_density():
         print("Fetching WorldPop data...")
         # Get WorldPop data
         worldpop = ee.ImageCollection("WorldPop/GP/100m/pop") \
-            .filterBounds(johannesburg) \
+            .filterBounds(johannesburg_region()) \
             .filterDate('2020-01-01', '2020-12-31') \
             .first()
 
         # Create the map
-        Map = geemap.Map(center=[-26.4, 28.0], zoom=10)
+        Map = create_jhb_map()
         
         # Add population density layer
         vis_params = {
@@ -139,6 +137,8 @@ def visualize_population_density():
         print(f"Population density map saved to {output_file}")
         
     except Exception as e:
+        if is_quota_error(e):
+            raise
         print(f"Error creating population density visualization: {str(e)}")
 
 def visualize_ndvi():
@@ -147,14 +147,14 @@ def visualize_ndvi():
         print("Fetching MODIS NDVI data...")
         # Get MODIS NDVI data
         modis_ndvi = ee.ImageCollection("MODIS/006/MOD13Q1") \
-            .filterBounds(johannesburg) \
+            .filterBounds(johannesburg_region()) \
             .filterDate('2023-01-01', '2023-12-31')
 
         # Calculate mean NDVI
         ndvi_mean = modis_ndvi.select('NDVI').mean().multiply(0.0001)
 
         # Create the map
-        Map = geemap.Map(center=[-26.4, 28.0], zoom=10)
+        Map = create_jhb_map()
         
         # Add NDVI layer
         vis_params = {
@@ -174,25 +174,26 @@ def visualize_ndvi():
         print(f"NDVI map saved to {output_file}")
         
     except Exception as e:
+        if is_quota_error(e):
+            raise
         print(f"Error creating NDVI visualization: {str(e)}")
 
-if __name__ == "__main__":
+def main():
     try:
+        initialize_earth_engine()
+
         # Create output directory
         output_dir = create_output_dir()
         print(f"Output directory created at: {output_dir}")
         
-        print("\nCreating LST visualization...")
-        visualize_lst_modis()
-        
-        print("\nCreating UHI visualization...")
-        visualize_urban_heat_island()
-        
-        print("\nCreating population density visualization...")
-        visualize_population_density()
-        
-        print("\nCreating NDVI visualization...")
-        visualize_ndvi()
+        # Each visualization is an independent set of Earth Engine requests
+        print("\nCreating LST, UHI, population density and NDVI visualizations...")
+        run_requests([
+            ('LST visualization', visualize_lst_modis),
+            ('UHI visualization', visualize_urban_heat_island),
+            ('population density visualization', visualize_population_density),
+            ('NDVI visualization', visualize_ndvi),
+        ], max_in_flight=4)
         
         print("\nAll visualizations have been created!")
         print(f"You can find all output files in: {output_dir}")
@@ -200,3 +201,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\nError during visualization process: {str(e)}")
         print("Please make sure you have authenticated with Earth Engine")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+
+import ee
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_CACHE_DIR = '.ee_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ResultCache:
+    """Content-addressed on-disk store for Earth Engine results.
+
+    Entries are JSON files named by a SHA-256 of the request. The file
+    modification time doubles as the last-used stamp, so eviction drops the
+    least recently used entries once the directory exceeds ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash request parts; Earth Engine objects hash by their serialized expression"""
+        digest = hashlib.sha256()
+        for part in parts:
+            if hasattr(part, 'serialize'):
+                part = part.serialize()
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            value = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        raw = orjson.dumps(value) if orjson is not None else json.dumps(value).encode('utf-8')
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def invalidate(self, key=None):
+        """Drop one entry, or the whole cache when no key is given"""
+        if key is not None:
+            paths = [self._path(key)]
+        elif os.path.isdir(self.cache_dir):
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                     if name.endswith('.json')]
+        else:
+            paths = []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in ``max_bytes``"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+default_cache = ResultCache()
+
+
+def cached_reduce_regions(image, collection, reducer=None, scale=1000,
+                          cache=None, refresh=False):
+    """Run ``image.reduceRegions(...).getInfo()`` through the result cache.
+
+    The key covers the image expression, reducer, scale and the collection
+    (geometries included), so changing any of them is a new request. Pass
+    ``refresh=True`` to ignore and overwrite a cached entry.
+
+    Geometries are dropped on the server, so the response only carries each
+    feature's properties (the ward id plus the reducer outputs); decode it
+    with ``ee_results.features_to_frame``.
+    """
+    cache = default_cache if cache is None else cache
+    reducer = ee.Reducer.mean() if reducer is None else reducer
+    key = cache.make_key('reduceRegions:properties', image, reducer, scale, collection)
+
+    if not refresh:
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    result = image.reduceRegions(
+        collection=collection,
+        reducer=reducer,
+        scale=scale
+    ).select(propertySelectors=['.*'], retainGeometry=False).getInfo()
+    if result is not None:
+        cache.put(key, result)
+    return result
@@ -1,79 +1,124 @@
 import ee
-import geemap
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import contextily as ctx
 from datetime import datetime, timedelta
 import os
 
-# Initialize Earth Engine
-ee.Initialize()
+from ee_cache import cached_reduce_regions
+from ee_geometry import gdf_to_feature_collection
+from ee_results import features_to_frame, join_results
+from ee_scheduler import is_quota_error, run_requests
+from ee_session import initialize_earth_engine
+from panel_cache import Panel, compose_panels, draw_panel, layer_extent
+from render_queue import render_maps
+from ward_data import load_wards
 
-# Read the Johannesburg shapefile for boundaries
-gdf = gpd.read_file('HVI_with_CVI.geojson')
-# Ensure the GeoDataFrame is in Web Mercator projection for basemap
-gdf = gdf.to_crs(epsg=3857)
+OUTPUT_DIR = "ee_extracted_maps"
+OUTPUT_GEOJSON = os.path.join(OUTPUT_DIR, 'johannesburg_with_ee_data.geojson')
+# Column, map title, colormap, legend label, file name
+INDICATOR_MAPS = [
+    ('ERA5_TEMP', 'ERA5-Land Temperature (2023)', 'RdYlBu_r', 'Temperature (°C)', 'era5_temperature.png'),
+    ('MODIS_LST', 'MODIS Land Surface Temperature (2023)', 'RdYlBu_r', 'Temperature (°C)', 'modis_lst.png'),
+    ('MODIS_NDVI', 'MODIS NDVI (2023)', 'YlGn', 'NDVI', 'modis_ndvi.png'),
+    ('POPULATION', 'Population Density (2020)', 'YlOrRd', 'Population per 100m²', 'population.png'),
+    ('UHI', 'Urban Heat Island Intensity', 'RdYlBu_r', 'Temperature Difference (°C)', 'uhi.png'),
+]
+# Size of the combined figure; its panels are MAP_LAYER_WIDTH inches wide,
+# and the single maps use layers of that width too, so each is drawn once
+COMBINED_FIGSIZE = (20, 30)
+COMBINED_COLUMNS = 2
+MAP_LAYER_WIDTH = COMBINED_FIGSIZE[0] / COMBINED_COLUMNS
+
+# Outputs of batch_reducer, suffixed to each band name in the batched table
+BATCH_OUTPUTS = ('mean', 'stdDev', 'count')
 
 # Convert GeoDataFrame to Earth Engine FeatureCollection
-def gdf_to_ee_fc(gdf):
+def gdf_to_ee_fc(gdf, scale=None):
     """Convert GeoDataFrame to Earth Engine FeatureCollection"""
-    # Convert to geographic coordinates for Earth Engine
-    gdf_geo = gdf.to_crs(epsg=4326)
-    features = []
-    for idx, row in gdf_geo.iterrows():
-        geom = row.geometry
-        if geom.type == 'Polygon':
-            coords = [[[x, y] for x, y in zip(*geom.exterior.coords.xy)]]
-        elif geom.type == 'MultiPolygon':
-            coords = [[[x, y] for x, y in zip(*poly.exterior.coords.xy)] 
-                     for poly in geom.geoms]
-        
-        feature = ee.Feature(
-            ee.Geometry.Polygon(coords),
-            {'id': str(idx)}
-        )
-        features.append(feature)
-    
-    return ee.FeatureCollection(features)
+    # Features carry WardID_ as their id; holes and multipart wards are kept.
+    # With a scale the wards are simplified for that pixel size before upload
+    return gdf_to_feature_collection(gdf, id_column='WardID_', scale=scale)
 
-# Convert to Earth Engine FeatureCollection
-ee_fc = gdf_to_ee_fc(gdf)
-
-def extract_ee_data(image, ee_fc, scale=1000):
+def extract_ee_data(image, ee_fc, scale=1000, refresh=False):
     """Extract data from Earth Engine image for each polygon"""
     try:
-        # Reduce regions
-        data = image.reduceRegions(
-            collection=ee_fc,
-            reducer=ee.Reducer.mean(),
-            scale=scale
-        )
-        # Convert to dictionary
-        return data.getInfo()
+        # Reduce regions, reusing the on-disk result when nothing changed
+        return cached_reduce_regions(image, ee_fc,
+                                     reducer=ee.Reducer.mean(),
+                                     scale=scale,
+                                     refresh=refresh)
     except Exception as e:
+        # Let the scheduler back off and retry throttled requests
+        if is_quota_error(e):
+            raise
         print(f"Error extracting data: {str(e)}")
         return None
 
+def batch_reducer():
+    """Mean, standard deviation and pixel count computed in one reduction"""
+    return ee.Reducer.mean() \
+        .combine(ee.Reducer.stdDev(), sharedInputs=True) \
+        .combine(ee.Reducer.count(), sharedInputs=True)
+
+def extract_ee_data_batched(images, ee_fc, scale=1000, scales=None,
+                            max_in_flight=4, refresh=False):
+    """Extract several indicators with one reduceRegions call per scale.
+
+    ``images`` is a sequence of ``(name, image)`` pairs. Each image's first
+    band is renamed to ``name`` and stacked into a single multi-band image,
+    which is reduced once with mean, stdDev and count. Indicators that need
+    a different resolution can be given one in ``scales`` (name -> metres);
+    each distinct scale costs one request.
+
+    Returns a wide DataFrame indexed by ``WardID_`` with ``<name>_mean``,
+    ``<name>_stdDev`` and ``<name>_count`` columns, or None on failure.
+    """
+    scales = scales or {}
+    groups = {}
+    for name, image in images:
+        groups.setdefault(scales.get(name, scale), []).append(
+            (name, ee.Image(image).select([0]).rename(name)))
+
+    def reduce(bands, group_scale):
+        def request():
+            stacked = ee.Image.cat([band for _, band in bands])
+            return cached_reduce_regions(stacked, ee_fc,
+                                         reducer=batch_reducer(),
+                                         scale=group_scale,
+                                         refresh=refresh)
+        return request
+
+    results = run_requests(
+        [(f"batch at {group_scale} m", reduce(bands, group_scale))
+         for group_scale, bands in groups.items()],
+        max_in_flight=max_in_flight
+    )
+    if not results or any(data is None for data in results):
+        return None
+
+    tables = []
+    for bands, data in zip(groups.values(), results):
+        table = features_to_frame(data, id_column='WardID_')
+        if len(bands) == 1:
+            # A combined reducer over a single band names its outputs without
+            # the band prefix it adds for multi-band images
+            name = bands[0][0]
+            table = table.rename(columns={output: f'{name}_{output}'
+                                          for output in BATCH_OUTPUTS})
+        tables.append(table)
+    return pd.concat(tables, axis=1)
+
 def create_map(gdf, data_column, title, cmap, legend_label, output_path):
     """Create and save a map visualization"""
     try:
         fig, ax = plt.subplots(figsize=(15, 15))
         
-        # Plot the data
-        gdf.plot(column=data_column, 
-                cmap=cmap,
-                legend=True,
-                ax=ax,
-                legend_kwds={'label': legend_label})
-        
-        # Add basemap
-        ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron)
-        
-        # Customize the plot
-        ax.set_title(title, fontsize=16, pad=20)
-        ax.axis('off')
+        # The wards and basemap come from the layer cached for the combined figure
+        draw_panel(ax, gdf, Panel(data_column, cmap, title, legend_label),
+                   layer_extent(gdf), dpi=300, width=MAP_LAYER_WIDTH,
+                   title_kwds={'fontsize': 16, 'pad': 20})
         
         # Save the plot
         plt.savefig(output_path, bbox_inches='tight', dpi=300)
@@ -81,134 +126,119 @@ def create_map(gdf, data_column, title, cmap, legend_label, output_path):
     except Exception as e:
         print(f"Error creating map for {title}: {str(e)}")
 
-def main():
-    try:
-        # Create output directory
-        output_dir = "ee_extracted_maps"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 1. ERA5-Land Temperature
-        print("Processing ERA5-Land temperature data...")
-        era5_land = ee.ImageCollection("ECMWF/ERA5_LAND/HOURLY") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .select('temperature_2m') \
-            .mean() \
-            .subtract(273.15)  # Convert to Celsius
-        
-        era5_data = extract_ee_data(era5_land, ee_fc)
-        if era5_data:
-            gdf['ERA5_TEMP'] = pd.DataFrame(era5_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'ERA5_TEMP', 
-                      'ERA5-Land Temperature (2023)',
-                      'RdYlBu_r',
-                      'Temperature (°C)',
-                      os.path.join(output_dir, 'era5_temperature.png'))
-
-        # 2. Latest MODIS LST
-        print("Processing MODIS LST data...")
-        modis_lst = ee.ImageCollection("MODIS/061/MOD11A2") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .select('LST_Day_1km') \
-            .mean() \
-            .multiply(0.02) \
-            .subtract(273.15)
-        
-        lst_data = extract_ee_data(modis_lst, ee_fc)
-        if lst_data:
-            gdf['MODIS_LST'] = pd.DataFrame(lst_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'MODIS_LST',
-                      'MODIS Land Surface Temperature (2023)',
-                      'RdYlBu_r',
-                      'Temperature (°C)',
-                      os.path.join(output_dir, 'modis_lst.png'))
-
-        # 3. Latest MODIS NDVI
-        print("Processing MODIS NDVI data...")
-        modis_ndvi = ee.ImageCollection("MODIS/061/MOD13Q1") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .select('NDVI') \
-            .mean() \
-            .multiply(0.0001)
-        
-        ndvi_data = extract_ee_data(modis_ndvi, ee_fc)
-        if ndvi_data:
-            gdf['MODIS_NDVI'] = pd.DataFrame(ndvi_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'MODIS_NDVI',
-                      'MODIS NDVI (2023)',
-                      'YlGn',
-                      'NDVI',
-                      os.path.join(output_dir, 'modis_ndvi.png'))
-
-        # 4. WorldPop Population Density
-        print("Processing WorldPop data...")
-        worldpop = ee.ImageCollection("WorldPop/GP/100m/pop") \
-            .filterDate('2020-01-01', '2020-12-31') \
-            .first()
-        
-        pop_data = extract_ee_data(worldpop, ee_fc)
-        if pop_data:
-            gdf['POPULATION'] = pd.DataFrame(pop_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'POPULATION',
-                      'Population Density (2020)',
-                      'YlOrRd',
-                      'Population per 100m²',
-                      os.path.join(output_dir, 'population.png'))
-
-        # 5. Urban Heat Island
-        print("Processing Urban Heat Island data...")
-        uhi = ee.ImageCollection("YALE/YCEO/UHI/UHI_all_averaged") \
-            .filterBounds(ee_fc.geometry()) \
-            .first() \
-            .select('UHI')
-        
-        uhi_data = extract_ee_data(uhi, ee_fc)
-        if uhi_data:
-            gdf['UHI'] = pd.DataFrame(uhi_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'UHI',
-                      'Urban Heat Island Intensity',
-                      'RdYlBu_r',
-                      'Temperature Difference (°C)',
-                      os.path.join(output_dir, 'uhi.png'))
-
-        # Save the updated GeoJSON with new data
-        # Convert back to geographic coordinates for saving
-        gdf_save = gdf.copy()
-        gdf_save = gdf_save.to_crs(epsg=4326)
-        gdf_save.to_file(os.path.join(output_dir, 'johannesburg_with_ee_data.geojson'), driver='GeoJSON')
-        
-        # Create combined visualization
-        print("Creating combined visualization...")
-        fig, axes = plt.subplots(3, 2, figsize=(20, 30))
-        axes = axes.flatten()
-        
-        # Plot each dataset
-        datasets = [
-            ('ERA5_TEMP', 'ERA5-Land Temperature', 'RdYlBu_r', 'Temperature (°C)'),
-            ('MODIS_LST', 'MODIS LST', 'RdYlBu_r', 'Temperature (°C)'),
-            ('MODIS_NDVI', 'MODIS NDVI', 'YlGn', 'NDVI'),
-            ('POPULATION', 'Population Density', 'YlOrRd', 'Population per 100m²'),
-            ('UHI', 'Urban Heat Island', 'RdYlBu_r', 'Temperature Difference (°C)')
-        ]
-        
-        for idx, (col, title, cmap, label) in enumerate(datasets):
-            if col in gdf.columns:
-                gdf.plot(column=col,
-                        cmap=cmap,
-                        legend=True,
-                        ax=axes[idx],
-                        legend_kwds={'label': label})
-                ctx.add_basemap(axes[idx], source=ctx.providers.CartoDB.Positron)
-                axes[idx].set_title(title)
-                axes[idx].axis('off')
-        
-        # Remove the last empty subplot
-        fig.delaxes(axes[5])
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'combined_ee_analysis.png'), 
-                    bbox_inches='tight', dpi=300)
-        plt.close()
+def extract_indicators(max_in_flight=4, batched=False):
+    """Reduce every indicator over the wards and save them as OUTPUT_GEOJSON.
+
+    Returns the wards in Web Mercator with one column per indicator.
+    """
+    # Earth Engine and the wards are only set up once extraction starts
+    initialize_earth_engine()
+
+    # Read the Johannesburg wards, pre-projected to Web Mercator for the basemap
+    gdf = load_wards(crs=3857)
+
+    # Convert to Earth Engine FeatureCollection, compacted for the 1 km
+    # default extraction scale (the coarsest datasets are ~9 km)
+    ee_fc = gdf_to_ee_fc(load_wards(columns=['WardID_']), scale=1000)
+
+    # Create output directory
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # 1. ERA5-Land Temperature
+    era5_land = ee.ImageCollection("ECMWF/ERA5_LAND/HOURLY") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .select('temperature_2m') \
+        .mean() \
+        .subtract(273.15)  # Convert to Celsius
+
+    # 2. Latest MODIS LST
+    modis_lst = ee.ImageCollection("MODIS/061/MOD11A2") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .select('LST_Day_1km') \
+        .mean() \
+        .multiply(0.02) \
+        .subtract(273.15)
 
+    # 3. Latest MODIS NDVI
+    modis_ndvi = ee.ImageCollection("MODIS/061/MOD13Q1") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .select('NDVI') \
+        .mean() \
+        .multiply(0.0001)
+
+    # 4. WorldPop Population Density
+    worldpop = ee.ImageCollection("WorldPop/GP/100m/pop") \
+        .filterDate('2020-01-01', '2020-12-31') \
+        .first()
+
+    # 5. Urban Heat Island
+    uhi = ee.ImageCollection("YALE/YCEO/UHI/UHI_all_averaged") \
+        .filterBounds(ee_fc.geometry()) \
+        .first() \
+        .select('UHI')
+
+    images = [('ERA5_TEMP', era5_land), ('MODIS_LST', modis_lst), ('MODIS_NDVI', modis_ndvi),
+              ('POPULATION', worldpop), ('UHI', uhi)]
+
+    if batched:
+        # One multi-band reduction returns every indicator in a wide table
+        print(f"Requesting {len(images)} Earth Engine datasets as one batch...")
+        table = extract_ee_data_batched(images, ee_fc, max_in_flight=max_in_flight)
+        if table is not None:
+            keys = gdf['WardID_'].astype(str)
+            for column, _ in images:
+                gdf[column] = table[f'{column}_mean'].reindex(keys).to_numpy()
+    else:
+        # The datasets are independent, so request them all at once and
+        # assemble the results in the fixed order above
+        print(f"Requesting {len(images)} Earth Engine datasets...")
+        results = run_requests(
+            [(column, lambda image=image: extract_ee_data(image, ee_fc))
+             for column, image in images],
+            max_in_flight=max_in_flight
+        )
+        for (column, _), data in zip(images, results):
+            if data:
+                join_results(gdf, data, {column: 'mean'})
+
+    # Save the updated GeoJSON with new data
+    # Convert back to geographic coordinates for saving
+    gdf_save = gdf.copy()
+    gdf_save = gdf_save.set_geometry(load_wards(columns=[]).geometry.values, crs='EPSG:4326')
+    gdf_save.to_file(OUTPUT_GEOJSON, driver='GeoJSON')
+    return gdf
+
+def render_indicator_maps(gdf=None, processes=None):
+    """Render the per-indicator maps and the combined figure; returns the files written"""
+    if gdf is None:
+        # Rendering on its own starts from the saved extraction
+        gdf = gpd.read_file(OUTPUT_GEOJSON).to_crs(epsg=3857)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Render the per-indicator maps in parallel
+    map_jobs = [(column, title, cmap, label, os.path.join(OUTPUT_DIR, filename))
+                for column, title, cmap, label, filename in INDICATOR_MAPS
+                if column in gdf.columns]
+    print(f"Rendering {len(map_jobs)} maps...")
+    written = render_maps(map_jobs, gdf, create_map, processes=processes)
+
+    # Create combined visualization
+    print("Creating combined visualization...")
+    # Assembled from the layers the single maps above just cached
+    combined_path = os.path.join(OUTPUT_DIR, 'combined_ee_analysis.png')
+    compose_panels(gdf, [
+        Panel('ERA5_TEMP', 'RdYlBu_r', 'ERA5-Land Temperature', 'Temperature (°C)'),
+        Panel('MODIS_LST', 'RdYlBu_r', 'MODIS LST', 'Temperature (°C)'),
+        Panel('MODIS_NDVI', 'YlGn', 'MODIS NDVI', 'NDVI'),
+        Panel('POPULATION', 'YlOrRd', 'Population Density', 'Population per 100m²'),
+        Panel('UHI', 'RdYlBu_r', 'Urban Heat Island', 'Temperature Difference (°C)'),
+    ], combined_path, nrows=3, ncols=COMBINED_COLUMNS, figsize=COMBINED_FIGSIZE)
+    return written + [combined_path]
+
+def main(max_in_flight=4, batched=False, processes=None):
+    try:
+        gdf = extract_indicators(max_in_flight=max_in_flight, batched=batched)
+        render_indicator_maps(gdf, processes=processes)
     except Exception as e:
         print(f"Error in main execution: {str(e)}")
 
@@ -0,0 +1,84 @@
+import json
+import math
+
+import ee
+import shapely
+
+from ward_topology import simplify_shared
+
+# Approximate length of one degree of latitude, used to turn metres into degrees
+METRES_PER_DEGREE = 111320.0
+
+
+def compact_geometries(geometries, scale, tolerance_fraction=0.5):
+    """Simplify and quantize WGS84 geometries for a reduction at ``scale`` metres.
+
+    Vertices closer together than ``tolerance_fraction`` of a pixel cannot
+    change which pixels a ward covers, so boundaries are simplified at that
+    tolerance and snapped to a decimal grid a tenth of the tolerance. Shared
+    boundaries are simplified once for both wards (``simplify_shared``), so
+    neighbours keep meeting exactly and no edge pixel is missed or counted
+    twice.
+    """
+    tolerance = scale * tolerance_fraction / METRES_PER_DEGREE
+    digits = -math.floor(math.log10(tolerance / 10.0))
+    return simplify_shared(geometries, tolerance, digits)
+
+
+def to_geojson_features(gdf, id_column='WardID_', properties=(), scale=None):
+    """Serialize every geometry of a GeoDataFrame to GeoJSON features in bulk.
+
+    Geometries are written by ``shapely.to_geojson`` straight from the
+    geometry array, so rings, holes and multipart structure come through
+    untouched and no Python code walks the vertices. The ``id_column``
+    value becomes the feature id (and is kept as a property for joins).
+    When ``scale`` (metres) is given the geometries are first compacted
+    for that resolution with ``compact_geometries``.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+
+    geometry_array = gdf.geometry.values
+    if scale is not None:
+        geometry_array = compact_geometries(geometry_array, scale)
+    geometries = shapely.to_geojson(geometry_array)
+    ids = gdf[id_column].astype(str).tolist() if id_column in gdf.columns \
+        else gdf.index.astype(str).tolist()
+    columns = [id_column] + [c for c in properties if c != id_column]
+    records = gdf.assign(**{id_column: ids})[columns].to_json(orient='records', lines=True).splitlines()
+
+    # Build one document and parse it once rather than a dict per vertex list
+    document = '[' + ','.join(
+        f'{{"type":"Feature","id":{json.dumps(feature_id)},"geometry":{geometry},"properties":{props}}}'
+        for feature_id, geometry, props in zip(ids, geometries, records)
+        if geometry is not None
+    ) + ']'
+    return json.loads(document)
+
+
+def payload_size(features):
+    """Size in bytes of the features as they would be sent in a request"""
+    return len(json.dumps(features, separators=(',', ':')).encode('utf-8'))
+
+
+def gdf_to_feature_collection(gdf, id_column='WardID_', properties=(), scale=None,
+                              verbose=False):
+    """Convert a GeoDataFrame to an Earth Engine FeatureCollection keyed by ``id_column``.
+
+    Pass the reduction ``scale`` in metres to upload geometries simplified
+    for that resolution; with ``verbose`` the before/after request size is
+    printed.
+    """
+    features = to_geojson_features(gdf, id_column, properties, scale=scale)
+    if scale is not None and verbose:
+        full_size = payload_size(to_geojson_features(gdf, id_column, properties))
+        print(f"Ward geometry payload at {scale} m: "
+              f"{full_size / 1024:.1f} KB -> {payload_size(features) / 1024:.1f} KB")
+    return ee.FeatureCollection([ee.Feature(feature) for feature in features])
+
+
+def geometry_to_ee(geom):
+    """Convert a Shapely geometry to an Earth Engine geometry, holes included"""
+    if geom.geom_type not in ('Polygon', 'MultiPolygon'):
+        raise ValueError(f"Unsupported geometry type: {geom.geom_type}")
+    return ee.Geometry(json.loads(shapely.to_geojson(geom)))
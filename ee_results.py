@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+def features_to_frame(data, id_column='WardID_'):
+    """Decode a reduceRegions response into typed columns indexed by ``id_column``.
+
+    Each property becomes one NumPy column; numeric outputs are float64
+    with NaN where Earth Engine returned nothing (e.g. a ward with no
+    unmasked pixels).
+    """
+    features = data.get('features', []) if data else []
+    properties = [feature.get('properties') or {} for feature in features]
+    names = []
+    for props in properties:
+        for name in props:
+            if name not in names:
+                names.append(name)
+
+    columns = {}
+    for name in names:
+        values = [props.get(name) for props in properties]
+        if name == id_column:
+            columns[name] = np.array([str(value) for value in values], dtype=object)
+        elif all(value is None or isinstance(value, (int, float)) for value in values):
+            columns[name] = np.array([np.nan if value is None else value for value in values],
+                                     dtype=np.float64)
+        else:
+            columns[name] = np.array(values, dtype=object)
+
+    if id_column not in columns:
+        raise ValueError(f"Earth Engine response has no '{id_column}' property to join on")
+
+    frame = pd.DataFrame(columns).set_index(id_column)
+    if frame.index.has_duplicates:
+        raise ValueError(f"Earth Engine response has duplicate '{id_column}' values")
+    return frame
+
+
+def join_results(gdf, data, columns, id_column='WardID_'):
+    """Copy reducer outputs onto ``gdf`` by ward id rather than by row order.
+
+    ``columns`` maps GeoDataFrame column -> response property (for example
+    ``{'LST': 'mean'}``). Wards missing from the response get NaN.
+    """
+    frame = features_to_frame(data, id_column)
+    keys = gdf[id_column].astype(str)
+    for column, output in columns.items():
+        gdf[column] = frame[output].reindex(keys).to_numpy() if output in frame.columns \
+            else np.nan
+    return gdf
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Substrings Earth Engine uses when a request is throttled rather than wrong.
+# 'User memory limit exceeded' is left out: the same request fails the same
+# way again, so retrying it only wastes the backoff
+QUOTA_MARKERS = ('429', 'too many requests', 'quota', 'rate limit',
+                 'too many concurrent', 'resource exhausted')
+
+
+class RequestTimeout(Exception):
+    """Raised when a single request attempt runs past its deadline"""
+
+
+def is_quota_error(error):
+    """Return True for throttling errors that are worth retrying"""
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_MARKERS)
+
+
+def call_with_timeout(func, timeout, slots=None):
+    """Run ``func`` in a helper thread and give up waiting after ``timeout`` seconds.
+
+    Blocking calls such as ``getInfo()`` cannot be interrupted, so a timed
+    out attempt is abandoned (its daemon thread finishes in the background)
+    rather than killed. With ``slots``, a semaphore, each attempt holds a
+    slot until ``func`` really returns, abandoned or not, so no more requests
+    run at once than the semaphore allows. Waiting for a slot is bounded by
+    ``timeout`` too: when abandoned attempts hold every slot for that long,
+    this attempt fails with RequestTimeout instead of waiting on them.
+    """
+    if slots is not None and not slots.acquire(timeout=timeout if timeout is not None else -1):
+        raise RequestTimeout(f"no request slot freed within {timeout}s")
+    if timeout is None:
+        try:
+            return func()
+        finally:
+            if slots is not None:
+                slots.release()
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            if slots is not None:
+                slots.release()
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise RequestTimeout(f"request exceeded {timeout}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def call_with_retry(func, timeout=None, retries=5, base_delay=2.0, max_delay=60.0, slots=None):
+    """Call ``func``, retrying quota/429 errors with jittered exponential backoff"""
+    attempt = 0
+    while True:
+        try:
+            return call_with_timeout(func, timeout, slots)
+        except Exception as e:
+            if attempt >= retries or not is_quota_error(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+
+
+def run_requests(jobs, max_in_flight=4, timeout=600, retries=5, base_delay=2.0):
+    """Run independent requests concurrently and return results in job order.
+
+    ``jobs`` is a sequence of ``(name, callable)`` pairs. At most
+    ``max_in_flight`` callables run at once, counting attempts abandoned
+    after their ``timeout`` until they actually finish. A job that cannot
+    get a slot within ``timeout`` fails rather than waiting on a hung
+    request, so a run always finishes. Throttling errors are retried with
+    backoff. A job that still fails yields ``None`` in its slot, so callers
+    can keep their existing ``if data:`` checks.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    workers = max(1, min(max_in_flight, len(jobs)))
+    slots = threading.BoundedSemaphore(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call_with_retry, func, timeout, retries, base_delay, slots=slots)
+                   for _, func in jobs]
+        results = []
+        for (name, _), future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error in {name}: {str(e)}")
+                results.append(None)
+    return results
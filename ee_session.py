@@ -0,0 +1,21 @@
+_initialized = False
+
+
+def initialize_earth_engine():
+    """Initialize Earth Engine on first use; later calls are free"""
+    global _initialized
+    if _initialized:
+        return
+
+    import ee
+    try:
+        # Try to initialize Earth Engine
+        ee.Initialize()
+        print("Earth Engine initialized successfully!")
+    except Exception as e:
+        print("Authentication required. Please follow these steps:")
+        print("1. Go to https://code.earthengine.google.com/")
+        print("2. Sign in with your Google account")
+        print("3. Run 'earthengine authenticate' in your terminal")
+        raise Exception("Earth Engine authentication required") from e
+    _initialized = True
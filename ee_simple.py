@@ -1,207 +1,179 @@
 import ee
-import geemap
 import geopandas as gpd
 import matplotlib.pyplot as plt
-import contextily as ctx
 import os
 import pandas as pd
 import numpy as np
-import rasterio
-from rasterio.mask import mask
-
-# Initialize Earth Engine
-ee.Initialize()
-
-def geometry_to_ee(geom):
-    """Convert Shapely geometry to Earth Engine geometry"""
-    if geom.geom_type == 'Polygon':
-        coords = [[[x, y] for x, y in zip(*geom.exterior.coords.xy)]]
-        return ee.Geometry.Polygon(coords)
-    elif geom.geom_type == 'MultiPolygon':
-        coords = []
-        for poly in geom.geoms:
-            coords.extend([[[x, y] for x, y in zip(*poly.exterior.coords.xy)]])
-        return ee.Geometry.MultiPolygon(coords)
-    else:
-        raise ValueError(f"Unsupported geometry type: {geom.geom_type}")
+
+from ee_cache import cached_reduce_regions
+from ee_geometry import gdf_to_feature_collection, geometry_to_ee
+from ee_results import join_results
+from ee_scheduler import run_requests
+from ee_session import initialize_earth_engine
+from panel_cache import Panel, compose_panels, draw_panel, layer_extent
+from render_queue import render_maps
+from ward_data import load_wards
+from zonal_stats import zonal_statistics
+
+OUTPUT_DIR = "ee_maps"
+OUTPUT_GEOJSON = os.path.join(OUTPUT_DIR, 'johannesburg_ee_data.geojson')
+WORLDPOP_PATH = os.path.join('World_Pop', 'zaf_ppp_2020_UNadj_constrained.tif')
+# Column, map title, colormap, legend label, file name
+INDICATOR_MAPS = [
+    ('LST', 'Land Surface Temperature (2023)', 'RdYlBu_r', 'Temperature (°C)', 'lst_map.png'),
+    ('POPULATION', 'Population Density (2020)', 'YlOrRd', 'Population per 100m²', 'population_map.png'),
+    ('NDVI', 'Vegetation Index (2023)', 'YlGn', 'NDVI', 'ndvi_map.png'),
+    ('LANDSAT_TEMP', 'Landsat Surface Temperature (2023)', 'RdYlBu_r', 'Temperature (°C)',
+     'landsat_temp_map.png'),
+]
+# Size of the combined figure; its panels are MAP_LAYER_WIDTH inches wide,
+# and the single maps use layers of that width too, so each is drawn once
+COMBINED_FIGSIZE = (20, 20)
+COMBINED_COLUMNS = 2
+MAP_LAYER_WIDTH = COMBINED_FIGSIZE[0] / COMBINED_COLUMNS
 
 def create_map(gdf, column, title, cmap, label, output_path):
     """Create and save a map visualization"""
     fig, ax = plt.subplots(figsize=(15, 15))
-    gdf.plot(column=column, 
-            cmap=cmap,
-            legend=True,
-            ax=ax,
-            legend_kwds={'label': label})
-    ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron)
-    ax.set_title(title, fontsize=16)
-    ax.axis('off')
+    # The wards and basemap come from the layer cached for the combined figure
+    draw_panel(ax, gdf, Panel(column, cmap, title, label), layer_extent(gdf),
+               dpi=300, width=MAP_LAYER_WIDTH, title_kwds={'fontsize': 16})
     plt.savefig(output_path, bbox_inches='tight', dpi=300)
     plt.close()
 
 def extract_raster_values(gdf, raster_path):
     """Extract mean values from a raster for each polygon in the GeoDataFrame"""
-    with rasterio.open(raster_path) as src:
-        means = []
-        for geom in gdf.geometry:
-            try:
-                # Get pixel values within the geometry
-                out_image, out_transform = mask(src, [geom.__geo_interface__], crop=True)
-                # Calculate mean, excluding no data values
-                data = out_image[0]
-                if data.size > 0:
-                    mean_val = np.mean(data[data > 0])  # Exclude zeros/no data
-                else:
-                    mean_val = np.nan
-                means.append(mean_val)
-            except Exception as e:
-                print(f"Error extracting raster values: {str(e)}")
-                means.append(np.nan)
-        return means
-
-def main():
     try:
-        # Read the GeoJSON file
-        print("Reading GeoJSON file...")
-        gdf = gpd.read_file('HVI_with_CVI.geojson')
-        gdf = gdf.to_crs(epsg=3857)  # Convert to Web Mercator for plotting
-        
-        # Create a feature collection from the GeoJSON
-        print("Converting to Earth Engine features...")
-        features = []
-        gdf_geo = gdf.to_crs(epsg=4326)  # Convert to WGS84 for Earth Engine
-        for idx, row in gdf_geo.iterrows():
-            try:
-                ee_geom = geometry_to_ee(row.geometry)
-                feature = ee.Feature(ee_geom, {'id': str(idx)})
-                features.append(feature)
-            except Exception as e:
-                print(f"Error converting geometry at index {idx}: {str(e)}")
-        
-        ee_fc = ee.FeatureCollection(features)
-        
-        # Create output directory
-        output_dir = "ee_maps"
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 1. MODIS LST
-        print("Getting MODIS LST data...")
-        modis = ee.ImageCollection("MODIS/061/MOD11A2") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .select('LST_Day_1km') \
-            .mean() \
-            .multiply(0.02) \
-            .subtract(273.15)
-        
-        lst_data = modis.reduceRegions(
-            collection=ee_fc,
+        # Label every ward once and reduce all of them in a single pass
+        stats = zonal_statistics(gdf, raster_path, stats=('mean',))
+        return stats['mean'].tolist()
+    except Exception as e:
+        print(f"Error extracting raster values: {str(e)}")
+        return [np.nan] * len(gdf)
+
+def extract_indicators(max_in_flight=4):
+    """Reduce LST, NDVI, Landsat and WorldPop over the wards and save OUTPUT_GEOJSON.
+
+    Returns the wards in Web Mercator with one column per indicator found.
+    """
+    initialize_earth_engine()
+
+    # Read the GeoJSON file
+    print("Reading GeoJSON file...")
+    gdf = load_wards(crs=3857)  # Web Mercator for plotting
+    
+    # Create a feature collection from the GeoJSON
+    print("Converting to Earth Engine features...")
+    gdf_geo = load_wards(columns=['WardID_'])  # WGS84 for Earth Engine
+    # One collection per reduction scale, simplified for that pixel size
+    ee_fcs = {scale: gdf_to_feature_collection(gdf_geo, id_column='WardID_', scale=scale)
+              for scale in (1000, 250, 30)}
+    
+    # Create output directory
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # 1. MODIS LST
+    modis = ee.ImageCollection("MODIS/061/MOD11A2") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .select('LST_Day_1km') \
+        .mean() \
+        .multiply(0.02) \
+        .subtract(273.15)
+
+    # 2. WorldPop from local TIF
+    worldpop_path = os.path.abspath(WORLDPOP_PATH)
+    print(f"Looking for WorldPop TIF at: {worldpop_path}")
+
+    # 3. MODIS NDVI
+    ndvi = ee.ImageCollection("MODIS/061/MOD13Q1") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .select('NDVI') \
+        .mean() \
+        .multiply(0.0001)
+
+    # 4. Landsat Surface Temperature
+    landsat = ee.ImageCollection("LANDSAT/LC08/C02/T1_L2") \
+        .filterDate('2023-01-01', '2023-12-31') \
+        .filterBounds(ee_fcs[30].geometry()) \
+        .select('ST_B10') \
+        .mean() \
+        .multiply(0.00341802) \
+        .add(149.0) \
+        .subtract(273.15)
+
+    def reduce(image, scale):
+        return lambda: cached_reduce_regions(
+            image,
+            collection=ee_fcs[scale],
             reducer=ee.Reducer.mean(),
-            scale=1000
-        ).getInfo()
-        
-        if lst_data:
-            gdf['LST'] = pd.DataFrame(lst_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'LST', 'Land Surface Temperature (2023)',
-                      'RdYlBu_r', 'Temperature (°C)',
-                      os.path.join(output_dir, 'lst_map.png'))
-
-        # 2. WorldPop from local TIF
-        print("Processing WorldPop data...")
-        worldpop_path = os.path.abspath(os.path.join('World_Pop', 'zaf_ppp_2020_UNadj_constrained.tif'))
-        print(f"Looking for WorldPop TIF at: {worldpop_path}")
-        if os.path.exists(worldpop_path):
-            gdf['POPULATION'] = extract_raster_values(gdf_geo, worldpop_path)
-            create_map(gdf, 'POPULATION', 'Population Density (2020)',
-                      'YlOrRd', 'Population per 100m²',
-                      os.path.join(output_dir, 'population_map.png'))
-        else:
+            scale=scale
+        )
+
+    def read_worldpop():
+        if not os.path.exists(worldpop_path):
             print(f"WorldPop TIF file not found at: {worldpop_path}")
+            return None
+        return extract_raster_values(gdf_geo, worldpop_path)
 
-        # 3. MODIS NDVI
-        print("Getting MODIS NDVI data...")
-        ndvi = ee.ImageCollection("MODIS/061/MOD13Q1") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .select('NDVI') \
-            .mean() \
-            .multiply(0.0001)
-        
-        ndvi_data = ndvi.reduceRegions(
-            collection=ee_fc,
-            reducer=ee.Reducer.mean(),
-            scale=250
-        ).getInfo()
-        
-        if ndvi_data:
-            gdf['NDVI'] = pd.DataFrame(ndvi_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'NDVI', 'Vegetation Index (2023)',
-                      'YlGn', 'NDVI',
-                      os.path.join(output_dir, 'ndvi_map.png'))
-
-        # 4. Landsat Surface Temperature
-        print("Getting Landsat temperature data...")
-        landsat = ee.ImageCollection("LANDSAT/LC08/C02/T1_L2") \
-            .filterDate('2023-01-01', '2023-12-31') \
-            .filterBounds(ee_fc.geometry()) \
-            .select('ST_B10') \
-            .mean() \
-            .multiply(0.00341802) \
-            .add(149.0) \
-            .subtract(273.15)
-        
-        landsat_data = landsat.reduceRegions(
-            collection=ee_fc,
-            reducer=ee.Reducer.mean(),
-            scale=30
-        ).getInfo()
-        
-        if landsat_data:
-            gdf['LANDSAT_TEMP'] = pd.DataFrame(landsat_data['features'])['properties'].apply(lambda x: x.get('mean'))
-            create_map(gdf, 'LANDSAT_TEMP', 'Landsat Surface Temperature (2023)',
-                      'RdYlBu_r', 'Temperature (°C)',
-                      os.path.join(output_dir, 'landsat_temp_map.png'))
-
-        # Create combined visualization
-        if all(col in gdf.columns for col in ['LST', 'NDVI', 'LANDSAT_TEMP', 'POPULATION']):
-            print("Creating combined visualization...")
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(20, 20))
-            
-            # Plot each dataset
-            gdf.plot(column='LST', cmap='RdYlBu_r', legend=True,
-                    ax=ax1, legend_kwds={'label': 'Temperature (°C)'})
-            ctx.add_basemap(ax1, source=ctx.providers.CartoDB.Positron)
-            ax1.set_title('MODIS LST')
-            ax1.axis('off')
-            
-            gdf.plot(column='LANDSAT_TEMP', cmap='RdYlBu_r', legend=True,
-                    ax=ax2, legend_kwds={'label': 'Temperature (°C)'})
-            ctx.add_basemap(ax2, source=ctx.providers.CartoDB.Positron)
-            ax2.set_title('Landsat Temperature')
-            ax2.axis('off')
-            
-            gdf.plot(column='NDVI', cmap='YlGn', legend=True,
-                    ax=ax3, legend_kwds={'label': 'NDVI'})
-            ctx.add_basemap(ax3, source=ctx.providers.CartoDB.Positron)
-            ax3.set_title('Vegetation Index')
-            ax3.axis('off')
-            
-            gdf.plot(column='POPULATION', cmap='YlOrRd', legend=True,
-                    ax=ax4, legend_kwds={'label': 'Population per 100m²'})
-            ctx.add_basemap(ax4, source=ctx.providers.CartoDB.Positron)
-            ax4.set_title('Population Density')
-            ax4.axis('off')
-            
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, 'combined_analysis.png'),
-                       bbox_inches='tight', dpi=300)
-            plt.close()
-
-        # Save the updated GeoJSON
-        print("Saving updated GeoJSON...")
-        gdf_save = gdf.copy()
-        gdf_save = gdf_save.to_crs(epsg=4326)
-        gdf_save.to_file(os.path.join(output_dir, 'johannesburg_ee_data.geojson'),
-                         driver='GeoJSON')
-        
+    # The Earth Engine requests and the local raster read are independent,
+    # so run them together and map the results in the original order
+    print("Getting MODIS LST, WorldPop, MODIS NDVI and Landsat data...")
+    lst_data, population, ndvi_data, landsat_data = run_requests([
+        ('MODIS LST', reduce(modis, 1000)),
+        ('WorldPop', read_worldpop),
+        ('MODIS NDVI', reduce(ndvi, 250)),
+        ('Landsat temperature', reduce(landsat, 30)),
+    ], max_in_flight=max_in_flight)
+
+    if lst_data:
+        join_results(gdf, lst_data, {'LST': 'mean'})
+    if population is not None:
+        gdf['POPULATION'] = population
+    if ndvi_data:
+        join_results(gdf, ndvi_data, {'NDVI': 'mean'})
+    if landsat_data:
+        join_results(gdf, landsat_data, {'LANDSAT_TEMP': 'mean'})
+
+    # Save the updated GeoJSON
+    print("Saving updated GeoJSON...")
+    gdf_save = gdf.copy()
+    gdf_save = gdf_save.set_geometry(gdf_geo.geometry.values, crs='EPSG:4326')
+    gdf_save.to_file(OUTPUT_GEOJSON, driver='GeoJSON')
+    return gdf
+
+def render_indicator_maps(gdf=None, processes=None):
+    """Render the maps of the indicators present; returns the files written"""
+    if gdf is None:
+        # Rendering on its own starts from the saved extraction
+        gdf = gpd.read_file(OUTPUT_GEOJSON).to_crs(epsg=3857)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    map_jobs = [(column, title, cmap, label, os.path.join(OUTPUT_DIR, filename))
+                for column, title, cmap, label, filename in INDICATOR_MAPS
+                if column in gdf.columns]
+
+    # The per-indicator maps are independent, so render them in parallel
+    print(f"Rendering {len(map_jobs)} maps...")
+    written = render_maps(map_jobs, gdf, create_map, processes=processes)
+
+    # Create combined visualization
+    if all(col in gdf.columns for col in ['LST', 'NDVI', 'LANDSAT_TEMP', 'POPULATION']):
+        print("Creating combined visualization...")
+        # Assembled from the layers the single maps above just cached
+        combined_path = os.path.join(OUTPUT_DIR, 'combined_analysis.png')
+        compose_panels(gdf, [
+            Panel('LST', 'RdYlBu_r', 'MODIS LST', 'Temperature (°C)'),
+            Panel('LANDSAT_TEMP', 'RdYlBu_r', 'Landsat Temperature', 'Temperature (°C)'),
+            Panel('NDVI', 'YlGn', 'Vegetation Index', 'NDVI'),
+            Panel('POPULATION', 'YlOrRd', 'Population Density', 'Population per 100m²'),
+        ], combined_path, nrows=2, ncols=COMBINED_COLUMNS, figsize=COMBINED_FIGSIZE)
+        written.append(combined_path)
+    return written
+
+def main(max_in_flight=4, processes=None):
+    try:
+        gdf = extract_indicators(max_in_flight=max_in_flight)
+        render_indicator_maps(gdf, processes=processes)
         print("Analysis complete! Check the 'ee_maps' directory for results.")
         
     except Exception as e:
@@ -1,26 +1,24 @@
 import geopandas as gpd
 import matplotlib.pyplot as plt
-import contextily as ctx
 import ee
 import numpy as np
 from matplotlib.colors import LinearSegmentedColormap
 import os
 
-# Initialize Earth Engine
-try:
-    ee.Initialize()
-except Exception as e:
-    print("Earth Engine initialization failed:", str(e))
-    print("Continuing with local data only...")
-
-# Read the Johannesburg shapefile
-gdf = gpd.read_file('HVI_with_CVI.geojson')
+from ee_session import initialize_earth_engine
+from panel_cache import Panel, compose_panels
+from render_queue import render_maps
+from tile_cache import add_basemap
+from ward_data import load_wards
+from ward_layer import plot_column, ward_layer
 
 def create_base_map(gdf, title):
     """Create a base map with consistent styling"""
     fig, ax = plt.subplots(figsize=(15, 15))
-    gdf.to_crs(epsg=3857).plot(ax=ax, alpha=0.6)
-    ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 3857:
+        gdf = gdf.to_crs(epsg=3857)
+    ward_layer(gdf).draw(ax, alpha=0.6)
+    add_basemap(ax)
     ax.set_title(title, fontsize=16, pad=20)
     ax.axis('off')
     return fig, ax
@@ -46,155 +44,88 @@ def get_ee_data(collection_name, start_date, end_date, band_name, scale_factor=1
         print(f"Error getting Earth Engine data: {str(e)}")
         return None
 
-def create_visualizations():
-    """Create all visualizations"""
-    output_dir = "static_maps"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 1. LST Visualization
-    print("Creating LST visualization...")
-    try:
-        lst_data = get_ee_data(
-            "MODIS/006/MOD11A2",
-            '2023-01-01',
-            '2023-12-31',
-            'LST_Day_1km',
-            0.02
-        )
-        if lst_data is not None:
-            # Create visualization
-            fig, ax = create_base_map(gdf, 'Land Surface Temperature (2023)')
-            gdf.plot(
-                column='LST',
-                cmap='RdYlBu_r',
-                legend=True,
-                ax=ax,
-                legend_kwds={'label': 'Temperature (°C)'}
-            )
-            plt.savefig(os.path.join(output_dir, 'lst_map.png'), 
-                       bbox_inches='tight', dpi=300)
-            plt.close()
-    except Exception as e:
-        print(f"Error creating LST visualization: {str(e)}")
-
-    # 2. NDVI Visualization
-    print("Creating NDVI visualization...")
-    try:
-        ndvi_data = get_ee_data(
-            "MODIS/006/MOD13Q1",
-            '2023-01-01',
-            '2023-12-31',
-            'NDVI',
-            0.0001
-        )
-        if ndvi_data is not None:
-            fig, ax = create_base_map(gdf, 'Normalized Difference Vegetation Index (2023)')
-            gdf.plot(
-                column='NDVI',
-                cmap='YlGn',
-                legend=True,
-                ax=ax,
-                legend_kwds={'label': 'NDVI'}
-            )
-            plt.savefig(os.path.join(output_dir, 'ndvi_map.png'), 
-                       bbox_inches='tight', dpi=300)
-            plt.close()
-    except Exception as e:
-        print(f"Error creating NDVI visualization: {str(e)}")
-
-    # 3. HVI Visualization
-    print("Creating HVI visualization...")
+def create_indicator_map(gdf, column, title, cmap, label, output_path):
+    """Render one indicator over the base map and save it"""
     try:
-        fig, ax = create_base_map(gdf, 'Health Vulnerability Index')
-        gdf.plot(
-            column='HVI',
-            cmap='YlOrRd',
+        fig, ax = create_base_map(gdf, title)
+        plot_column(
+            gdf,
+            column,
+            ax,
+            cmap=cmap,
             legend=True,
-            ax=ax,
-            legend_kwds={'label': 'HVI Score'}
+            legend_kwds={'label': label}
         )
-        plt.savefig(os.path.join(output_dir, 'hvi_map.png'), 
-                   bbox_inches='tight', dpi=300)
+        plt.savefig(output_path, bbox_inches='tight', dpi=300)
         plt.close()
     except Exception as e:
-        print(f"Error creating HVI visualization: {str(e)}")
+        print(f"Error creating {title} visualization: {str(e)}")
 
-    # 4. CVI Visualization
-    print("Creating CVI visualization...")
+def create_visualizations(gdf=None, processes=None):
+    """Create all visualizations; returns the files written"""
+    # Initialize Earth Engine
     try:
-        fig, ax = create_base_map(gdf, 'Climate Vulnerability Index')
-        gdf.plot(
-            column='CVI',
-            cmap='RdYlBu_r',
-            legend=True,
-            ax=ax,
-            legend_kwds={'label': 'CVI Score'}
-        )
-        plt.savefig(os.path.join(output_dir, 'cvi_map.png'), 
-                   bbox_inches='tight', dpi=300)
-        plt.close()
+        initialize_earth_engine()
     except Exception as e:
-        print(f"Error creating CVI visualization: {str(e)}")
+        print("Earth Engine initialization failed:", str(e))
+        print("Continuing with local data only...")
+
+    if gdf is None:
+        # Read the Johannesburg wards, already projected to Web Mercator for the basemap
+        gdf = load_wards(crs=3857)
+
+    output_dir = "static_maps"
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 1-2. LST and NDVI need Earth Engine; 3-4. HVI and CVI are local
+    print("Checking Earth Engine LST and NDVI data...")
+    lst_data = get_ee_data(
+        "MODIS/006/MOD11A2",
+        '2023-01-01',
+        '2023-12-31',
+        'LST_Day_1km',
+        0.02
+    )
+    ndvi_data = get_ee_data(
+        "MODIS/006/MOD13Q1",
+        '2023-01-01',
+        '2023-12-31',
+        'NDVI',
+        0.0001
+    )
+
+    map_jobs = []
+    if lst_data is not None:
+        map_jobs.append(('LST', 'Land Surface Temperature (2023)', 'RdYlBu_r',
+                         'Temperature (°C)', os.path.join(output_dir, 'lst_map.png')))
+    if ndvi_data is not None:
+        map_jobs.append(('NDVI', 'Normalized Difference Vegetation Index (2023)', 'YlGn',
+                         'NDVI', os.path.join(output_dir, 'ndvi_map.png')))
+    map_jobs.append(('HVI', 'Health Vulnerability Index', 'YlOrRd',
+                     'HVI Score', os.path.join(output_dir, 'hvi_map.png')))
+    map_jobs.append(('CVI', 'Climate Vulnerability Index', 'RdYlBu_r',
+                     'CVI Score', os.path.join(output_dir, 'cvi_map.png')))
+
+    # Each map is an independent figure, so render them in parallel
+    print(f"Creating {len(map_jobs)} indicator visualizations...")
+    written = render_maps(map_jobs, gdf, create_indicator_map, processes=processes)
 
     # 5. Combined Visualization
     print("Creating combined visualization...")
     try:
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(20, 20))
-        
-        # HVI
-        gdf.plot(
-            column='HVI',
-            cmap='YlOrRd',
-            legend=True,
-            ax=ax1,
-            legend_kwds={'label': 'HVI Score'}
-        )
-        ctx.add_basemap(ax1, source=ctx.providers.CartoDB.Positron)
-        ax1.set_title('Health Vulnerability Index')
-        ax1.axis('off')
-        
-        # CVI
-        gdf.plot(
-            column='CVI',
-            cmap='RdYlBu_r',
-            legend=True,
-            ax=ax2,
-            legend_kwds={'label': 'CVI Score'}
-        )
-        ctx.add_basemap(ax2, source=ctx.providers.CartoDB.Positron)
-        ax2.set_title('Climate Vulnerability Index')
-        ax2.axis('off')
-        
-        # LST
-        gdf.plot(
-            column='LST',
-            cmap='RdYlBu_r',
-            legend=True,
-            ax=ax3,
-            legend_kwds={'label': 'Temperature (°C)'}
-        )
-        ctx.add_basemap(ax3, source=ctx.providers.CartoDB.Positron)
-        ax3.set_title('Land Surface Temperature')
-        ax3.axis('off')
-        
-        # NDVI
-        gdf.plot(
-            column='NDVI',
-            cmap='YlGn',
-            legend=True,
-            ax=ax4,
-            legend_kwds={'label': 'NDVI'}
-        )
-        ctx.add_basemap(ax4, source=ctx.providers.CartoDB.Positron)
-        ax4.set_title('Normalized Difference Vegetation Index')
-        ax4.axis('off')
-        
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'combined_vulnerability_maps.png'), 
-                   bbox_inches='tight', dpi=300)
-        plt.close()
+        # Layers are cached under .hvi_cache/panels, so later runs only redraw
+        # titles and colour bars (the maps above draw their own base layer)
+        combined_path = os.path.join(output_dir, 'combined_vulnerability_maps.png')
+        compose_panels(gdf, [
+            Panel('HVI', 'YlOrRd', 'Health Vulnerability Index', 'HVI Score'),
+            Panel('CVI', 'RdYlBu_r', 'Climate Vulnerability Index', 'CVI Score'),
+            Panel('LST', 'RdYlBu_r', 'Land Surface Temperature', 'Temperature (°C)'),
+            Panel('NDVI', 'YlGn', 'Normalized Difference Vegetation Index', 'NDVI'),
+        ], combined_path, nrows=2, ncols=2, figsize=(20, 20))
+        written.append(combined_path)
     except Exception as e:
         print(f"Error creating combined visualization: {str(e)}")
+    return written
 
 if __name__ == "__main__":
     create_visualizations()
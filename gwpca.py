@@ -0,0 +1,221 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from hvi_composite import HVI_VARIABLES, principal_components, standardize
+from render_queue import default_workers, render_maps
+from spatial_weights import ward_coordinates
+from ward_data import load_wards
+
+DEFAULT_COMPONENTS = 2
+# Values gathered per batched covariance/eigh call; bounds the (wards, neighbours,
+# variables) tensor each thread holds
+CHUNK_VALUES = 4000000
+# Widest adaptive bandwidth the cross-validation tries, in wards
+MAX_SEARCH_BANDWIDTH = 1000
+# Golden-section search stops once the bracket is this many neighbours wide
+SEARCH_TOLERANCE = 2
+OUTPUT_DIR = 'gwpca_maps'
+OUTPUT_GEOJSON = os.path.join(OUTPUT_DIR, 'johannesburg_gwpca.geojson')
+
+# loadings: (wards, variables, components); eigenvalues: (wards, variables),
+# largest first; scores: (wards, components); ptv: (wards, components) in %
+GWPCAResult = namedtuple('GWPCAResult', ['bandwidth', 'loadings', 'eigenvalues', 'scores', 'ptv'])
+
+
+def neighbours(coordinates, n_neighbours):
+    """Distances and indices of each ward's nearest wards (itself first)"""
+    n_neighbours = min(n_neighbours, len(coordinates))
+    distances, indices = cKDTree(coordinates).query(coordinates, k=n_neighbours)
+    return distances.reshape(len(coordinates), -1), indices.reshape(len(coordinates), -1)
+
+
+def bisquare_weights(distances, bandwidth, leave_out_self=False):
+    """Adaptive bisquare kernel: weight 0 from the ``bandwidth``-th neighbour outwards"""
+    distances = distances[:, :bandwidth]
+    radius = distances[:, -1:]
+    ratio = distances / np.where(radius > 0, radius, 1.0)
+    weights = np.where(ratio < 1, (1 - ratio ** 2) ** 2, 0.0)
+    if leave_out_self:
+        weights[:, 0] = 0.0
+    return weights
+
+
+def local_covariances(values, indices, weights):
+    """Weighted means (wards, variables) and covariances (wards, variables, variables)"""
+    local = values[indices]
+    weights = weights / weights.sum(axis=1, keepdims=True)
+    means = np.einsum('nk,nkp->np', weights, local)
+    centred = local - means[:, None, :]
+    # A batched matmul rather than a three-operand einsum, which numpy would loop
+    return means, np.swapaxes(centred * weights[:, :, None], 1, 2) @ centred
+
+
+def _local_eigen(values, indices, weights):
+    means, covariances = local_covariances(values, indices, weights)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariances)
+    return means, np.clip(eigenvalues[:, ::-1], 0, None), eigenvectors[:, :, ::-1]
+
+
+def batched_eigen(values, indices, weights, threads=None):
+    """Local means, eigenvalues and eigenvectors for every ward.
+
+    Wards are processed in chunks; each chunk builds its covariance tensor
+    with one batched matmul and decomposes it with one batched ``eigh``. Chunks run
+    on a thread pool, as LAPACK releases the GIL.
+    """
+    size = max(1, CHUNK_VALUES // (indices.shape[1] * values.shape[1]))
+    chunks = [slice(start, start + size) for start in range(0, len(indices), size)]
+    threads = default_workers(len(chunks)) if threads is None else threads
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        parts = list(pool.map(lambda s: _local_eigen(values, indices[s], weights[s]), chunks))
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def cv_score(values, distances, indices, bandwidth, components=DEFAULT_COMPONENTS, threads=None):
+    """Leave-one-out reconstruction error of a bandwidth.
+
+    Each ward is left out of its own neighbourhood, projected on the first
+    ``components`` local loadings and the squared residual summed, as in
+    GWmodel's bw.gwpca.
+    """
+    weights = bisquare_weights(distances, bandwidth, leave_out_self=True)
+    means, _, eigenvectors = batched_eigen(values, indices[:, :bandwidth], weights, threads)
+    centred = values - means
+    basis = eigenvectors[:, :, :components]
+    projected = np.einsum('npk,nk->np', basis, np.einsum('npk,np->nk', basis, centred))
+    return float(((centred - projected) ** 2).sum())
+
+
+def select_bandwidth(values, coordinates, components=DEFAULT_COMPONENTS, bounds=None,
+                     threads=None, verbose=True):
+    """Adaptive bandwidth (number of neighbours) minimising the CV score.
+
+    Golden-section search over integer bandwidths, between enough wards for
+    a full-rank local covariance and all wards up to MAX_SEARCH_BANDWIDTH
+    (or ``bounds``). Neighbours are queried once for the widest bandwidth
+    and sliced per candidate. Returns the best bandwidth scored anywhere
+    in the search, not just in the final bracket.
+    """
+    n_wards, n_variables = values.shape
+    lower, upper = bounds or (min(n_variables + 2, n_wards), min(n_wards, MAX_SEARCH_BANDWIDTH))
+    distances, indices = neighbours(coordinates, upper)
+
+    scores = {}
+
+    def score(bandwidth):
+        if bandwidth not in scores:
+            scores[bandwidth] = cv_score(values, distances, indices, bandwidth, components, threads)
+            if verbose:
+                print(f"GWPCA bandwidth {bandwidth}: CV score {scores[bandwidth]:.4f}")
+        return scores[bandwidth]
+
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = lower, upper
+    c = int(round(b - ratio * (b - a)))
+    d = int(round(a + ratio * (b - a)))
+    # Rounding can make the interior points meet on a narrow bracket; the
+    # few bandwidths left are then scored directly
+    while b - a > SEARCH_TOLERANCE and a < c < d < b:
+        # Keep the surviving interior point and evaluate one new one per step
+        if score(c) <= score(d):
+            b, d = d, c
+            c = int(round(b - ratio * (b - a)))
+        else:
+            a, c = c, d
+            d = int(round(a + ratio * (b - a)))
+    for bandwidth in range(a, b + 1):
+        score(bandwidth)
+    return min(scores, key=scores.get)
+
+
+def gwpca(values, coordinates, bandwidth=None, components=DEFAULT_COMPONENTS, threads=None):
+    """Geographically weighted PCA of standardized indicators.
+
+    ``values`` is (wards, variables) and ``coordinates`` (wards, 2) in
+    metres. With no ``bandwidth`` one is chosen by cross-validation.
+    Local loadings are sign-aligned with the global ones so maps of them
+    are comparable between wards.
+    """
+    values = standardize(values)
+    if bandwidth is None:
+        bandwidth = select_bandwidth(values, coordinates, components, threads=threads)
+    distances, indices = neighbours(coordinates, bandwidth)
+    weights = bisquare_weights(distances, bandwidth)
+    means, eigenvalues, eigenvectors = batched_eigen(values, indices, weights, threads)
+
+    loadings = eigenvectors[:, :, :components]
+    global_loadings = principal_components(values).loadings[:, :components]
+    signs = np.where(np.einsum('npk,pk->nk', loadings, global_loadings) < 0, -1.0, 1.0)
+    loadings = loadings * signs[:, None, :]
+
+    scores = np.einsum('np,npk->nk', values - means, loadings)
+    total = eigenvalues.sum(axis=1, keepdims=True)
+    ptv = 100 * eigenvalues[:, :components] / np.where(total > 0, total, 1.0)
+    return GWPCAResult(bandwidth, loadings, eigenvalues, scores, ptv)
+
+
+def gwpca_columns(gdf, variables=HVI_VARIABLES, bandwidth=None, components=DEFAULT_COMPONENTS,
+                  threads=None):
+    """Run GWPCA on a ward frame and return a copy with the results as columns.
+
+    Adds ``GW_PC<k>`` (local scores), ``GW_PTV<k>`` and ``GW_PTV`` (percent
+    of variance, per component and in total), ``GW_Lead_PC1`` (the variable
+    loading most on the local first component) and ``GW_L<k>_<variable>``
+    (local loadings). Wards missing an indicator are left out and get NaN.
+    """
+    values = gdf[list(variables)].apply(pd.to_numeric, errors='coerce')
+    complete = values.notna().all(axis=1).to_numpy()
+    result = gwpca(values.to_numpy()[complete], ward_coordinates(gdf[complete]),
+                   bandwidth=bandwidth, components=components, threads=threads)
+
+    gdf = gdf.copy()
+
+    def put(column, data):
+        full = np.full(len(gdf), np.nan, dtype=object if data.dtype == object else float)
+        full[complete] = data
+        gdf[column] = full
+
+    for k in range(components):
+        put(f'GW_PC{k + 1}', result.scores[:, k])
+        put(f'GW_PTV{k + 1}', result.ptv[:, k])
+    put('GW_PTV', result.ptv.sum(axis=1))
+    put('GW_Lead_PC1', np.asarray(variables, dtype=object)[np.abs(result.loadings[:, :, 0]).argmax(axis=1)])
+    for k in range(components):
+        for j, variable in enumerate(variables):
+            put(f'GW_L{k + 1}_{variable}', result.loadings[:, j, k])
+    gdf.attrs['gwpca_bandwidth'] = result.bandwidth
+    print(f"GWPCA: {complete.sum()} wards, adaptive bandwidth {result.bandwidth} wards, "
+          f"mean {result.ptv.sum(axis=1).mean():.1f}% of variance in {components} components")
+    return gdf
+
+
+def create_map(gdf, column, title, cmap, label, output_path):
+    """Render one GWPCA column like the other single-indicator maps"""
+    from visualize_hvi import create_single_map
+    create_single_map(column, title, cmap, label, output_path, gdf=gdf)
+
+
+def create_gwpca_maps(gdf=None, bandwidth=None, components=DEFAULT_COMPONENTS, processes=None):
+    """Run GWPCA on the wards, save OUTPUT_GEOJSON and map scores and variance explained.
+
+    Returns the files written.
+    """
+    if gdf is None:
+        gdf = load_wards(crs=3857)
+    gdf = gwpca_columns(gdf, bandwidth=bandwidth, components=components)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    gdf.to_crs(epsg=4326).to_file(OUTPUT_GEOJSON, driver='GeoJSON')
+
+    map_jobs = [('GW_PTV', f'GWPCA: Variance Explained by {components} Local Components',
+                 'YlGnBu', 'Percent of variance', os.path.join(OUTPUT_DIR, 'gwpca_ptv.png'))]
+    for k in range(1, components + 1):
+        map_jobs.append((f'GW_PC{k}', f'GWPCA Local Component {k} Score', 'viridis',
+                         f'PC{k} score', os.path.join(OUTPUT_DIR, f'gwpca_pc{k}.png')))
+    written = render_maps(map_jobs, gdf, create_map, processes=processes)
+    return [OUTPUT_GEOJSON] + written
@@ -0,0 +1,393 @@
+"""Command-line entry point for the Johannesburg heat vulnerability analysis.
+
+    python hvi.py extract [--simple] [--batched] [--max-in-flight N] [--processes N]
+    python hvi.py render [--column COL --title T --cmap C --label L --output PATH] [--ee]
+                        [--offline-tiles] [--tile-dir DIR] [--processes N]
+                        [--recompute] [--indicators PATH]
+    python hvi.py interactive [--ee] [--tiles-url URL]
+    python hvi.py tiles [--tile-dir DIR]
+    python hvi.py stats [--lst PATH --ndvi PATH [--hvi PATH] [--hexbin] [--output PATH]]
+    python hvi.py gwpca [--bandwidth N] [--components K] [--offline-tiles] [--tile-dir DIR]
+                       [--processes N]
+    python hvi.py lisa [--column COL] [--weights KIND] [--permutations N] [--seed N]
+                      [--processes N] [--output PATH]
+    python hvi.py ranks [--draws N] [--top N] [--alpha A] [--bounds CSV] [--seed N]
+                       [--output PATH]
+    python hvi.py build [STEP ...] [--jobs N] [--force] [--dry-run] [--processes N]
+                       [--max-in-flight N] [--offline-tiles] [--tile-dir DIR]
+    python hvi.py import-budget [--budget SECONDS]
+
+Only the standard library is imported here. Each subcommand imports the
+modules it needs (and sets up Earth Engine) when it runs, so rendering
+from the cached ward data never pays for ee, geemap, folium or seaborn,
+nor, for the static maps, for pandas, geopandas or pyproj.
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# Modules that must not be loaded just by starting the CLI
+HEAVY_MODULES = ('ee', 'geemap', 'folium', 'seaborn', 'contextily',
+                 'matplotlib', 'geopandas', 'pandas', 'numpy')
+# Modules a map render from the cached wards must not load before it draws
+RENDER_LAZY_MODULES = ('ee', 'geemap', 'folium', 'seaborn', 'contextily',
+                       'geopandas', 'pandas', 'pyproj')
+# Render commands whose start-up the budget covers
+RENDER_COMMANDS = (['render'], ['render', '--column', 'HVI_weighted_standardized'])
+# Seconds allowed for a fresh interpreter to import the CLI itself, and for
+# a render command to get from interpreter start to its first figure
+CLI_IMPORT_BUDGET = 0.1
+IMPORT_BUDGET = 0.9
+
+# Runs a command in a fresh interpreter and stops it when the first figure
+# is created, after all imports and the ward load; prints the seconds taken
+# and which RENDER_LAZY_MODULES were loaded by then
+RENDER_PROBE = """
+import time
+start = time.perf_counter()
+import os, sys
+import matplotlib.figure
+
+def stop(*args, **kwargs):
+    print(time.perf_counter() - start)
+    print(','.join(m for m in {modules!r} if m in sys.modules), flush=True)
+    os._exit(0)
+
+matplotlib.figure.Figure.__init__ = stop
+import hvi
+hvi.main({argv!r})
+"""
+
+
+def run_extract(args):
+    use_file_backend()
+    if args.simple:
+        import ee_simple
+        ee_simple.main(max_in_flight=args.max_in_flight, processes=args.processes)
+    else:
+        import ee_data_extraction
+        ee_data_extraction.main(max_in_flight=args.max_in_flight, batched=args.batched,
+                                processes=args.processes)
+
+
+def use_file_backend():
+    """Draw with Agg: these commands only write image files, so no GUI backend is probed"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def configure_tiles(args):
+    if args.offline_tiles or args.tile_dir:
+        import tile_cache
+        tile_cache.configure(offline=args.offline_tiles, tile_dir=args.tile_dir)
+
+
+def recomputed_wards(args):
+    """Wards with HVI/CVI recomputed in Python, or None to use the stored columns"""
+    if not (args.recompute or args.indicators):
+        return None
+    import hvi_composite
+    from ward_data import load_wards
+    import lisa
+    indicators = hvi_composite.load_indicators(args.indicators) if args.indicators else None
+    # LISA_Cluster/LISA_Type derive from HVI_weighted_standardized, so refresh them too
+    return lisa.lisa_columns(hvi_composite.update_indices(load_wards(crs=3857), indicators))
+
+
+def run_render(args):
+    use_file_backend()
+    configure_tiles(args)
+    import visualize_hvi
+    gdf = recomputed_wards(args)
+    if args.column:
+        visualize_hvi.create_single_map(args.column,
+                                        title=args.title or args.column,
+                                        cmap=args.cmap,
+                                        label=args.label or args.column,
+                                        output_path=args.output or f"{args.column.lower()}_map.png",
+                                        gdf=gdf)
+    else:
+        visualize_hvi.create_static_maps(gdf)
+    if args.ee:
+        import ee_static_analysis
+        ee_static_analysis.create_visualizations(gdf=gdf, processes=args.processes)
+
+
+def run_interactive(args):
+    import visualize_hvi
+    visualize_hvi.create_interactive_map(tiles_url=args.tiles_url)
+    if args.ee:
+        import ee_analysis
+        ee_analysis.main()
+
+
+def run_tiles(args):
+    import visualize_hvi
+    visualize_hvi.export_ward_tiles(tile_dir=args.tile_dir)
+
+
+def run_stats(args):
+    use_file_backend()
+    import visualize_hvi
+    if args.lst or args.ndvi:
+        if not (args.lst and args.ndvi):
+            sys.exit("stats: --lst and --ndvi must be given together")
+        visualize_hvi.create_pixel_density_plots(args.lst, args.ndvi, hvi_path=args.hvi,
+                                                 hexagonal=args.hexbin,
+                                                 output_path=args.output or
+                                                 'johannesburg_pixel_density.png')
+    else:
+        visualize_hvi.create_statistical_plots()
+
+
+def run_gwpca(args):
+    use_file_backend()
+    configure_tiles(args)
+    import gwpca
+    for path in gwpca.create_gwpca_maps(bandwidth=args.bandwidth, components=args.components,
+                                        processes=args.processes):
+        print(f"Saved: {path}")
+
+
+def run_lisa(args):
+    import lisa
+    for path in lisa.create_lisa_layer(column=args.column, kind=args.weights,
+                                       permutations=args.permutations, seed=args.seed,
+                                       processes=args.processes, output_path=args.output):
+        print(f"Saved: {path}")
+
+
+def run_ranks(args):
+    import rank_stability
+    for path in rank_stability.save_rank_stability(output_path=args.output, bounds=args.bounds,
+                                                   draws=args.draws, top_n=args.top,
+                                                   alpha=args.alpha, seed=args.seed):
+        print(f"Saved: {path}")
+
+
+def run_build(args):
+    import pipeline
+    tile_options = {}
+    if args.offline_tiles:
+        tile_options['offline'] = True
+    if args.tile_dir:
+        tile_options['tile_dir'] = args.tile_dir
+    if args.dry_run:
+        stale = pipeline.plan(targets=args.steps, tile_options=tile_options)
+        print("Up to date" if not stale else "Would rebuild: " + ", ".join(stale))
+        return
+    options = {'max_in_flight': args.max_in_flight}
+    if args.processes is not None:
+        options['processes'] = args.processes
+    status = pipeline.build(targets=args.steps, jobs=args.jobs, force=args.force,
+                            tile_options=tile_options, **options)
+    if 'failed' in status.values():
+        sys.exit(1)
+
+
+def measure_import(statement, repeat=3):
+    """Wall-clock seconds for a fresh interpreter to run an import statement.
+
+    The best of ``repeat`` runs, so a busy machine does not fail the budget.
+    """
+    code = (f"import time; start = time.perf_counter(); {statement}; "
+            "print(time.perf_counter() - start)")
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return min(times)
+
+
+def measure_render(argv, repeat=3):
+    """Seconds from interpreter start to the first figure of an hvi command.
+
+    The best of ``repeat`` runs, and the RENDER_LAZY_MODULES loaded by then
+    in any run.
+    """
+    code = RENDER_PROBE.format(modules=RENDER_LAZY_MODULES, argv=list(argv))
+    times, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                text=True, check=True).stdout.splitlines()
+        times.append(float(output[-2]))
+        loaded.update(name for name in output[-1].split(',') if name)
+    return min(times), sorted(loaded)
+
+
+def check_import_budget(budget=IMPORT_BUDGET):
+    """Return a list of problems with CLI start-up cost (empty when within budget)"""
+    problems = []
+
+    code = ("import sys, hvi; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True).stdout.strip()
+    if loaded:
+        problems.append(f"importing hvi loads heavy modules: {loaded}")
+
+    elapsed = measure_import('import hvi')
+    print(f"CLI start-up: {elapsed:.3f}s (budget {CLI_IMPORT_BUDGET:.3f}s)")
+    if elapsed > CLI_IMPORT_BUDGET:
+        problems.append(f"importing hvi took {elapsed:.3f}s, over the {CLI_IMPORT_BUDGET:.3f}s budget")
+
+    # The budget is for rendering from the cache, so build it first
+    subprocess.run([sys.executable, '-c', 'import ward_data; ward_data.build_cache()'], check=True)
+    for argv in RENDER_COMMANDS:
+        command = ' '.join(['hvi'] + argv)
+        elapsed, loaded = measure_render(argv)
+        print(f"{command} start-up (to first figure): {elapsed:.3f}s (budget {budget:.3f}s)")
+        if elapsed > budget:
+            problems.append(f"{command} took {elapsed:.3f}s to start drawing, "
+                            f"over the {budget:.3f}s budget")
+        if loaded:
+            problems.append(f"{command} loads modules it does not draw with: {', '.join(loaded)}")
+
+    code = ("import sys, visualize_hvi; "
+            "print(','.join(m for m in ('ee', 'geemap', 'folium', 'seaborn', 'contextily', "
+            "'matplotlib.pyplot') if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True).stdout.strip()
+    if loaded:
+        problems.append(f"importing visualize_hvi loads modules it only needs later: {loaded}")
+    return problems
+
+
+def run_import_budget(args):
+    problems = check_import_budget(args.budget)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("Import budget OK")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='hvi', description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract = subparsers.add_parser('extract', help='Extract Earth Engine indicators per ward')
+    extract.add_argument('--simple', action='store_true',
+                         help='run the ee_simple pipeline (LST, NDVI, Landsat, local WorldPop)')
+    extract.add_argument('--batched', action='store_true',
+                         help='reduce all indicators in one multi-band request')
+    extract.add_argument('--max-in-flight', type=int, default=4,
+                         help='concurrent Earth Engine requests (default: 4)')
+    extract.add_argument('--processes', type=int,
+                         help='worker processes for map rendering (default: one per core)')
+    extract.set_defaults(func=run_extract)
+
+    render = subparsers.add_parser('render', help='Render static maps from the ward data')
+    render.add_argument('--column', help='render a single map of this column')
+    render.add_argument('--title')
+    render.add_argument('--cmap', default='YlOrRd')
+    render.add_argument('--label')
+    render.add_argument('--output')
+    render.add_argument('--ee', action='store_true',
+                        help='also render the ee_static_analysis maps')
+    render.add_argument('--offline-tiles', action='store_true',
+                        help='draw basemaps only from the local tile store, never the network')
+    render.add_argument('--tile-dir', help='local {z}/{x}/{y}.png tile directory to draw basemaps from')
+    render.add_argument('--processes', type=int,
+                        help='worker processes for map rendering (default: one per core)')
+    render.add_argument('--recompute', action='store_true',
+                        help='recompute HVI/CVI (and LISA clusters) from the ward indicators '
+                             'before rendering')
+    render.add_argument('--indicators',
+                        help='GeoJSON/CSV of fresh indicators by WardID_ (e.g. extracted LST, '
+                             'NDVI) to recompute HVI/CVI from; implies --recompute')
+    render.set_defaults(func=run_render)
+
+    interactive = subparsers.add_parser('interactive', help='Build the interactive HTML map')
+    interactive.add_argument('--ee', action='store_true',
+                             help='also build the geemap Earth Engine maps')
+    interactive.add_argument('--tiles-url',
+                             help='draw wards from vector tiles at this {z}/{x}/{y}.pbf URL '
+                                  'instead of inlining them (e.g. vector_tiles/{z}/{x}/{y}.pbf)')
+    interactive.set_defaults(func=run_interactive)
+
+    tiles = subparsers.add_parser('tiles', help='Export (or update) the ward vector tile pyramid')
+    tiles.add_argument('--tile-dir', help='output directory (default: vector_tiles)')
+    tiles.set_defaults(func=run_tiles)
+
+    stats = subparsers.add_parser('stats', help='Render the statistical plots')
+    stats.add_argument('--lst', help='LST raster: plot pixel-level density instead of wards')
+    stats.add_argument('--ndvi', help='NDVI raster, resampled onto the LST grid if needed')
+    stats.add_argument('--hvi', help='HVI raster to colour bins by (default: ward HVI per pixel)')
+    stats.add_argument('--hexbin', action='store_true', help='hexagonal instead of square bins')
+    stats.add_argument('--output', help='pixel density figure path')
+    stats.set_defaults(func=run_stats)
+
+    gw = subparsers.add_parser('gwpca', help='Run geographically weighted PCA and map it')
+    gw.add_argument('--bandwidth', type=int,
+                    help='adaptive bandwidth in wards (default: chosen by cross-validation)')
+    gw.add_argument('--components', type=int, default=2,
+                    help='local components kept and mapped (default: 2)')
+    gw.add_argument('--offline-tiles', action='store_true',
+                    help='draw basemaps only from the local tile store, never the network')
+    gw.add_argument('--tile-dir', help='local {z}/{x}/{y}.png tile directory to draw basemaps from')
+    gw.add_argument('--processes', type=int,
+                    help='worker processes for map rendering (default: one per core)')
+    gw.set_defaults(func=run_gwpca)
+
+    local = subparsers.add_parser('lisa', help="Compute Moran's I and LISA clusters")
+    local.add_argument('--column', default='HVI_weighted_standardized',
+                       help='ward column to test (default: HVI_weighted_standardized)')
+    local.add_argument('--weights', default='queen', choices=['queen', 'rook', 'knn', 'distance'],
+                       help='spatial weights (default: queen contiguity)')
+    local.add_argument('--permutations', type=int, default=999,
+                       help='conditional permutations per ward (default: 999)')
+    local.add_argument('--seed', type=int, default=0)
+    local.add_argument('--processes', type=int,
+                       help='worker processes for the permutations (default: one per core)')
+    local.add_argument('--output', default='lisa/johannesburg_lisa.geojson',
+                       help='GeoJSON written with the LISA columns')
+    local.set_defaults(func=run_lisa)
+
+    ranks = subparsers.add_parser('ranks', help='Test how stable ward rankings are to indicator weights')
+    ranks.add_argument('--draws', type=int, default=20000,
+                       help='random weightings of the indicators (default: 20000)')
+    ranks.add_argument('--top', type=int, default=40,
+                       help='report how often each ward is in the top N (default: 40)')
+    ranks.add_argument('--alpha', type=float, default=1.0,
+                       help='Dirichlet concentration; larger keeps weights nearer equal (default: 1)')
+    ranks.add_argument('--bounds', help='CSV of variable,lower,upper relative weights '
+                                        '(draws uniform within bounds instead of Dirichlet)')
+    ranks.add_argument('--seed', type=int, default=0)
+    ranks.add_argument('--output', default='johannesburg_rank_stability.csv')
+    ranks.set_defaults(func=run_ranks)
+
+    build = subparsers.add_parser('build', help='Rebuild only the outputs whose code or inputs changed')
+    build.add_argument('steps', nargs='*',
+                       help='steps to bring up to date, with their upstream steps (default: all)')
+    build.add_argument('--jobs', type=int,
+                       help='steps run at once (default: one per core, up to the step count)')
+    build.add_argument('--force', action='store_true', help='rebuild even up-to-date steps')
+    build.add_argument('--dry-run', action='store_true', help='list the steps that would run')
+    build.add_argument('--processes', type=int,
+                       help='worker processes for map rendering within each step')
+    build.add_argument('--max-in-flight', type=int, default=4,
+                       help='concurrent Earth Engine requests per extraction step (default: 4)')
+    build.add_argument('--offline-tiles', action='store_true',
+                       help='draw basemaps only from the local tile store, never the network')
+    build.add_argument('--tile-dir', help='local {z}/{x}/{y}.png tile directory to draw basemaps from')
+    build.set_defaults(func=run_build)
+
+    budget = subparsers.add_parser('import-budget', help='Check CLI start-up import cost')
+    budget.add_argument('--budget', type=float, default=IMPORT_BUDGET,
+                        help=f'seconds allowed for render start-up (default: {IMPORT_BUDGET})')
+    budget.set_defaults(func=run_import_budget)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    args.func(args)
+    print(f"hvi {args.command} finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
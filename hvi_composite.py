@@ -0,0 +1,175 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# The 22 ward indicators behind HVI_PC1, HVI_weighted and CVI
+HVI_VARIABLES = [
+    'Crowded dwellings', 'No piped water', 'Using public healthcare facilities', 'Poor health status',
+    'Failed to find healthcare when needed', 'No medical insurance', 'Household hunger risk',
+    'Benefiting from school feeding scheme', 'UTFVI', 'LST', 'NDVI', 'NDBI__mean', 'concern_he',
+    'cancer_pro', 'diabetes_p', 'pneumonia_', 'heart_dise', 'hypertensi', 'hiv_prop', 'tb_prop',
+    'covid_prop', '60_plus_pr'
+]
+CLIMATE_VARIABLES = ['UTFVI', 'LST', 'NDVI', 'NDBI__mean']
+SOCIOECON_VARIABLES = [
+    'Crowded dwellings', 'No piped water', 'Using public healthcare facilities',
+    'Poor health status', 'Failed to find healthcare when needed', 'No medical insurance',
+    'Household hunger risk', 'Benefiting from school feeding scheme', 'diabetes_p',
+    'heart_dise', 'hypertensi', 'hiv_prop', 'tb_prop', 'covid_prop', '60_plus_pr'
+]
+# HVI_weighted keeps the components explaining this share of variance; CVI the first three
+VARIANCE_TARGET = 0.90
+CVI_COMPONENTS = 3
+# String copies of the index columns carried over from an old join; stale once recomputed
+STALE_COLUMNS = ['Ward_HVI_1_HVI_PC1', 'Ward_HVI_1_HVI_weighted',
+                 'Ward_HVI_1_HVI_PC1_standardized', 'Ward_HVI_1_HVI_weighted_standardized']
+
+# scores: (..., wards, components); loadings: (..., variables, components);
+# explained: (..., components) variance ratios, largest first
+PCAResult = namedtuple('PCAResult', ['scores', 'loadings', 'explained'])
+
+
+def standardize(values):
+    """Z-scores per variable over the wards (population std, as StandardScaler).
+
+    ``values`` is (wards, variables) or a batch (..., wards, variables).
+    Constant variables become zero rather than NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    centred = values - values.mean(axis=-2, keepdims=True)
+    std = np.sqrt((centred ** 2).mean(axis=-2, keepdims=True))
+    return centred / np.where(std > 0, std, 1.0)
+
+
+def principal_components(standardized):
+    """PCA of standardized indicators, for one matrix or a whole batch at once.
+
+    Eigendecomposes the (variables x variables) correlation matrices with
+    one batched ``eigh`` instead of an SVD per matrix, which is what makes
+    thousands of recomputations per second possible. Signs follow
+    scikit-learn's PCA (the largest-magnitude score of each component is
+    positive), so scores match the notebook outputs.
+    """
+    z = np.asarray(standardized, dtype=float)
+    covariance = np.swapaxes(z, -1, -2) @ z / z.shape[-2]
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    # eigh sorts ascending; flip to largest first
+    eigenvalues = np.clip(eigenvalues[..., ::-1], 0, None)
+    eigenvectors = eigenvectors[..., ::-1]
+
+    scores = z @ eigenvectors
+    largest = np.take_along_axis(scores, np.abs(scores).argmax(axis=-2)[..., None, :], axis=-2)
+    signs = np.where(largest < 0, -1.0, 1.0)
+    total = eigenvalues.sum(axis=-1, keepdims=True)
+    return PCAResult(scores * signs, eigenvectors * signs,
+                     eigenvalues / np.where(total > 0, total, 1.0))
+
+
+def components_for_variance(explained, target=VARIANCE_TARGET):
+    """Smallest number of components whose explained variance reaches ``target``"""
+    reached = np.cumsum(explained, axis=-1) >= target - 1e-12
+    return reached.argmax(axis=-1) + 1
+
+
+def weighted_composite(result, n_components):
+    """Scores of the first ``n_components`` weighted by their explained variance.
+
+    ``n_components`` may be an int or one count per batch entry.
+    """
+    k = np.arange(result.explained.shape[-1])
+    n_components = np.asarray(n_components)[..., None]
+    weights = np.where(k < n_components, result.explained, 0.0)
+    return (result.scores @ weights[..., None])[..., 0]
+
+
+def rescale(values):
+    """Min-max rescaling to [0, 1] over the wards (last axis)"""
+    values = np.asarray(values, dtype=float)
+    low = values.min(axis=-1, keepdims=True)
+    span = values.max(axis=-1, keepdims=True) - low
+    return (values - low) / np.where(span > 0, span, 1.0)
+
+
+def composite_indices(values, variables=HVI_VARIABLES, target=VARIANCE_TARGET,
+                      cvi_components=CVI_COMPONENTS):
+    """All index columns from an indicator matrix, or a batch of them.
+
+    ``values`` is (wards, len(variables)) or (batch, wards, len(variables))
+    with columns in ``variables`` order, which must include the climate and
+    socio-economic groups. Returns a dict of column name -> array of shape
+    (wards,) or (batch, wards).
+    """
+    variables = list(variables)
+    values = np.asarray(values, dtype=float)
+    z = standardize(values)
+    full = principal_components(z)
+    # The sub-indices are standardized on their own variables, as in the notebook
+    climate = principal_components(
+        standardize(np.take(values, [variables.index(v) for v in CLIMATE_VARIABLES], axis=-1)))
+    socioecon = principal_components(
+        standardize(np.take(values, [variables.index(v) for v in SOCIOECON_VARIABLES], axis=-1)))
+
+    hvi_pc1 = full.scores[..., 0]
+    hvi_weighted = weighted_composite(full, components_for_variance(full.explained, target))
+    cvi = weighted_composite(full, cvi_components)
+    return {
+        'HVI_PC1': hvi_pc1,
+        'HVI_PC1_standardized': rescale(hvi_pc1),
+        'HVI_weighted': hvi_weighted,
+        'HVI_weighted_standardized': rescale(hvi_weighted),
+        'Climate_PC1': climate.scores[..., 0],
+        'SocioEcon_PC1': socioecon.scores[..., 0],
+        'CVI': cvi,
+        'CVI_standardized': rescale(cvi),
+    }
+
+
+def compute_indices(gdf, variables=HVI_VARIABLES, **kwargs):
+    """Recompute the index columns for a ward frame; returns a DataFrame on its index.
+
+    Indicators stored as text are parsed; wards missing any indicator are
+    left out of the PCA (as the notebook's dropna did) and get NaN.
+    """
+    values = gdf[list(variables)].apply(pd.to_numeric, errors='coerce')
+    complete = values.notna().all(axis=1).to_numpy()
+    indices = composite_indices(values.to_numpy(dtype=float)[complete], variables, **kwargs)
+
+    columns = {}
+    for name, column in indices.items():
+        full = np.full(len(gdf), np.nan)
+        full[complete] = column
+        columns[name] = full
+    return pd.DataFrame(columns, index=gdf.index)
+
+
+def update_indices(gdf, indicators=None, id_column='WardID_', **kwargs):
+    """A copy of ``gdf`` with its index columns recomputed from its indicators.
+
+    ``indicators`` optionally replaces indicator columns first, e.g. freshly
+    extracted LST and NDVI: a frame with ``id_column`` and any of the
+    indicator columns, matched on the ward id. The stale string copies of
+    the index columns are dropped.
+    """
+    gdf = gdf.drop(columns=[c for c in STALE_COLUMNS if c in gdf.columns])
+    if indicators is not None:
+        keys = gdf[id_column].astype(str)
+        table = indicators.assign(**{id_column: indicators[id_column].astype(str)}) \
+            .drop_duplicates(id_column).set_index(id_column)
+        for column in HVI_VARIABLES:
+            if column in table.columns:
+                fresh = pd.to_numeric(table[column], errors='coerce').reindex(keys).to_numpy()
+                # Wards the new extraction missed keep their previous value
+                gdf[column] = np.where(np.isnan(fresh), gdf[column].to_numpy(dtype=float), fresh)
+    indices = compute_indices(gdf, **kwargs)
+    for column in indices.columns:
+        gdf[column] = indices[column]
+    return gdf
+
+
+def load_indicators(path):
+    """Read replacement indicators from a GeoJSON/GeoPackage or CSV"""
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path)
+    import geopandas as gpd
+    return pd.DataFrame(gpd.read_file(path).drop(columns='geometry'))
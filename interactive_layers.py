@@ -0,0 +1,337 @@
+import base64
+import json
+from collections import namedtuple
+
+import numpy as np
+from branca.utilities import color_brewer
+from folium import Map
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from jinja2 import Template
+
+from vector_tiles import LAYER_NAME, MAX_ZOOM
+from ward_topology import PROPERTY_DIGITS, clean_property, encode_topology
+
+TOPOJSON_CLIENT = ('topojson-client',
+                   'https://cdn.jsdelivr.net/npm/topojson-client@3/dist/topojson-client.min.js')
+VECTOR_GRID = ('leaflet.vectorgrid',
+               'https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.min.js')
+
+# One switchable choropleth: the column, its name in the switcher, the
+# ColorBrewer scheme and the legend caption
+Indicator = namedtuple('Indicator', ['column', 'name', 'fill_color', 'legend'])
+
+# Shared by the inline and tiled layers. Each template defines
+# <name>_active, <name>_indicators and a <name>_restyle() function
+INDICATOR_HEADER = """
+        {% macro header(this, kwargs) %}
+            <style>
+                .{{ this.get_name() }}_tooltip { {{ this.tooltip_style }} }
+                .{{ this.get_name() }}_panel {
+                    background: white; padding: 6px 10px; border-radius: 5px;
+                    box-shadow: 3px 3px 10px rgba(0,0,0,0.2);
+                    font: 12px arial, sans-serif; max-height: 320px; overflow-y: auto;
+                }
+                .{{ this.get_name() }}_panel label { display: block; white-space: nowrap; }
+                .{{ this.get_name() }}_panel i {
+                    display: inline-block; width: 18px; height: 12px;
+                    margin-right: 6px; vertical-align: middle; opacity: 0.8;
+                }
+            </style>
+        {% endmacro %}
+"""
+
+INDICATOR_FUNCTIONS = """
+            var {{ this.get_name() }}_indicators = {{ this.indicators_json }};
+            var {{ this.get_name() }}_active = {{ this.get_name() }}_indicators[0];
+
+            function {{ this.get_name() }}_fill(indicator, value) {
+                if (value === null || value === undefined) { return {{ this.nan_fill_color|tojson }}; }
+                var i = 0;
+                while (i < indicator.colors.length - 1 && value >= indicator.edges[i + 1]) { i++; }
+                return indicator.colors[i];
+            }
+
+            function {{ this.get_name() }}_tooltip_html(id, valueOf) {
+                var active = {{ this.get_name() }}_active;
+                var fields = {{ this.fields|tojson }};
+                var aliases = {{ this.aliases|tojson }};
+                if (fields.indexOf(active.column) < 0) {
+                    fields = fields.concat([active.column]);
+                    aliases = aliases.concat([active.name + ':']);
+                }
+                var rows = fields.map(function(field, i) {
+                    var value = field === {{ this.id_column|tojson }} ? id : valueOf(field);
+                    return '<tr><th>' + aliases[i] + '</th><td>'
+                        + (value === null || value === undefined ? '' : value) + '</td></tr>';
+                });
+                return '<table>' + rows.join('') + '</table>';
+            }
+"""
+
+INDICATOR_CONTROLS = """
+            var {{ this.get_name() }}_legend = L.control({position: 'bottomright'});
+            {{ this.get_name() }}_legend.onAdd = function() {
+                this._div = L.DomUtil.create('div', '{{ this.get_name() }}_panel');
+                this.update();
+                return this._div;
+            };
+            {{ this.get_name() }}_legend.update = function() {
+                var indicator = {{ this.get_name() }}_active;
+                this._div.innerHTML = '<b>' + indicator.legend + '</b><br>' + indicator.colors.map(
+                    function(color, i) {
+                        return '<i style="background:' + color + '"></i>'
+                            + (+indicator.edges[i].toFixed(2)) + ' &ndash; '
+                            + (+indicator.edges[i + 1].toFixed(2));
+                    }).join('<br>');
+            };
+            {{ this.get_name() }}_legend.addTo({{ this._parent.get_name() }});
+
+            {%- if this.switcher %}
+            var {{ this.get_name() }}_switcher = L.control({position: 'topright'});
+            {{ this.get_name() }}_switcher.onAdd = function() {
+                var div = L.DomUtil.create('div', '{{ this.get_name() }}_panel');
+                {{ this.get_name() }}_indicators.forEach(function(indicator, i) {
+                    var label = L.DomUtil.create('label', '', div);
+                    var input = L.DomUtil.create('input', '', label);
+                    input.type = 'radio';
+                    input.name = '{{ this.get_name() }}_indicator';
+                    input.checked = i === 0;
+                    label.appendChild(document.createTextNode(' ' + indicator.name));
+                    L.DomEvent.on(input, 'change', function() {
+                        {{ this.get_name() }}_active = indicator;
+                        {{ this.get_name() }}_restyle();
+                        {{ this.get_name() }}_legend.update();
+                    });
+                });
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                return div;
+            };
+            {{ this.get_name() }}_switcher.addTo({{ this._parent.get_name() }});
+            {%- endif %}
+"""
+
+
+def script_json(data):
+    """Compact JSON that is safe to embed inside a <script> element"""
+    text = json.dumps(data, separators=(',', ':'))
+    return text.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+
+def threshold_scale(values, fill_color='YlOrRd', bins=6):
+    """Bin edges and colours as folium.Choropleth computes them"""
+    values = np.asarray(values, dtype=float)
+    _, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return edges.tolist(), color_brewer(fill_color, n=len(edges) - 1)
+
+
+def encode_values(values):
+    """Base64 of the values as little-endian float32 (NaN marks missing)"""
+    return base64.b64encode(np.asarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+
+class IndicatorLayer(JSCSSMixin, Layer):
+    """Common set-up for ward layers with switchable indicators, a legend and tooltips"""
+
+    def __init__(self, gdf, indicators, fields=(), aliases=None, name=None, bins=6,
+                 fill_opacity=0.7, line_opacity=0.2, line_weight=1, nan_fill_color='black',
+                 highlight=None, tooltip_style='', id_column='WardID_',
+                 digits=PROPERTY_DIGITS, **layer_kwargs):
+        super().__init__(name=name, **layer_kwargs)
+        self.indicators = [Indicator(*indicator) for indicator in indicators]
+        if not self.indicators:
+            raise ValueError("At least one indicator is needed")
+
+        self.fields = list(fields)
+        self.aliases = list(aliases) if aliases is not None else self.fields
+        self.id_column = id_column
+        self.digits = digits
+        self.switcher = len(self.indicators) > 1
+
+        scales = []
+        for indicator in self.indicators:
+            edges, colors = threshold_scale(gdf[indicator.column], indicator.fill_color, bins)
+            scales.append({'column': indicator.column, 'name': indicator.name,
+                           'legend': indicator.legend, 'edges': edges, 'colors': colors})
+        self.indicators_json = script_json(scales)
+
+        self.style = {'weight': line_weight, 'opacity': line_opacity, 'color': 'black',
+                      'fillOpacity': fill_opacity}
+        self.highlight = highlight or {'weight': line_weight + 2, 'fillOpacity': fill_opacity + 0.2}
+        self.nan_fill_color = nan_fill_color
+        self.tooltip_style = tooltip_style
+
+    def indicator_columns(self):
+        """Columns the choropleths are coloured by"""
+        return list(dict.fromkeys(indicator.column for indicator in self.indicators))
+
+    def field_columns(self):
+        """Tooltip fields that are neither the ward id nor an indicator"""
+        skip = set(self.indicator_columns()) | {self.id_column}
+        return [field for field in dict.fromkeys(self.fields) if field not in skip]
+
+    def render(self, **kwargs):
+        # The legend and switcher are map controls, as for folium.Choropleth
+        assert isinstance(self._parent, Map), f"{self._name} must be added to a Map object."
+        super().render(**kwargs)
+
+
+class WardIndicatorLayer(IndicatorLayer):
+    """Switchable ward choropleths over one embedded TopoJSON geometry store.
+
+    The ward geometry is sent once as a quantized topology carrying only
+    the ward ids. Every indicator travels as a base64 Float32Array in ward
+    order, so each extra indicator adds about ``4 * n_wards`` bytes plus its
+    colour scale. Other tooltip fields, which may be text or integers too
+    large for float32, are sent as plain JSON arrays in the same order.
+    Switching indicators in the browser only restyles the existing polygons
+    and redraws the legend; tooltips read the same arrays.
+    """
+
+    _template = Template(INDICATOR_HEADER + """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_data = {{ this.topology_json }};
+            var {{ this.get_name() }}_values = (function(encoded) {
+                var values = {};
+                Object.keys(encoded).forEach(function(column) {
+                    var binary = atob(encoded[column]);
+                    var bytes = new Uint8Array(binary.length);
+                    for (var i = 0; i < binary.length; i++) { bytes[i] = binary.charCodeAt(i); }
+                    values[column] = new Float32Array(bytes.buffer);
+                });
+                return values;
+            })({{ this.values_json }});
+            var {{ this.get_name() }}_fields = {{ this.fields_json }};
+""" + INDICATOR_FUNCTIONS + """
+            function {{ this.get_name() }}_value(feature, column) {
+                if (!({{ this.get_name() }}_values.hasOwnProperty(column))) {
+                    var field = {{ this.get_name() }}_fields[column][feature.properties.row];
+                    return field === undefined ? null : field;
+                }
+                var value = {{ this.get_name() }}_values[column][feature.properties.row];
+                return isNaN(value) ? null : +value.toFixed({{ this.digits }});
+            }
+
+            function {{ this.get_name() }}_style(feature) {
+                var indicator = {{ this.get_name() }}_active;
+                var value = {{ this.get_name() }}_value(feature, indicator.column);
+                return Object.assign({}, {{ this.style|tojson }},
+                                     {fillColor: {{ this.get_name() }}_fill(indicator, value)});
+            }
+
+            function {{ this.get_name() }}_restyle() {
+                {{ this.get_name() }}.setStyle({{ this.get_name() }}_style);
+            }
+
+            var {{ this.get_name() }}_features = topojson.feature(
+                {{ this.get_name() }}_data,
+                {{ this.get_name() }}_data.objects.{{ this.object_name }}
+            );
+            {{ this.get_name() }}_features.features.forEach(function(feature, row) {
+                feature.properties = {row: row};
+            });
+
+            var {{ this.get_name() }} = L.geoJson({{ this.get_name() }}_features, {
+                smoothFactor: {{ this.smooth_factor|tojson }},
+                style: {{ this.get_name() }}_style,
+                onEachFeature: function(feature, layer) {
+                    layer.on({
+                        mouseover: function(e) { e.target.setStyle({{ this.highlight|tojson }}); },
+                        mouseout: function(e) { {{ this.get_name() }}.resetStyle(e.target); }
+                    });
+                }
+            }).addTo({{ this._parent.get_name() }});
+
+            {{ this.get_name() }}.bindTooltip(function(layer) {
+                var feature = layer.feature;
+                return {{ this.get_name() }}_tooltip_html(feature.id, function(field) {
+                    return {{ this.get_name() }}_value(feature, field);
+                });
+            }, {sticky: true, className: '{{ this.get_name() }}_tooltip'});
+""" + INDICATOR_CONTROLS + """
+        {% endmacro %}
+    """)
+
+    default_js = [TOPOJSON_CLIENT]
+
+    def __init__(self, gdf, indicators, smooth_factor=0.5, object_name='wards', **kwargs):
+        super().__init__(gdf, indicators, **kwargs)
+        self._name = 'WardIndicatorLayer'
+        self.object_name = object_name
+        self.smooth_factor = smooth_factor
+
+        # Geometry (and ids) once; every indicator as its own typed array and
+        # the remaining tooltip fields as JSON, which keeps text and large ids
+        self.topology_json = script_json(encode_topology(gdf, id_column=self.id_column,
+                                                         object_name=object_name))
+        self.values_json = script_json({column: encode_values(gdf[column])
+                                        for column in self.indicator_columns()})
+        self.fields_json = script_json({column: [clean_property(value, self.digits)
+                                                 for value in gdf[column].tolist()]
+                                        for column in self.field_columns()})
+
+
+class WardVectorTileLayer(IndicatorLayer):
+    """Switchable ward choropleths drawn from a vector tile pyramid.
+
+    Reads the tiles written by ``vector_tiles.export_vector_tiles`` through
+    Leaflet.VectorGrid instead of inlining any geometry, so the page stays
+    the same size however many wards or cells the tiles hold. The tiles
+    must carry the indicator and tooltip columns; ``gdf`` is only used for
+    the colour scales.
+    """
+
+    _template = Template(INDICATOR_HEADER + """
+        {% macro script(this, kwargs) %}
+""" + INDICATOR_FUNCTIONS + """
+            function {{ this.get_name() }}_style(properties) {
+                var indicator = {{ this.get_name() }}_active;
+                return Object.assign({fill: true}, {{ this.style|tojson }},
+                                     {fillColor: {{ this.get_name() }}_fill(indicator, properties[indicator.column])});
+            }
+
+            var {{ this.get_name() }} = L.vectorGrid.protobuf({{ this.tiles_url|tojson }}, {
+                vectorTileLayerStyles: { {{ this.layer_name|tojson }}: {{ this.get_name() }}_style },
+                interactive: true,
+                maxNativeZoom: {{ this.max_native_zoom|tojson }},
+                getFeatureId: function(feature) {
+                    return feature.properties[{{ this.id_column|tojson }}];
+                }
+            }).addTo({{ this._parent.get_name() }});
+
+            function {{ this.get_name() }}_restyle() {
+                {{ this.get_name() }}.redraw();
+            }
+
+            var {{ this.get_name() }}_tip = L.tooltip({sticky: true, className: '{{ this.get_name() }}_tooltip'});
+            {{ this.get_name() }}.on({
+                mouseover: function(e) {
+                    var properties = e.layer.properties;
+                    var id = properties[{{ this.id_column|tojson }}];
+                    {{ this.get_name() }}.setFeatureStyle(id, Object.assign(
+                        {{ this.get_name() }}_style(properties), {{ this.highlight|tojson }}));
+                    {{ this.get_name() }}_tip.setContent({{ this.get_name() }}_tooltip_html(id, function(field) {
+                        return properties[field];
+                    }));
+                    {{ this._parent.get_name() }}.openTooltip({{ this.get_name() }}_tip, e.latlng);
+                },
+                mousemove: function(e) { {{ this.get_name() }}_tip.setLatLng(e.latlng); },
+                mouseout: function(e) {
+                    {{ this.get_name() }}.resetFeatureStyle(e.layer.properties[{{ this.id_column|tojson }}]);
+                    {{ this._parent.get_name() }}.closeTooltip({{ this.get_name() }}_tip);
+                }
+            });
+""" + INDICATOR_CONTROLS + """
+        {% endmacro %}
+    """)
+
+    default_js = [VECTOR_GRID]
+
+    def __init__(self, tiles_url, gdf, indicators, layer_name=LAYER_NAME,
+                 max_native_zoom=MAX_ZOOM, **kwargs):
+        super().__init__(gdf, indicators, **kwargs)
+        self._name = 'WardVectorTileLayer'
+        self.tiles_url = tiles_url
+        self.layer_name = layer_name
+        self.max_native_zoom = max_native_zoom
@@ -0,0 +1,243 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from render_queue import default_workers
+from spatial_weights import spatial_weights
+from ward_data import load_wards
+
+# Queen contiguity on this column reproduces the stored LISA_Cluster/LISA_Type
+DEFAULT_COLUMN = 'HVI_weighted_standardized'
+DEFAULT_PERMUTATIONS = 999
+SIGNIFICANCE = 0.05
+# Wards sharing one seeded draw of permutations; fixed so results do not
+# depend on the number of worker processes
+SEED_BLOCK = 256
+# Values gathered per batched permutation step; bounds the (wards,
+# permutations, neighbours) tensor each worker holds
+CHUNK_VALUES = 4000000
+QUADRANTS = {1: 'HH', 2: 'LH', 3: 'LL', 4: 'HL'}
+OUTPUT_GEOJSON = os.path.join('lisa', 'johannesburg_lisa.geojson')
+
+# p_norm is one-sided ("greater"), as spdep's moran.test; p_sim is the
+# folded pseudo p-value of the permutation test
+MoranResult = namedtuple('MoranResult', ['I', 'expected', 'variance', 'z', 'p_norm', 'p_sim'])
+# Per ward: local I, spatial lag, quadrant (1 HH, 2 LH, 3 LL, 4 HL) and pseudo p-value
+LocalMoranResult = namedtuple('LocalMoranResult', ['I', 'lag', 'quadrant', 'p_sim'])
+
+# Set once per worker process by _init_worker
+_worker_z = None
+_worker_weights = None
+
+
+def _init_worker(z, weights):
+    """Receive the values and weights once per worker, not once per block"""
+    global _worker_z, _worker_weights
+    _worker_z = z
+    _worker_weights = weights
+
+
+def pseudo_p_value(larger, permutations):
+    """(count + 1) / (permutations + 1), folded to the smaller tail as in GeoDa"""
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1.0) / (permutations + 1.0)
+
+
+def draw_distinct(rng, population, size, draws):
+    """``draws`` rows of ``size`` distinct integers from range(population).
+
+    Small samples draw with replacement and redraw the rows that repeat a
+    value; large ones take the smallest of random keys.
+    """
+    if size == 0:
+        return np.empty((draws, 0), dtype=np.int64)
+    if size * size <= population:
+        rows = rng.integers(0, population, (draws, size))
+        while True:
+            repeated = (np.diff(np.sort(rows, axis=1), axis=1) == 0).any(axis=1)
+            if not repeated.any():
+                return rows
+            rows[repeated] = rng.integers(0, population, (int(repeated.sum()), size))
+    rows = np.empty((draws, size), dtype=np.int64)
+    step = max(1, CHUNK_VALUES // population)
+    for start in range(0, draws, step):
+        keys = rng.random((min(step, draws - start), population))
+        rows[start:start + step] = np.argpartition(keys, size - 1, axis=1)[:, :size]
+    return rows
+
+
+def _global_block(task):
+    """Moran's I of one seeded batch of full permutations"""
+    seed, block, permutations = task
+    z, weights = _worker_z, _worker_weights
+    rng = np.random.default_rng([seed, 0, block])
+    step = max(1, CHUNK_VALUES // len(z))
+    simulated = []
+    for start in range(0, permutations, step):
+        shuffled = rng.permuted(np.tile(z, (min(step, permutations - start), 1)), axis=1)
+        lag = (weights @ shuffled.T).T
+        simulated.append((shuffled * lag).sum(axis=1))
+    return np.concatenate(simulated)
+
+
+def _local_block(task):
+    """Pseudo p-values of local I for one block of wards.
+
+    Conditional permutation: each ward keeps its value while its neighbours'
+    are replaced by a random draw from the other wards. One seeded draw of
+    neighbour slots serves the whole block, shifted past each ward's own
+    index, and the lags of many wards are gathered as one tensor.
+    """
+    seed, start, permutations = task
+    z, weights = _worker_z, _worker_weights
+    n = len(z)
+    stop = min(start + SEED_BLOCK, n)
+    wards = np.arange(start, stop)
+    counts = np.diff(weights.indptr)[start:stop]
+    max_k = int(counts.max()) if len(counts) else 0
+    p_values = np.full(len(wards), np.nan)
+    if max_k == 0:
+        return p_values
+
+    rng = np.random.default_rng([seed, 1, start])
+    slots = draw_distinct(rng, n - 1, max_k, permutations)
+    m2 = (z * z).mean()
+    observed = z[wards] * (weights[wards] @ z) / m2
+
+    # Neighbour weights padded with zeros to max_k
+    offsets = np.arange(max_k)
+    positions = weights.indptr[wards][:, None] + offsets
+    padded = np.where(offsets < counts[:, None],
+                      weights.data[np.minimum(positions, len(weights.data) - 1)], 0.0)
+
+    step = max(1, CHUNK_VALUES // (permutations * max_k))
+    for first in range(0, len(wards), step):
+        chunk = slice(first, first + step)
+        own = wards[chunk][:, None, None]
+        drawn = z[slots[None, :, :] + (slots[None, :, :] >= own)]
+        lag = (drawn @ padded[chunk][:, :, None])[:, :, 0]
+        simulated = z[wards[chunk]][:, None] * lag / m2
+        larger = (simulated >= observed[chunk][:, None]).sum(axis=1)
+        p_values[chunk] = pseudo_p_value(larger, permutations)
+    p_values[counts == 0] = np.nan
+    return p_values
+
+
+def _run_blocks(function, tasks, z, weights, processes):
+    processes = default_workers(len(tasks)) if processes is None else processes
+    if processes <= 1 or len(tasks) <= 1:
+        _init_worker(z, weights)
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(z, weights)) as pool:
+        return list(pool.map(function, tasks))
+
+
+def moran(values, weights, permutations=DEFAULT_PERMUTATIONS, seed=0, processes=None):
+    """Global Moran's I with randomisation-assumption and permutation inference.
+
+    ``weights`` is a sparse (wards x wards) matrix, e.g. from
+    spatial_weights. Permutations run in seeded batches of SEED_BLOCK
+    across a process pool.
+    """
+    z = np.asarray(values, dtype=float)
+    z = z - z.mean()
+    n = len(z)
+    s0 = weights.sum()
+    zz = (z * z).sum()
+    observed = n / s0 * (z * (weights @ z)).sum() / zz
+
+    # Variance under randomisation, as moran.test(randomisation=TRUE)
+    s1 = 0.5 * (weights + weights.T).power(2).sum()
+    s2 = ((np.asarray(weights.sum(axis=1)).ravel() + np.asarray(weights.sum(axis=0)).ravel()) ** 2).sum()
+    expected = -1.0 / (n - 1)
+    b2 = n * (z ** 4).sum() / zz ** 2
+    variance = (n * ((n * n - 3 * n + 3) * s1 - n * s2 + 3 * s0 * s0)
+                - b2 * ((n * n - n) * s1 - 2 * n * s2 + 6 * s0 * s0)) \
+        / ((n - 1) * (n - 2) * (n - 3) * s0 * s0) - expected ** 2
+    z_score = (observed - expected) / np.sqrt(variance)
+
+    p_sim = None
+    if permutations:
+        tasks = [(seed, block, min(SEED_BLOCK, permutations - block))
+                 for block in range(0, permutations, SEED_BLOCK)]
+        simulated = np.concatenate(_run_blocks(_global_block, tasks, z, weights, processes))
+        simulated = n / s0 * simulated / zz
+        p_sim = float(pseudo_p_value((simulated >= observed).sum(), permutations))
+    return MoranResult(float(observed), expected, float(variance), float(z_score),
+                       float(norm.sf(z_score)), p_sim)
+
+
+def local_moran(values, weights, permutations=DEFAULT_PERMUTATIONS, seed=0, processes=None):
+    """Local Moran's I per ward, as spdep's localmoran, with conditional permutations.
+
+    Wards are split into seeded blocks of SEED_BLOCK run across a process
+    pool, so p-values for a given ``seed`` are the same for any number of
+    processes. Wards with no neighbours get NaN p-values.
+    """
+    z = np.asarray(values, dtype=float)
+    z = z - z.mean()
+    lag = weights @ z
+    local = z * lag / (z * z).mean()
+    quadrant = np.where(z > 0, np.where(lag > 0, 1, 4), np.where(lag > 0, 2, 3))
+
+    p_sim = np.full(len(z), np.nan)
+    if permutations:
+        tasks = [(seed, start, permutations) for start in range(0, len(z), SEED_BLOCK)]
+        p_sim = np.concatenate(_run_blocks(_local_block, tasks, z, weights, processes))
+    return LocalMoranResult(local, lag, quadrant, p_sim)
+
+
+def lisa_columns(gdf, column=DEFAULT_COLUMN, kind='queen', weights=None,
+                 permutations=DEFAULT_PERMUTATIONS, seed=0, significance=SIGNIFICANCE,
+                 processes=None):
+    """Run LISA on a ward column and return a copy with the results as columns.
+
+    Sets ``LISA_Cluster`` (1 HH, 2 LH, 3 LL, 4 HL) and ``LISA_Type`` for
+    every ward, as the stored columns, plus ``LISA_I``, ``LISA_P`` and
+    ``LISA_Significant`` (p below ``significance``). Wards missing the value
+    are left out of the weights and get no cluster. ``weights`` defaults to
+    cached ``kind`` weights of the remaining wards. The global Moran's I is
+    kept in ``attrs['moran']``.
+    """
+    values = pd.to_numeric(gdf[column], errors='coerce')
+    complete = values.notna().to_numpy()
+    if weights is None:
+        weights = spatial_weights(gdf[complete], kind)
+    values = values.to_numpy(dtype=float)[complete]
+
+    global_result = moran(values, weights, permutations, seed, processes)
+    result = local_moran(values, weights, permutations, seed, processes)
+
+    gdf = gdf.copy()
+    for name, data, dtype in [('LISA_I', result.I, float), ('LISA_P', result.p_sim, float),
+                              ('LISA_Cluster', result.quadrant, 'Int32')]:
+        full = pd.Series(pd.NA if dtype == 'Int32' else np.nan, index=gdf.index, dtype=dtype)
+        full[complete] = data
+        gdf[name] = full
+    gdf['LISA_Type'] = gdf['LISA_Cluster'].map(QUADRANTS)
+    gdf['LISA_Significant'] = (gdf['LISA_P'] < significance).to_numpy()
+    gdf.attrs['moran'] = global_result._asdict()
+
+    counts = gdf.loc[gdf['LISA_Significant'], 'LISA_Type'].value_counts()
+    summary = ', '.join(f"{label} {counts.get(label, 0)}" for label in QUADRANTS.values())
+    print(f"Moran's I of {column}: {global_result.I:.4f} (z {global_result.z:.2f}, "
+          f"p_sim {global_result.p_sim}); significant at {significance}: {summary}")
+    return gdf
+
+
+def create_lisa_layer(gdf=None, column=DEFAULT_COLUMN, kind='queen',
+                      permutations=DEFAULT_PERMUTATIONS, seed=0, processes=None,
+                      output_path=OUTPUT_GEOJSON):
+    """Run LISA on the wards and save them with the LISA columns; returns the files written"""
+    if gdf is None:
+        gdf = load_wards()
+    gdf = lisa_columns(gdf, column, kind, permutations=permutations, seed=seed,
+                       processes=processes)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    gdf.to_crs(epsg=4326).to_file(output_path, driver='GeoJSON')
+    return [output_path]
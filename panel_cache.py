@@ -0,0 +1,145 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import shapely
+from matplotlib import colormaps
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+
+from tile_cache import add_basemap, basemap_state, evict_lru
+from ward_layer import plot_column
+
+PANEL_DIR = os.path.join('.hvi_cache', 'panels')
+# Least recently used layers are dropped once the panel cache grows past this
+PANEL_MAX_BYTES = 256 * 1024 * 1024
+# Same breathing room matplotlib's autoscaling leaves around the wards
+EXTENT_MARGIN = 0.05
+
+# One map in a multi-panel figure
+Panel = namedtuple('Panel', ['column', 'cmap', 'title', 'label'])
+
+
+def layer_extent(gdf, margin=EXTENT_MARGIN):
+    minx, miny, maxx, maxy = gdf.total_bounds
+    dx, dy = (maxx - minx) * margin, (maxy - miny) * margin
+    return (minx - dx, maxx + dx, miny - dy, maxy + dy)
+
+
+def layer_key(gdf, column, cmap, extent, dpi, width, facecolor, basemap_alpha):
+    """Hash everything that changes the pixels of a rasterized layer, basemap source included"""
+    digest = hashlib.sha256()
+    digest.update(repr((column, extent, dpi, width, facecolor, basemap_alpha,
+                        basemap_state())).encode('utf-8'))
+    digest.update(np.asarray(cmap(np.linspace(0, 1, 256))).tobytes())
+    digest.update(np.ascontiguousarray(gdf[column], dtype=float).tobytes())
+    digest.update(b''.join(shapely.to_wkb(np.asarray(gdf.geometry))))
+    return digest.hexdigest()
+
+
+def render_layer(gdf, column, cmap, extent, dpi, width, facecolor=None, basemap_alpha=None):
+    """Rasterize one indicator layer (wards + basemap) once and cache the PNG.
+
+    The image holds only the map itself, filling ``extent`` edge to edge;
+    titles and colour bars are added when panels are composed. Returns the
+    file path and whether it was cached: a layer whose basemap had tiles
+    missing offline is written to a temporary file the caller removes, so
+    a blank basemap never outlives the run.
+    """
+    cmap = colormaps[cmap] if isinstance(cmap, str) else cmap
+    key = layer_key(gdf, column, cmap, extent, dpi, width, facecolor, basemap_alpha)
+    path = os.path.join(PANEL_DIR, f"{column}-{key[:20]}.png")
+    if os.path.exists(path):
+        os.utime(path)
+        return path, True
+
+    left, right, bottom, top = extent
+    height = width * (top - bottom) / (right - left)
+    fig = plt.figure(figsize=(width, height))
+    ax = fig.add_axes([0, 0, 1, 1])
+    if facecolor is not None:
+        ax.set_facecolor(facecolor)
+    plot_column(gdf, column, ax, cmap=cmap)
+    ax.set_xlim(left, right)
+    ax.set_ylim(bottom, top)
+    missing = add_basemap(ax, alpha=basemap_alpha)
+    ax.axis('off')
+
+    os.makedirs(PANEL_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.png"
+    fig.savefig(tmp_path, dpi=dpi)
+    plt.close(fig)
+    if missing:
+        return tmp_path, False
+    os.replace(tmp_path, path)
+    evict_lru(PANEL_DIR, PANEL_MAX_BYTES)
+    return path, True
+
+
+def draw_panel(ax, gdf, panel, extent, dpi, width, title_kwds=None, legend_kwds=None,
+               facecolor=None, basemap_alpha=None):
+    """Show one panel on ``ax``: its cached layer image, title and colour bar.
+
+    The layer is rasterized ``width`` inches wide at ``dpi`` (see
+    ``render_layer``), so any figure asking for the same layer size reuses
+    the same image, whether it holds one map or many.
+    """
+    ax.axis('off')
+    if panel.column not in gdf.columns:
+        return
+
+    cmap = colormaps[panel.cmap] if isinstance(panel.cmap, str) else panel.cmap
+    path, cached = render_layer(gdf, panel.column, cmap, extent, dpi, width,
+                                facecolor=facecolor, basemap_alpha=basemap_alpha)
+    ax.imshow(plt.imread(path), extent=extent, interpolation='none')
+    if not cached:
+        os.remove(path)
+    ax.set_title(panel.title, **(title_kwds or {}))
+
+    values = np.asarray(gdf[panel.column], dtype=float)
+    norm = Normalize(vmin=np.nanmin(values), vmax=np.nanmax(values))
+    ax.figure.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax,
+                       **dict({'label': panel.label}, **(legend_kwds or {})))
+
+
+def compose_panels(gdf, panels, output_path, nrows, ncols, figsize, dpi=300,
+                   title_kwds=None, legend_kwds=None, facecolor=None, basemap_alpha=None,
+                   suptitle=None, suptitle_kwds=None, footer=None, tight_layout_rect=None):
+    """Assemble a multi-panel figure from cached layer images.
+
+    Each panel's layer is rasterized ``figsize[0] / ncols`` inches wide and
+    reused from disk, by later runs and by single maps drawn with
+    ``draw_panel`` at that width, so a combined figure costs about as much
+    as placing N images plus their titles and colour bars.
+    ``None`` panels leave an empty slot, which is removed.
+    """
+    extent = layer_extent(gdf)
+    panel_width = figsize[0] / ncols
+
+    fig, axes = plt.subplots(nrows, ncols, figsize=figsize)
+    fig.patch.set_facecolor('white')
+    axes = np.atleast_1d(axes).flatten()
+    if suptitle:
+        fig.suptitle(suptitle, **(suptitle_kwds or {}))
+
+    for ax, panel in zip(axes, panels):
+        if panel is None:
+            fig.delaxes(ax)
+            continue
+        draw_panel(ax, gdf, panel, extent, dpi, panel_width, title_kwds=title_kwds,
+                   legend_kwds=legend_kwds, facecolor=facecolor, basemap_alpha=basemap_alpha)
+
+    for ax in axes[len(panels):]:
+        fig.delaxes(ax)
+
+    if footer:
+        fig.text(0.02, 0.02, footer, fontsize=10, ha='left')
+    if tight_layout_rect is not None:
+        plt.tight_layout(rect=tight_layout_rect)
+    else:
+        plt.tight_layout()
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight',
+                facecolor='white', edgecolor='none')
+    plt.close(fig)
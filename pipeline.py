@@ -0,0 +1,269 @@
+import ast
+import hashlib
+import importlib
+import inspect
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from render_queue import default_workers
+from ward_data import CACHE_DIR, WARD_SOURCE, source_hash
+
+STATE_PATH = os.path.join(CACHE_DIR, 'build_state.json')
+# Local modules live next to this file; their code is part of every step key
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# One build step: ``target`` is "module:function", called with ``params``
+# (part of the step key) plus whichever run options it accepts (not part of
+# the key: worker counts and the like). ``inputs`` are files whose content is
+# hashed; ``outputs`` are files the step must produce. A step depends on any
+# step whose outputs it reads. Functions may return extra paths they wrote.
+Step = namedtuple('Step', ['name', 'target', 'inputs', 'outputs', 'params'])
+
+# Files written by the extraction modules (kept here so planning a build
+# does not import Earth Engine)
+EE_EXTRACTED_GEOJSON = os.path.join('ee_extracted_maps', 'johannesburg_with_ee_data.geojson')
+EE_SIMPLE_GEOJSON = os.path.join('ee_maps', 'johannesburg_ee_data.geojson')
+WORLDPOP_PATH = os.path.join('World_Pop', 'zaf_ppp_2020_UNadj_constrained.tif')
+
+STEPS = [
+    Step('ee_extract', 'ee_data_extraction:extract_indicators',
+         (WARD_SOURCE,), (EE_EXTRACTED_GEOJSON,), {'batched': False}),
+    Step('ee_extract_maps', 'ee_data_extraction:render_indicator_maps',
+         (EE_EXTRACTED_GEOJSON,), (os.path.join('ee_extracted_maps', 'combined_ee_analysis.png'),), {}),
+    Step('ee_simple_extract', 'ee_simple:extract_indicators',
+         (WARD_SOURCE, WORLDPOP_PATH), (EE_SIMPLE_GEOJSON,), {}),
+    Step('ee_simple_maps', 'ee_simple:render_indicator_maps',
+         (EE_SIMPLE_GEOJSON,), (), {}),
+    Step('static_analysis', 'ee_static_analysis:create_visualizations',
+         (WARD_SOURCE,), (os.path.join('static_maps', 'hvi_map.png'),
+                          os.path.join('static_maps', 'cvi_map.png')), {}),
+    Step('vulnerability_maps', 'visualize_hvi:create_static_maps',
+         (WARD_SOURCE,), ('johannesburg_vulnerability_maps.png',), {}),
+    Step('interactive_map', 'visualize_hvi:create_interactive_map',
+         (WARD_SOURCE,), ('johannesburg_interactive_map.html',), {}),
+    Step('statistical_plots', 'visualize_hvi:create_statistical_plots',
+         (WARD_SOURCE,), ('johannesburg_statistical_analysis.png',), {}),
+    Step('ward_tiles', 'visualize_hvi:export_ward_tiles',
+         (WARD_SOURCE,), (os.path.join('vector_tiles', 'manifest.json'),), {}),
+    Step('gwpca_maps', 'gwpca:create_gwpca_maps',
+         (WARD_SOURCE,), (os.path.join('gwpca_maps', 'johannesburg_gwpca.geojson'),), {}),
+    Step('lisa', 'lisa:create_lisa_layer',
+         (WARD_SOURCE,), (os.path.join('lisa', 'johannesburg_lisa.geojson'),), {'seed': 0}),
+    Step('rank_stability', 'rank_stability:save_rank_stability',
+         (WARD_SOURCE,), ('johannesburg_rank_stability.csv',), {'seed': 0}),
+]
+
+_code_files = {}
+
+
+def module_files(module_name):
+    """Source files of a local module and every local module it imports, at any depth"""
+    if module_name in _code_files:
+        return _code_files[module_name]
+
+    files, queue = set(), [module_name]
+    while queue:
+        path = os.path.join(SOURCE_DIR, f"{queue.pop()}.py")
+        if path in files or not os.path.exists(path):
+            continue
+        files.add(path)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+        # Imports inside functions count too: they run when the step does
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                queue.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                queue.append(node.module.split('.')[0])
+    _code_files[module_name] = sorted(files)
+    return _code_files[module_name]
+
+
+def file_digest(path):
+    return source_hash(path) if os.path.exists(path) else 'missing'
+
+
+def tile_settings(tile_options=None):
+    """Basemap settings steps render with: tile_cache's defaults (from the environment)
+    overridden by ``tile_options``"""
+    import tile_cache
+    return {name: (tile_options or {}).get(name, tile_cache.settings[name])
+            for name in ('offline', 'tile_dir')}
+
+
+def step_key(step, tile_options=None):
+    """Hash of everything a step's outputs are derived from: code, inputs and params.
+
+    Steps whose code draws basemaps (imports tile_cache) also hash the tile
+    settings, so maps drawn offline with blank tiles are redrawn online.
+    """
+    digest = hashlib.sha256(json.dumps([step.target, step.params], sort_keys=True,
+                                       default=str).encode('utf-8'))
+    files = module_files(step.target.split(':')[0])
+    if os.path.join(SOURCE_DIR, 'tile_cache.py') in files:
+        digest.update(json.dumps(tile_settings(tile_options), sort_keys=True).encode('utf-8'))
+    code = [os.path.relpath(path, SOURCE_DIR) for path in files]
+    for label, paths in (('code', code), ('input', step.inputs)):
+        for path in paths:
+            digest.update(f"{label}:{path}:{file_digest(path)}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def is_stale(step, key, record):
+    """True unless the step ran with this key and its outputs are untouched since"""
+    if record is None or record['key'] != key:
+        return True
+    return any(file_digest(path) != digest for path, digest in record['outputs'].items())
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def dependencies(steps):
+    """Upstream step names per step: the steps producing files it reads"""
+    producers = {os.path.normpath(path): step.name for step in steps for path in step.outputs}
+    return {step.name: sorted({producers[os.path.normpath(path)] for path in step.inputs
+                               if os.path.normpath(path) in producers})
+            for step in steps}
+
+
+def select_steps(steps, targets):
+    """The target steps and everything upstream of them, in declaration order"""
+    if not targets:
+        return list(steps)
+    by_name = {step.name: step for step in steps}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown build step(s): {', '.join(sorted(unknown))}")
+    upstream = dependencies(steps)
+    wanted, queue = set(), list(targets)
+    while queue:
+        name = queue.pop()
+        if name not in wanted:
+            wanted.add(name)
+            queue.extend(upstream[name])
+    return [step for step in steps if step.name in wanted]
+
+
+def _init_worker(tile_options):
+    import matplotlib
+    matplotlib.use('Agg')
+    if tile_options:
+        import tile_cache
+        tile_cache.configure(**tile_options)
+
+
+def _run_step(target, params, options):
+    module_name, function_name = target.split(':')
+    func = getattr(importlib.import_module(module_name), function_name)
+    accepted = inspect.signature(func).parameters
+    result = func(**params, **{name: value for name, value in options.items() if name in accepted})
+    # Anything else returned (frames, counts) stays in the worker
+    if isinstance(result, (list, tuple)) and all(isinstance(path, str) for path in result):
+        return list(result)
+    return []
+
+
+def plan(steps=STEPS, targets=None, state_path=STATE_PATH, tile_options=None):
+    """Names of the steps a build would run, without running anything.
+
+    A step downstream of a stale step is listed too, although at build time
+    it is skipped if its inputs come out unchanged.
+    """
+    steps = select_steps(steps, targets)
+    upstream = dependencies(steps)
+    state = load_state(state_path)
+    stale = []
+    for step in steps:
+        if any(name in stale for name in upstream[step.name]) or \
+                is_stale(step, step_key(step, tile_options), state.get(step.name)):
+            stale.append(step.name)
+    return stale
+
+
+def build(steps=STEPS, targets=None, jobs=None, force=False, state_path=STATE_PATH,
+          tile_options=None, **options):
+    """Bring the pipeline outputs up to date, running independent stale steps in parallel.
+
+    A step is keyed by the content of its code (the module and the local
+    modules it imports), its input files, its params and, for steps that
+    draw basemaps, the tile settings (``tile_options`` over the
+    environment defaults). It runs only when
+    that key differs from its last successful run or one of its recorded
+    outputs changed or disappeared. Keys are computed once upstream steps
+    finish, so a downstream step whose inputs were rebuilt identically is
+    not rerun. Steps whose upstream failed are skipped. ``options`` (e.g.
+    ``processes``, ``max_in_flight``) are passed to the steps that accept
+    them. Returns a dict of step name -> 'fresh', 'built', 'failed' or
+    'skipped'.
+    """
+    steps = select_steps(steps, targets)
+    upstream = dependencies(steps)
+    jobs = default_workers(len(steps)) if jobs is None else max(1, jobs)
+    # Steps render in their own process pools; share the cores between them
+    options.setdefault('processes', max(1, (os.cpu_count() or 1) // jobs))
+
+    state = load_state(state_path)
+    status, running, keys = {}, {}, {}
+    pending = list(steps)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(tile_options,)) as pool:
+        while pending or running:
+            for step in list(pending):
+                deps = [status.get(name) for name in upstream[step.name]]
+                if any(dep in ('failed', 'skipped') for dep in deps):
+                    status[step.name] = 'skipped'
+                    print(f"[build] {step.name}: skipped, an upstream step failed")
+                elif all(dep in ('fresh', 'built') for dep in deps):
+                    keys[step.name] = step_key(step, tile_options)
+                    if not force and not is_stale(step, keys[step.name], state.get(step.name)):
+                        status[step.name] = 'fresh'
+                    else:
+                        print(f"[build] {step.name}: running {step.target}")
+                        running[pool.submit(_run_step, step.target, step.params, options)] = step
+                else:
+                    continue
+                pending.remove(step)
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                try:
+                    written = future.result()
+                    missing = [path for path in step.outputs if not os.path.exists(path)]
+                    if missing:
+                        raise RuntimeError(f"did not write {', '.join(missing)}")
+                except Exception as e:
+                    status[step.name] = 'failed'
+                    state.pop(step.name, None)
+                    print(f"Error building {step.name}: {str(e)}")
+                else:
+                    outputs = dict.fromkeys(os.path.normpath(path) for path in (*step.outputs, *written)
+                                            if os.path.exists(path))
+                    state[step.name] = {'key': keys[step.name],
+                                        'outputs': {path: file_digest(path) for path in outputs}}
+                    status[step.name] = 'built'
+                    print(f"[build] {step.name}: built {len(outputs)} file(s)")
+                save_state(state, state_path)
+
+    counts = {label: sum(1 for value in status.values() if value == label)
+              for label in ('built', 'fresh', 'failed', 'skipped')}
+    print("[build] " + ", ".join(f"{count} {label}" for label, count in counts.items()))
+    return status
@@ -0,0 +1,184 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from hvi_composite import HVI_VARIABLES, standardize
+from ward_data import load_wards
+
+DEFAULT_DRAWS = 20000
+# As the top-40 vulnerable wards list
+DEFAULT_TOP_N = 40
+PERCENTILES = (5, 25, 50, 75, 95)
+# Scores held per batch (wards x weight vectors); bounds memory at any draw count
+CHUNK_VALUES = 4000000
+# Rank histograms keep at most this many bins per ward; ranks are exact up to
+# this many wards and binned above it
+RANK_BINS = 1000
+# Indicators where a higher value means lower vulnerability; they enter the
+# composites with their sign flipped
+PROTECTIVE_VARIABLES = ['NDVI']
+OUTPUT_CSV = 'johannesburg_rank_stability.csv'
+
+# Per ward: baseline_rank (equal weights), mean_rank, percentiles
+# (wards, len(PERCENTILES)) and top_frequency (share of draws in the top N)
+RankStability = namedtuple('RankStability',
+                           ['draws', 'top_n', 'baseline_rank', 'mean_rank', 'percentiles',
+                            'top_frequency'])
+
+
+class RankHistogram:
+    """Streaming per-ward histograms of rank (1 = most vulnerable).
+
+    Memory is (wards x bins) counts whatever the number of draws; with at
+    most RANK_BINS wards every rank has its own bin, so percentiles are
+    exact.
+    """
+
+    def __init__(self, n_wards, max_bins=RANK_BINS):
+        self.n_wards = n_wards
+        self.width = max(1, -(-n_wards // max_bins))
+        self.bins = -(-n_wards // self.width)
+        self.counts = np.zeros((n_wards, self.bins), dtype=np.int64)
+        self.rank_sum = np.zeros(n_wards)
+        self.total = 0
+
+    def add(self, ranks):
+        """Count a batch of rankings, shaped (draws, wards)"""
+        bins = (ranks - 1) // self.width
+        flat = (np.arange(self.n_wards) * self.bins + bins).ravel()
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.rank_sum += ranks.sum(axis=0)
+        self.total += len(ranks)
+
+    def percentile(self, q):
+        """Rank at percentile ``q`` per ward (lower edge of its bin when binned)"""
+        cumulative = self.counts.cumsum(axis=1)
+        position = (cumulative >= np.ceil(q / 100 * self.total)).argmax(axis=1)
+        return position * self.width + 1
+
+    def frequency_at_or_above(self, rank):
+        """Share of draws in which each ward ranked ``rank`` or better"""
+        full = rank // self.width
+        share = self.counts[:, :full].sum(axis=1)
+        if full < self.bins and rank % self.width:
+            # A partly covered bin counts in proportion
+            share = share + self.counts[:, full] * (rank % self.width) / self.width
+        return share / max(self.total, 1)
+
+    def mean(self):
+        return self.rank_sum / max(self.total, 1)
+
+
+def indicator_matrix(gdf, variables=HVI_VARIABLES, protective=PROTECTIVE_VARIABLES):
+    """Standardized indicators oriented so higher is more vulnerable, for complete wards.
+
+    Returns the (wards, variables) matrix and the boolean mask of wards kept.
+    """
+    values = gdf[list(variables)].apply(pd.to_numeric, errors='coerce')
+    complete = values.notna().all(axis=1).to_numpy()
+    signs = np.array([-1.0 if variable in protective else 1.0 for variable in variables])
+    return standardize(values.to_numpy(dtype=float)[complete]) * signs, complete
+
+
+def weight_batches(n_variables, draws, batch, seed=0, alpha=1.0, lower=None, upper=None):
+    """Yield (batch, variables) weight vectors summing to one, ``draws`` in total.
+
+    Without bounds weights are Dirichlet(``alpha``); ``alpha`` 1 is uniform
+    over all weightings. With ``lower``/``upper`` (per variable, relative
+    weights) each weight is uniform within its bounds before normalizing,
+    which leaves the rankings unchanged.
+    """
+    rng = np.random.default_rng(seed)
+    bounded = lower is not None or upper is not None
+    if bounded:
+        lower = np.broadcast_to(np.asarray(0.0 if lower is None else lower, dtype=float), (n_variables,))
+        upper = np.broadcast_to(np.asarray(1.0 if upper is None else upper, dtype=float), (n_variables,))
+        if (lower < 0).any() or (upper < lower).any() or not (upper > 0).any():
+            raise ValueError("Weight bounds need 0 <= lower <= upper and some upper above 0")
+    for start in range(0, draws, batch):
+        size = min(batch, draws - start)
+        if bounded:
+            weights = lower + (upper - lower) * rng.random((size, n_variables))
+        else:
+            weights = rng.dirichlet(np.full(n_variables, alpha), size)
+        yield weights / weights.sum(axis=1, keepdims=True)
+
+
+def ranks_of(scores):
+    """Ranks (1 = highest score) of every ward in each row of ``scores``"""
+    # numpy's default (vectorized introsort) is several times faster than a stable sort
+    order = np.argsort(-scores, axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1), axis=1)
+    return ranks
+
+
+def rank_stability(values, draws=DEFAULT_DRAWS, top_n=DEFAULT_TOP_N, seed=0, alpha=1.0,
+                   lower=None, upper=None):
+    """Monte Carlo ranks of weighted composites of oriented indicators.
+
+    ``values`` is (wards, variables). Each batch of weight vectors scores all
+    wards with one matrix product and ranks them with one argsort; only the
+    running rank histograms are kept, so memory does not grow with ``draws``.
+    """
+    n_wards, n_variables = values.shape
+    histogram = RankHistogram(n_wards)
+    batch = max(1, CHUNK_VALUES // n_wards)
+    for weights in weight_batches(n_variables, draws, batch, seed, alpha, lower, upper):
+        histogram.add(ranks_of(weights @ values.T))
+
+    baseline = ranks_of((values.mean(axis=1))[None, :])[0]
+    percentiles = np.column_stack([histogram.percentile(q) for q in PERCENTILES])
+    top_n = min(top_n, n_wards)
+    return RankStability(draws, top_n, baseline, histogram.mean(), percentiles,
+                         histogram.frequency_at_or_above(top_n))
+
+
+def rank_stability_table(gdf, variables=HVI_VARIABLES, id_column='WardID_', **kwargs):
+    """Rank stability per ward as a DataFrame, most vulnerable (equal weights) first.
+
+    Columns: the ward id, ``Baseline_Rank``, ``Mean_Rank``, ``Rank_P<q>``
+    for each of PERCENTILES and ``Top<N>_Frequency``. Wards missing an
+    indicator are left out.
+    """
+    values, complete = indicator_matrix(gdf, variables)
+    result = rank_stability(values, **kwargs)
+    table = pd.DataFrame({id_column: gdf[id_column].to_numpy()[complete],
+                          'Baseline_Rank': result.baseline_rank,
+                          'Mean_Rank': result.mean_rank})
+    for q, column in zip(PERCENTILES, result.percentiles.T):
+        table[f'Rank_P{q}'] = column
+    table[f'Top{result.top_n}_Frequency'] = result.top_frequency
+    table = table.sort_values('Baseline_Rank').reset_index(drop=True)
+
+    stable = (table[f'Top{result.top_n}_Frequency'] >= 0.95).sum()
+    print(f"Rank stability: {result.draws} weightings of {len(variables)} indicators; "
+          f"{stable} ward(s) in the top {result.top_n} in at least 95% of draws")
+    return table
+
+
+def load_bounds(path, variables=HVI_VARIABLES):
+    """Per-variable (lower, upper) relative weights from a CSV of variable,lower,upper.
+
+    Variables not listed keep bounds (0, 1).
+    """
+    bounds = pd.read_csv(path).set_index('variable')
+    unknown = sorted(set(bounds.index) - set(variables))
+    if unknown:
+        raise ValueError(f"Unknown indicators in {path}: {', '.join(unknown)}")
+    bounds = bounds.reindex(list(variables))
+    return bounds['lower'].fillna(0.0).to_numpy(), bounds['upper'].fillna(1.0).to_numpy()
+
+
+def save_rank_stability(gdf=None, output_path=OUTPUT_CSV, bounds=None, **kwargs):
+    """Run the rank-stability analysis on the wards and write the CSV; returns the files written"""
+    if gdf is None:
+        gdf = load_wards(columns=['WardID_'] + HVI_VARIABLES)
+    if bounds is not None:
+        kwargs['lower'], kwargs['upper'] = load_bounds(bounds)
+    table = rank_stability_table(gdf, **kwargs)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    table.to_csv(output_path, index=False)
+    return [output_path]
@@ -0,0 +1,215 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window, from_bounds
+
+# Chunk used for strip-organised (untiled) GeoTIFFs, whose native blocks
+# span the full raster width and would pull whole national rows into memory
+STRIP_CHUNK_SHAPE = (256, 1024)
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class BlockCache:
+    """Least-recently-used store of raster blocks bounded by total bytes"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+
+    def get(self, key):
+        block = self._blocks.get(key)
+        if block is None:
+            self.misses += 1
+            return None
+        self._blocks.move_to_end(key)
+        self.hits += 1
+        return block
+
+    def put(self, key, block):
+        if key in self._blocks:
+            self.nbytes -= self._blocks.pop(key).nbytes
+        if block.nbytes > self.max_bytes:
+            return
+        self._blocks[key] = block
+        self.nbytes += block.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._blocks.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._blocks.clear()
+        self.nbytes = 0
+
+
+# Shared by every reader so repeated extractions reuse blocks already read
+block_cache = BlockCache()
+
+
+class WindowedRaster:
+    """Read only the block-aligned windows of a raster that a region touches.
+
+    Blocks follow the file's internal tiling (or ``STRIP_CHUNK_SHAPE`` for
+    striped files) and are kept in a bounded LRU cache, so memory and read
+    time scale with the study area rather than with the size of the file.
+    """
+
+    def __init__(self, path, band=1, cache=None):
+        self.path = os.path.abspath(path)
+        self.band = band
+        self.cache = block_cache if cache is None else cache
+        self._src = rasterio.open(self.path)
+        self._stamp = os.path.getmtime(self.path)
+
+        block_height, block_width = self._src.block_shapes[band - 1]
+        if block_width >= self._src.width and self._src.width > STRIP_CHUNK_SHAPE[1]:
+            block_height = max(block_height, STRIP_CHUNK_SHAPE[0])
+            block_width = STRIP_CHUNK_SHAPE[1]
+        self.block_shape = (block_height, block_width)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._src.close()
+
+    @property
+    def crs(self):
+        return self._src.crs
+
+    @property
+    def nodata(self):
+        return self._src.nodata
+
+    @property
+    def dtype(self):
+        return self._src.dtypes[self.band - 1]
+
+    @property
+    def transform(self):
+        return self._src.transform
+
+    @property
+    def shape(self):
+        return (self._src.height, self._src.width)
+
+    def window_transform(self, window):
+        return self._src.window_transform(window)
+
+    def same_grid(self, other):
+        """True when ``other`` has this raster's CRS, transform and shape"""
+        return self.crs == other.crs and self.transform == other.transform \
+            and self.shape == other.shape
+
+    def warped(self, reference):
+        """This raster resampled on the fly onto the grid of ``reference``.
+
+        Returns a rasterio WarpedVRT (nearest neighbour) with ``reference``'s
+        CRS, transform and shape; read it window by window with
+        ``read_warped``, and close it before closing this raster.
+        Reference pixels the raster does not cover read as its nodata
+        value. A raster without one gets an alpha band instead, which is 0
+        over those pixels, so they are never taken for real zeros.
+        """
+        if self.nodata is None:
+            return WarpedVRT(self._src, crs=reference.crs, transform=reference.transform,
+                             width=reference.shape[1], height=reference.shape[0],
+                             add_alpha=True)
+        return WarpedVRT(self._src, crs=reference.crs, transform=reference.transform,
+                         width=reference.shape[1], height=reference.shape[0],
+                         nodata=self.nodata)
+
+    def read_warped(self, vrt, window):
+        """Read ``window`` of this raster's band from a VRT made by ``warped``.
+
+        When the raster has no nodata value the pixels it does not cover
+        come back as NaN (in a float array), as ``valid_mask`` expects.
+        """
+        if self.nodata is not None:
+            return vrt.read(self.band, window=window)
+        data, alpha = vrt.read([self.band, vrt.count], window=window)
+        data = data.astype(float)
+        data[alpha == 0] = np.nan
+        return data
+
+    def window_for_bounds(self, bounds):
+        """Pixel window covering ``bounds``, clipped to the raster extent.
+
+        Bounds entirely off the raster give an empty window.
+        """
+        window = from_bounds(*bounds, transform=self._src.transform)
+        height, width = self._src.height, self._src.width
+        row_start = min(max(int(np.floor(window.row_off)), 0), height)
+        col_start = min(max(int(np.floor(window.col_off)), 0), width)
+        row_stop = min(max(int(np.ceil(window.row_off + window.height)), row_start), height)
+        col_stop = min(max(int(np.ceil(window.col_off + window.width)), col_start), width)
+        return Window.from_slices((row_start, row_stop), (col_start, col_stop))
+
+    def _read_block(self, block_row, block_col):
+        key = (self.path, self._stamp, self.band, block_row, block_col)
+        block = self.cache.get(key)
+        if block is None:
+            block_height, block_width = self.block_shape
+            window = Window(block_col * block_width, block_row * block_height,
+                            min(block_width, self._src.width - block_col * block_width),
+                            min(block_height, self._src.height - block_row * block_height))
+            block = self._src.read(self.band, window=window)
+            self.cache.put(key, block)
+        return block
+
+    def read_window(self, window, cached=True):
+        """Assemble ``window`` from the cached blocks that intersect it.
+
+        With ``cached=False`` the window is read straight from the file,
+        for one-off passes that should not evict reusable blocks.
+        """
+        if not cached:
+            return self._src.read(self.band, window=window)
+        row_start, row_stop = int(window.row_off), int(window.row_off + window.height)
+        col_start, col_stop = int(window.col_off), int(window.col_off + window.width)
+        out = np.empty((max(row_stop - row_start, 0), max(col_stop - col_start, 0)),
+                       dtype=self.dtype)
+        if not out.size:
+            return out
+
+        block_height, block_width = self.block_shape
+        for block_row in range(row_start // block_height, (row_stop - 1) // block_height + 1):
+            for block_col in range(col_start // block_width, (col_stop - 1) // block_width + 1):
+                block = self._read_block(block_row, block_col)
+                top, left = block_row * block_height, block_col * block_width
+                r0, r1 = max(row_start, top), min(row_stop, top + block.shape[0])
+                c0, c1 = max(col_start, left), min(col_stop, left + block.shape[1])
+                out[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = \
+                    block[r0 - top:r1 - top, c0 - left:c1 - left]
+        return out
+
+    def iter_windows(self, bounds=None):
+        """Block-row strips covering ``bounds`` (or the whole raster), top to bottom.
+
+        Each strip is one block high, so streaming a raster through them
+        reads every block exactly once and holds only one strip in memory.
+        """
+        if bounds is None:
+            full = Window(0, 0, self._src.width, self._src.height)
+        else:
+            full = self.window_for_bounds(bounds)
+        row_start, row_stop = int(full.row_off), int(full.row_off + full.height)
+        block_height = self.block_shape[0]
+        top = row_start
+        while top < row_stop:
+            bottom = min((top // block_height + 1) * block_height, row_stop)
+            yield Window(full.col_off, top, full.width, bottom - top)
+            top = bottom
+
+    def read_bounds(self, bounds):
+        """Read the pixels covering ``bounds``; returns (array, transform)"""
+        window = self.window_for_bounds(bounds)
+        return self.read_window(window), self._src.window_transform(window)
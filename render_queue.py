@@ -0,0 +1,79 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# One independent figure: the renderer is called as
+# renderer(gdf, column, title, cmap, label, output_path)
+MapJob = namedtuple('MapJob', ['column', 'title', 'cmap', 'label', 'output_path'])
+
+# Set once per worker process by _init_worker
+_worker_gdf = None
+_worker_renderer = None
+
+
+def _init_worker(gdf, renderer):
+    """Receive the ward layer and renderer once per worker, not once per job"""
+    global _worker_gdf, _worker_renderer
+    import matplotlib
+    matplotlib.use('Agg')
+    _worker_gdf = gdf
+    _worker_renderer = renderer
+
+
+def _output_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _render_job(job):
+    # Renderers such as create_map print their own errors and return, so a
+    # job only counts as done when it (re)wrote its output file
+    before = _output_stamp(job.output_path)
+    _worker_renderer(_worker_gdf, *job)
+    after = _output_stamp(job.output_path)
+    if after is None or after == before:
+        raise RuntimeError("renderer did not write the output")
+    return job.output_path
+
+
+def default_workers(n_jobs):
+    return max(1, min(n_jobs, os.cpu_count() or 1))
+
+
+def render_maps(jobs, gdf, renderer, processes=None):
+    """Render independent map figures, spread across a process pool.
+
+    ``renderer`` must be a module-level function so worker processes can
+    import it. Each worker renders with exactly the code path used
+    serially (``processes=1``), so the PNGs are byte-identical either way.
+    Returns the output paths of the jobs that wrote their file, in job
+    order; a job that raised, or left its output missing or untouched, is
+    reported and left out.
+    """
+    jobs = [MapJob(*job) for job in jobs]
+    if not jobs:
+        return []
+    processes = default_workers(len(jobs)) if processes is None else processes
+
+    done = []
+    if processes <= 1:
+        _init_worker(gdf, renderer)
+        for job in jobs:
+            try:
+                done.append(_render_job(job))
+            except Exception as e:
+                print(f"Error rendering {job.output_path}: {str(e)}")
+        return done
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(gdf, renderer)) as pool:
+        futures = [pool.submit(_render_job, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                done.append(future.result())
+            except Exception as e:
+                print(f"Error rendering {job.output_path}: {str(e)}")
+    return done
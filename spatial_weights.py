@@ -0,0 +1,168 @@
+import hashlib
+import os
+
+import numpy as np
+import shapely
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from ward_data import CACHE_DIR
+
+WEIGHTS_DIR = os.path.join(CACHE_DIR, 'weights')
+# UTM 35S: metric distances between Johannesburg ward centres
+PROJECTED_EPSG = 32735
+KINDS = ('queen', 'rook', 'knn', 'distance')
+DEFAULT_K = 6
+
+_weights = {}
+
+
+def ward_coordinates(gdf):
+    """Ward centres (points on surface) in metres"""
+    points = gdf.geometry.to_crs(epsg=PROJECTED_EPSG).representative_point()
+    return np.column_stack([points.x, points.y])
+
+
+def geometry_hash(gdf):
+    """SHA-256 of the ward geometries (as WKB) and their CRS"""
+    digest = hashlib.sha256()
+    digest.update(str(gdf.crs).encode('utf-8'))
+    digest.update(b''.join(shapely.to_wkb(gdf.geometry.values)))
+    return digest.hexdigest()
+
+
+def contiguity_pairs(geometries, rook=False, snap=0.0):
+    """Index pairs (i < j) of wards sharing a boundary point (queen) or edge (rook).
+
+    Candidates come from one bulk STRtree query, so the cost grows with the
+    number of neighbours rather than the square of the ward count. Wards
+    within ``snap`` (CRS units) of each other count as touching, like
+    poly2nb's ``snap``; rook contiguity then needs more than ``snap`` of
+    shared boundary.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    tree = shapely.STRtree(geometries)
+    if snap > 0:
+        left, right = tree.query(geometries, predicate='dwithin', distance=snap)
+    else:
+        left, right = tree.query(geometries, predicate='intersects')
+    keep = left < right
+    left, right = left[keep], right[keep]
+    if rook and len(left):
+        if snap > 0:
+            boundaries = shapely.boundary(geometries)
+            shared = shapely.intersection(boundaries[left], shapely.buffer(boundaries[right], snap))
+            edge = shapely.length(shared) > 2 * snap
+        else:
+            # Boundaries meeting along a line; a relate test is cheaper than an overlay
+            edge = shapely.relate_pattern(geometries[left], geometries[right], '****1****')
+        left, right = left[edge], right[edge]
+    return left, right
+
+
+def knn_pairs(coordinates, k=DEFAULT_K):
+    """Rows and columns linking every ward to its ``k`` nearest other wards"""
+    n = len(coordinates)
+    k = min(k, n - 1)
+    _, indices = cKDTree(coordinates).query(coordinates, k=k + 1)
+    indices = indices.reshape(n, -1)
+    # Drop each ward itself; with duplicate centres it may not come first
+    rows = np.arange(n)[:, None]
+    keep = indices != rows
+    keep[keep.all(axis=1), -1] = False
+    return np.repeat(np.arange(n), k), indices[keep]
+
+
+def min_threshold(coordinates):
+    """Smallest distance band that leaves no ward without a neighbour"""
+    if len(coordinates) < 2:
+        return 0.0
+    distances, _ = cKDTree(coordinates).query(coordinates, k=2)
+    # Widened slightly so rounding in the pair search cannot drop the farthest ward
+    return float(distances[:, 1].max()) * (1 + 1e-9)
+
+
+def distance_band_pairs(coordinates, threshold):
+    """Index pairs (i < j) of wards whose centres are within ``threshold`` metres"""
+    pairs = cKDTree(coordinates).query_pairs(threshold, output_type='ndarray')
+    return pairs[:, 0], pairs[:, 1]
+
+
+def pairs_matrix(rows, columns, n, symmetric=True):
+    """Binary CSR matrix with ones at (rows, columns), mirrored when ``symmetric``"""
+    if symmetric:
+        rows, columns = np.concatenate([rows, columns]), np.concatenate([columns, rows])
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n, n))
+    # Duplicate pairs would otherwise add up
+    matrix.data[:] = 1.0
+    matrix.sort_indices()
+    return matrix
+
+
+def row_standardize(matrix):
+    """Scale each row to sum to one; wards with no neighbours keep an empty row"""
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    scale = np.divide(1.0, sums, out=np.zeros_like(sums), where=sums > 0)
+    return sparse.csr_matrix(sparse.diags(scale) @ matrix)
+
+
+def build_weights(gdf, kind='queen', k=DEFAULT_K, threshold=None, snap=0.0):
+    """Binary (unstandardized) weights of ``kind`` for the wards in row order"""
+    n = len(gdf)
+    if kind in ('queen', 'rook'):
+        rows, columns = contiguity_pairs(gdf.geometry.values, rook=kind == 'rook', snap=snap)
+        return pairs_matrix(rows, columns, n)
+    coordinates = ward_coordinates(gdf)
+    if kind == 'knn':
+        rows, columns = knn_pairs(coordinates, k)
+        return pairs_matrix(rows, columns, n, symmetric=False)
+    if threshold is None:
+        threshold = min_threshold(coordinates)
+    rows, columns = distance_band_pairs(coordinates, threshold)
+    return pairs_matrix(rows, columns, n)
+
+
+def weights_path(key):
+    return os.path.join(WEIGHTS_DIR, f"{key[:24]}.npz")
+
+
+def spatial_weights(gdf, kind='queen', k=DEFAULT_K, threshold=None, snap=0.0, style='W',
+                    cache=True):
+    """Sparse spatial weights between the wards of ``gdf``, as a CSR matrix.
+
+    ``kind`` is 'queen' or 'rook' contiguity, 'knn' (the ``k`` nearest
+    ward centres; not symmetric) or 'distance' (centres within
+    ``threshold`` metres; by default the smallest band giving every ward
+    a neighbour). ``style`` 'W' row-standardizes, as nb2listw's default,
+    and 'B' keeps binary weights. Wards with no neighbours get empty rows.
+
+    Matrices are cached in memory and as .npz under .hvi_cache/weights,
+    keyed by a hash of the geometry and the parameters, so repeat runs
+    skip construction entirely.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown weights kind {kind!r}; expected one of {', '.join(KINDS)}")
+    if style not in ('W', 'B'):
+        raise ValueError(f"Unknown weights style {style!r}; expected 'W' or 'B'")
+    params = {'queen': (snap,), 'rook': (snap,), 'knn': (k,), 'distance': (threshold,)}[kind]
+    key = hashlib.sha256(repr((geometry_hash(gdf), kind, params, style)).encode('utf-8')).hexdigest()
+
+    if key in _weights:
+        return _weights[key].copy()
+    path = weights_path(key)
+    if cache and os.path.exists(path):
+        matrix = sparse.csr_matrix(sparse.load_npz(path))
+    else:
+        matrix = build_weights(gdf, kind, k=k, threshold=threshold, snap=snap)
+        islands = int((np.diff(matrix.indptr) == 0).sum())
+        if islands:
+            print(f"Spatial weights ({kind}): {islands} ward(s) have no neighbours")
+        if style == 'W':
+            matrix = row_standardize(matrix)
+        if cache:
+            os.makedirs(WEIGHTS_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            sparse.save_npz(tmp_path, matrix, compressed=False)
+            os.replace(tmp_path, path)
+    _weights[key] = matrix
+    return matrix.copy()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from density_plots import pixel_chunks
+
+
+def write_raster(path, data, transform, nodata=None):
+    with rasterio.open(path, 'w', driver='GTiff', height=data.shape[0], width=data.shape[1],
+                       count=1, dtype=data.dtype, crs='EPSG:32735', transform=transform,
+                       nodata=nodata) as dst:
+        dst.write(data, 1)
+
+
+@pytest.mark.parametrize('nodata', [None, -9999.0])
+def test_uncovered_pixels_are_dropped(tmp_path, nodata):
+    # y covers only the left half of x's grid, on a grid of its own
+    x = np.arange(1, 65, dtype='float32').reshape(8, 8)
+    y = np.zeros((8, 4), dtype='float32')
+    write_raster(tmp_path / 'x.tif', x, from_origin(600000, 7100000, 30, 30))
+    write_raster(tmp_path / 'y.tif', y, from_origin(600000, 7100000, 60, 30), nodata=nodata)
+
+    chunks = list(pixel_chunks(tmp_path / 'x.tif', tmp_path / 'y.tif'))
+    xs = np.concatenate([chunk[0] for chunk in chunks])
+    ys = np.concatenate([chunk[1] for chunk in chunks])
+
+    # y's zeros are real values where it covers x and nothing else is kept
+    np.testing.assert_array_equal(np.sort(xs), x.ravel())
+    np.testing.assert_array_equal(ys, 0.0)
+
+    write_raster(tmp_path / 'y.tif', y[:, :2], from_origin(600000, 7100000, 60, 30), nodata=nodata)
+    chunks = list(pixel_chunks(tmp_path / 'x.tif', tmp_path / 'y.tif'))
+    xs = np.concatenate([chunk[0] for chunk in chunks])
+    np.testing.assert_array_equal(np.sort(xs), x[:, :4].ravel())
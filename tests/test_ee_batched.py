@@ -0,0 +1,53 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from benchmarks import fake_ee
+
+# The stand-in must be the ee module before any repo module imports ee
+fake_ee.install()
+
+import ee  # noqa: E402
+import ee_data_extraction  # noqa: E402
+from ee_geometry import gdf_to_feature_collection  # noqa: E402
+
+PIXELS = fake_ee.Image.PIXELS_PER_REGION
+
+
+@pytest.fixture
+def wards(tmp_path, monkeypatch):
+    # Reductions are cached under .ee_cache in the working directory
+    monkeypatch.chdir(tmp_path)
+    gdf = gpd.GeoDataFrame({'WardID_': [101, 102, 103]},
+                           geometry=[shapely.box(x, 0, x + 0.1, 0.1) for x in (28.0, 28.1, 28.2)],
+                           crs='EPSG:4326')
+    return gdf_to_feature_collection(gdf, id_column='WardID_')
+
+
+def test_batched_names_multi_band_group(wards):
+    table = ee_data_extraction.extract_ee_data_batched(
+        [('LST', ee.Image(30.0)), ('NDVI', ee.Image(0.4))], wards)
+    assert sorted(table.columns) == ['LST_count', 'LST_mean', 'LST_stdDev',
+                                     'NDVI_count', 'NDVI_mean', 'NDVI_stdDev']
+    assert list(table.index) == ['101', '102', '103']
+    np.testing.assert_allclose(table['LST_mean'], 30.0)
+    np.testing.assert_allclose(table['NDVI_count'], PIXELS)
+
+
+def test_batched_names_single_band_group(wards):
+    # UHI alone at 250 m: Earth Engine names that group's outputs mean/stdDev/count
+    table = ee_data_extraction.extract_ee_data_batched(
+        [('LST', ee.Image(30.0)), ('NDVI', ee.Image(0.4)), ('UHI', ee.Image(2.5))], wards,
+        scales={'UHI': 250})
+    for name, value in (('LST', 30.0), ('NDVI', 0.4), ('UHI', 2.5)):
+        np.testing.assert_allclose(table[f'{name}_mean'], value)
+        np.testing.assert_allclose(table[f'{name}_stdDev'], 0.0)
+        np.testing.assert_allclose(table[f'{name}_count'], PIXELS)
+    assert not {'mean', 'stdDev', 'count'} & set(table.columns)
+
+
+def test_batched_single_indicator(wards):
+    table = ee_data_extraction.extract_ee_data_batched([('POPULATION', ee.Image(12.0))], wards)
+    assert sorted(table.columns) == ['POPULATION_count', 'POPULATION_mean', 'POPULATION_stdDev']
+    np.testing.assert_allclose(table['POPULATION_mean'], 12.0)
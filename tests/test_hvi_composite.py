@@ -0,0 +1,35 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+
+from conftest import REPO_DIR
+from hvi_composite import HVI_VARIABLES, composite_indices, compute_indices
+
+
+@pytest.fixture(scope='module')
+def wards():
+    path = os.path.join(REPO_DIR, 'HVI_with_CVI.geojson')
+    if not os.path.exists(path):
+        pytest.skip("ward data not present")
+    return gpd.read_file(path)
+
+
+def test_reproduces_stored_indices(wards):
+    indices = compute_indices(wards)
+    for column in indices.columns:
+        np.testing.assert_allclose(indices[column], wards[column].to_numpy(dtype=float),
+                                   rtol=0, atol=1e-9, err_msg=column)
+
+
+def test_batch_matches_one_at_a_time(wards):
+    rng = np.random.default_rng(2)
+    values = wards[HVI_VARIABLES].to_numpy(dtype=float)
+    # Perturbed copies of the indicators, recomputed together and separately
+    batch = values * rng.lognormal(0, 0.1, size=(5,) + values.shape)
+    together = composite_indices(batch)
+    for i, matrix in enumerate(batch):
+        for name, column in composite_indices(matrix).items():
+            np.testing.assert_allclose(together[name][i], column, rtol=1e-9, atol=1e-9,
+                                       err_msg=name)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import hvi  # noqa: E402
+
+
+def test_import_budget(monkeypatch):
+    """CLI start-up, and real render commands up to their first figure, stay in budget.
+
+    The render budget is under a second and a render must not load pandas,
+    geopandas or pyproj before it draws.
+    """
+    if not os.path.exists(os.path.join(REPO_DIR, 'HVI_with_CVI.geojson')):
+        pytest.skip("ward data not present")
+    assert hvi.IMPORT_BUDGET < 1.0
+    # The check runs fresh interpreters that import the repo's modules and
+    # load the wards relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+    monkeypatch.setenv('PYTHONPATH', REPO_DIR)
+    assert hvi.check_import_budget() == []
@@ -0,0 +1,37 @@
+import base64
+import json
+
+import folium
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from interactive_layers import WardIndicatorLayer
+
+
+def test_tooltip_fields_keep_text_and_large_ids():
+    gdf = gpd.GeoDataFrame({'WardID_': [79800001, 79800002],
+                            'Municipali': ['City of Johannesburg', 'City of Tshwane'],
+                            'Pop2016': [2 ** 24 + 1, 2 ** 24 + 3],
+                            'HVI': [0.25, np.nan]},
+                           geometry=[shapely.box(x, 0, x + 0.1, 0.1) for x in (28.0, 28.1)],
+                           crs='EPSG:4326')
+    layer = WardIndicatorLayer(gdf, [('HVI', 'HVI', 'YlOrRd', 'HVI')],
+                               fields=['WardID_', 'Municipali', 'Pop2016', 'HVI'])
+
+    # Only the indicator is packed as float32
+    values = json.loads(layer.values_json)
+    assert list(values) == ['HVI']
+    decoded = np.frombuffer(base64.b64decode(values['HVI']), dtype='<f4')
+    assert decoded[0] == np.float32(0.25) and np.isnan(decoded[1])
+
+    # Text and integers past float32 precision arrive unchanged
+    assert json.loads(layer.fields_json) == {
+        'Municipali': ['City of Johannesburg', 'City of Tshwane'],
+        'Pop2016': [2 ** 24 + 1, 2 ** 24 + 3],
+    }
+
+    m = folium.Map()
+    layer.add_to(m)
+    html = m.get_root().render()
+    assert f'{layer.get_name()}_fields = {layer.fields_json}' in html
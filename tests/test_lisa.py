@@ -0,0 +1,51 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+import lisa
+from conftest import REPO_DIR
+from spatial_weights import spatial_weights
+
+
+def grid_weights(size):
+    cells = gpd.GeoDataFrame(geometry=[shapely.box(x, y, x + 1, y + 1)
+                                       for y in range(size) for x in range(size)],
+                             crs='EPSG:32735')
+    return spatial_weights(cells, 'queen', cache=False)
+
+
+def test_permutations_do_not_depend_on_process_count():
+    # 576 wards span three SEED_BLOCKs, so the pool really splits the work
+    weights = grid_weights(24)
+    rng = np.random.default_rng(7)
+    values = rng.normal(size=weights.shape[0]) + np.repeat(np.linspace(0, 2, 24), 24)
+    assert weights.shape[0] > 2 * lisa.SEED_BLOCK
+
+    serial = lisa.local_moran(values, weights, permutations=199, seed=3, processes=1)
+    pooled = lisa.local_moran(values, weights, permutations=199, seed=3, processes=3)
+    for name in lisa.LocalMoranResult._fields:
+        np.testing.assert_array_equal(getattr(serial, name), getattr(pooled, name))
+    assert np.isfinite(serial.p_sim).all()
+
+    global_serial = lisa.moran(values, weights, permutations=599, seed=3, processes=1)
+    global_pooled = lisa.moran(values, weights, permutations=599, seed=3, processes=3)
+    assert global_serial == global_pooled
+
+    # A different seed draws different permutations
+    other = lisa.local_moran(values, weights, permutations=199, seed=4, processes=1)
+    assert not np.array_equal(serial.p_sim, other.p_sim)
+
+
+def test_reproduces_stored_clusters(tmp_path, monkeypatch):
+    path = os.path.join(REPO_DIR, 'HVI_with_CVI.geojson')
+    if not os.path.exists(path):
+        pytest.skip("ward data not present")
+    wards = gpd.read_file(path)
+    # Weights are cached under the working directory
+    monkeypatch.chdir(tmp_path)
+    result = lisa.lisa_columns(wards, permutations=0)
+    np.testing.assert_array_equal(result['LISA_Cluster'].to_numpy(dtype=float),
+                                  wards['LISA_Cluster'].to_numpy(dtype=float))
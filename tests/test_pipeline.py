@@ -0,0 +1,45 @@
+import pipeline
+from pipeline import Step
+
+
+def shout(source, output):
+    with open(source) as f:
+        text = f.read().upper()
+    with open(output, 'w') as f:
+        f.write(text)
+
+
+def fail(source, output):
+    raise RuntimeError("broken step")
+
+
+def steps(first='test_pipeline:shout'):
+    # b reads a's output, so it depends on a
+    return [Step('a', first, ('src.txt',), ('a.txt',), {'source': 'src.txt', 'output': 'a.txt'}),
+            Step('b', 'test_pipeline:shout', ('a.txt',), ('b.txt',),
+                 {'source': 'a.txt', 'output': 'b.txt'})]
+
+
+def test_incremental_rebuild(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    state = str(tmp_path / 'state.json')
+    (tmp_path / 'src.txt').write_text('heat')
+
+    assert pipeline.build(steps(), jobs=1, state_path=state) == {'a': 'built', 'b': 'built'}
+    assert (tmp_path / 'b.txt').read_text() == 'HEAT'
+    assert pipeline.plan(steps(), state_path=state) == []
+    assert pipeline.build(steps(), jobs=1, state_path=state) == {'a': 'fresh', 'b': 'fresh'}
+
+    # A changed input reruns a; its output comes out the same, so b is kept
+    (tmp_path / 'src.txt').write_text('HEAT')
+    assert pipeline.plan(steps(), state_path=state) == ['a', 'b']
+    assert pipeline.build(steps(), jobs=1, state_path=state) == {'a': 'built', 'b': 'fresh'}
+
+    # A missing output is rebuilt without touching its upstream
+    (tmp_path / 'b.txt').unlink()
+    assert pipeline.build(steps(), jobs=1, state_path=state) == {'a': 'fresh', 'b': 'built'}
+
+    # A failing step is not recorded and skips everything downstream
+    status = pipeline.build(steps('test_pipeline:fail'), jobs=1, state_path=state)
+    assert status == {'a': 'failed', 'b': 'skipped'}
+    assert 'a' not in pipeline.load_state(state)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from rank_stability import PERCENTILES, RankHistogram, ranks_of
+
+
+def random_rankings(rng, draws, n_wards):
+    # Skewed scores so the ward rank distributions differ from one another
+    scores = rng.normal(size=(draws, n_wards)) + np.linspace(0, 3, n_wards)
+    return ranks_of(scores)
+
+
+@pytest.mark.parametrize('max_bins', [1000, 7])
+def test_histogram_matches_numpy_percentiles(max_bins):
+    rng = np.random.default_rng(5)
+    n_wards = 30
+    ranks = random_rankings(rng, 997, n_wards)
+    histogram = RankHistogram(n_wards, max_bins=max_bins)
+    for batch in np.array_split(ranks, 4):
+        histogram.add(batch)
+
+    np.testing.assert_allclose(histogram.mean(), ranks.mean(axis=0))
+    for q in PERCENTILES:
+        exact = np.percentile(ranks, q, axis=0, method='inverted_cdf').astype(int)
+        # Binned ranks report the lower edge of the bin holding the exact rank
+        expected = (exact - 1) // histogram.width * histogram.width + 1
+        np.testing.assert_array_equal(histogram.percentile(q), expected)
+
+    if histogram.width == 1:
+        for rank in (1, 10, n_wards):
+            np.testing.assert_allclose(histogram.frequency_at_or_above(rank),
+                                       (ranks <= rank).mean(axis=0))
+
+
+def test_ranks_of_orders_highest_first():
+    scores = np.array([[0.2, 0.9, -1.0, 0.5]])
+    np.testing.assert_array_equal(ranks_of(scores), [[3, 1, 4, 2]])
@@ -0,0 +1,27 @@
+import pytest
+
+from render_queue import render_maps
+
+
+def fake_renderer(gdf, column, title, cmap, label, output_path):
+    # Stands in for create_map, which prints its errors instead of raising
+    if column == 'raises':
+        raise ValueError("bad column")
+    if column == 'swallows':
+        print(f"Error creating map for {column}")
+        return
+    with open(output_path, 'w') as f:
+        f.write(column)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_failed_jobs_are_not_reported_done(tmp_path, processes):
+    stale = tmp_path / 'swallows.png'
+    stale.write_text('from an earlier run')
+    jobs = [(column, column, 'viridis', column, str(tmp_path / f'{column}.png'))
+            for column in ('ok', 'raises', 'swallows', 'again')]
+
+    done = render_maps(jobs, None, fake_renderer, processes=processes)
+
+    assert done == [str(tmp_path / 'ok.png'), str(tmp_path / 'again.png')]
+    assert stale.read_text() == 'from an earlier run'
@@ -0,0 +1,52 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from conftest import REPO_DIR
+from spatial_weights import spatial_weights
+
+
+def brute_force(geometries, rook=False):
+    """Dense binary contiguity from every pair of wards"""
+    geometries = np.asarray(geometries, dtype=object)
+    n = len(geometries)
+    left, right = np.triu_indices(n, k=1)
+    if rook:
+        touching = shapely.relate_pattern(geometries[left], geometries[right], '****1****')
+    else:
+        touching = shapely.intersects(geometries[left], geometries[right])
+    dense = np.zeros((n, n))
+    dense[left[touching], right[touching]] = 1.0
+    return dense + dense.T
+
+
+def test_grid_queen_and_rook():
+    # 3 x 3 unit squares: the centre touches all 8 (queen) but shares an edge with 4
+    cells = gpd.GeoDataFrame(geometry=[shapely.box(x, y, x + 1, y + 1)
+                                       for y in range(3) for x in range(3)], crs='EPSG:32735')
+    queen = spatial_weights(cells, 'queen', style='B', cache=False).toarray()
+    rook = spatial_weights(cells, 'rook', style='B', cache=False).toarray()
+    np.testing.assert_array_equal(queen, brute_force(cells.geometry))
+    np.testing.assert_array_equal(rook, brute_force(cells.geometry, rook=True))
+    assert queen[4].sum() == 8 and rook[4].sum() == 4
+
+
+@pytest.mark.parametrize('kind', ['queen', 'rook'])
+def test_ward_contiguity_matches_brute_force(kind):
+    path = os.path.join(REPO_DIR, 'HVI_with_CVI.geojson')
+    if not os.path.exists(path):
+        pytest.skip("ward data not present")
+    wards = gpd.read_file(path)
+    expected = brute_force(wards.geometry, rook=kind == 'rook')
+
+    binary = spatial_weights(wards, kind, style='B', cache=False)
+    np.testing.assert_array_equal(binary.toarray(), expected)
+
+    # Row-standardized: each ward's neighbours share its weight equally
+    standardized = spatial_weights(wards, kind, style='W', cache=False).toarray()
+    counts = expected.sum(axis=1, keepdims=True)
+    np.testing.assert_allclose(standardized, np.divide(expected, counts, out=np.zeros_like(expected),
+                                                       where=counts > 0))
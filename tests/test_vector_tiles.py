@@ -0,0 +1,31 @@
+import os
+
+import geopandas as gpd
+import pytest
+import shapely
+
+pytest.importorskip('mapbox_vector_tile')
+
+from vector_tiles import export_vector_tiles, load_manifest  # noqa: E402
+
+
+def tile_files(tile_dir):
+    return {os.path.relpath(os.path.join(root, name), tile_dir)[:-len('.pbf')]
+            for root, _, names in os.walk(tile_dir) for name in names if name.endswith('.pbf')}
+
+
+def test_changed_options_remove_old_tiles(tmp_path):
+    wards = gpd.GeoDataFrame({'WardID_': [1, 2], 'HVI': [0.1, 0.9]},
+                             geometry=[shapely.box(28.0, -26.2, 28.05, -26.15),
+                                       shapely.box(28.05, -26.2, 28.1, -26.15)],
+                             crs='EPSG:4326')
+    tile_dir = str(tmp_path / 'tiles')
+
+    export_vector_tiles(wards, tile_dir, properties=['HVI'], min_zoom=8, max_zoom=12)
+    assert any(key.startswith('12/') for key in tile_files(tile_dir))
+
+    # A narrower zoom range must not leave the zoom 11-12 tiles behind
+    export_vector_tiles(wards, tile_dir, properties=['HVI'], min_zoom=8, max_zoom=10)
+    manifest = load_manifest(tile_dir)
+    assert tile_files(tile_dir) == set(manifest['tiles'])
+    assert not os.path.exists(os.path.join(tile_dir, '12'))
@@ -0,0 +1,35 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import geopandas as gpd  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import shapely  # noqa: E402
+
+from ward_layer import plot_column, ward_layer  # noqa: E402
+
+
+def test_draws_on_other_axes_stay_independent():
+    gdf = gpd.GeoDataFrame({'a': [1.0, 2.0, 3.0], 'b': [np.nan, 5.0, 6.0]},
+                           geometry=[shapely.box(x, 0, x + 1, 1) for x in range(3)],
+                           crs='EPSG:3857')
+    fig, (left, right) = plt.subplots(1, 2)
+    first = plot_column(gdf, 'a', left, cmap='viridis')
+    second = plot_column(gdf, 'b', right, cmap='magma')
+
+    # Both draws share the memoised layer but not its collection
+    assert first is not second
+    assert first.layer is second.layer is ward_layer(gdf)
+    assert len(first.get_paths()) == 3 and len(second.get_paths()) == 2
+    np.testing.assert_array_equal(first.get_array(), [1.0, 2.0, 3.0])
+    assert first.get_cmap().name == 'viridis'
+    assert left.dataLim.intervalx.tolist() == [0.0, 3.0]
+    assert right.dataLim.intervalx.tolist() == [1.0, 3.0]
+
+    # Recolouring one axes leaves the other alone
+    second.set_values([7.0, 8.0, np.nan])
+    assert len(first.get_paths()) == 3
+    np.testing.assert_array_equal(first.get_array(), [1.0, 2.0, 3.0])
+    assert len(ward_layer(gdf).paths) == 3
+    plt.close(fig)
@@ -0,0 +1,76 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+import rasterio.mask
+import shapely
+from rasterio.transform import from_origin
+
+from zonal_stats import zonal_statistics
+
+TRANSFORM = from_origin(28.0, -26.0, 0.01, 0.01)
+
+
+@pytest.fixture
+def raster_path(tmp_path):
+    path = tmp_path / 'values.tif'
+    data = np.arange(100, dtype='float32').reshape(10, 10)
+    with rasterio.open(path, 'w', driver='GTiff', height=10, width=10, count=1,
+                       dtype='float32', crs='EPSG:4326', transform=TRANSFORM) as dst:
+        dst.write(data, 1)
+    return path
+
+
+@pytest.mark.parametrize('offset', [(-1, 0), (1, 0), (0, -1), (0, 1)])
+def test_wards_off_the_raster_get_nan(raster_path, offset):
+    # Every ward lies beside the raster, so the window read is empty
+    dx, dy = offset
+    wards = gpd.GeoDataFrame({'WardID_': [1, 2]},
+                             geometry=[shapely.box(28.02 + dx, -26.05 + dy, 28.04 + dx, -26.03 + dy),
+                                       shapely.box(28.05 + dx, -26.05 + dy, 28.07 + dx, -26.03 + dy)],
+                             crs='EPSG:4326')
+    table = zonal_statistics(wards, raster_path, percentiles=(50,))
+    assert table['count'].tolist() == [0, 0]
+    assert table.drop(columns='count').isna().all().all()
+
+
+def test_ward_off_the_raster_next_to_one_on_it(raster_path):
+    wards = gpd.GeoDataFrame({'WardID_': [1, 2]},
+                             geometry=[shapely.box(28.02, -26.05, 28.04, -26.03),
+                                       shapely.box(29.0, -26.05, 29.1, -26.03)],
+                             crs='EPSG:4326')
+    table = zonal_statistics(wards, raster_path)
+    assert table.loc[1, 'count'] == 4 and table.loc[1, 'mean'] == 37.5
+    assert table.loc[2, 'count'] == 0 and np.isnan(table.loc[2, 'mean'])
+
+
+def test_matches_rasterio_mask(tmp_path):
+    rng = np.random.default_rng(1)
+    data = rng.normal(20, 5, size=(60, 80)).astype('float32')
+    data[rng.random(data.shape) < 0.1] = -9999
+    path = tmp_path / 'lst.tif'
+    transform = from_origin(27.9, -26.0, 0.005, 0.005)
+    with rasterio.open(path, 'w', driver='GTiff', height=60, width=80, count=1, dtype='float32',
+                       crs='EPSG:4326', transform=transform, nodata=-9999) as dst:
+        dst.write(data, 1)
+
+    # Disjoint wards of several shapes: a triangle, a ward with a hole, a
+    # multipart ward and one that hangs off the raster's edge
+    wards = gpd.GeoDataFrame({'WardID_': [11, 12, 13, 14]}, geometry=[
+        shapely.Polygon([(27.91, -26.01), (28.02, -26.03), (27.95, -26.12)]),
+        shapely.box(28.05, -26.15, 28.15, -26.05).difference(shapely.box(28.08, -26.12, 28.12, -26.08)),
+        shapely.MultiPolygon([shapely.box(28.17, -26.05, 28.2, -26.02),
+                              shapely.box(28.22, -26.2, 28.26, -26.1)]),
+        shapely.box(28.25, -26.33, 28.4, -26.25),
+    ], crs='EPSG:4326')
+    table = zonal_statistics(wards, path, percentiles=(50,))
+
+    with rasterio.open(path) as src:
+        for ward_id, geometry in zip(wards['WardID_'], wards.geometry):
+            masked, _ = rasterio.mask.mask(src, [geometry], crop=True, filled=False)
+            values = masked.compressed().astype(float)
+            row = table.loc[ward_id]
+            assert row['count'] == len(values) > 0
+            np.testing.assert_allclose([row['sum'], row['mean'], row['min'], row['max'], row['p50']],
+                                       [values.sum(), values.mean(), values.min(), values.max(),
+                                        np.percentile(values, 50)], rtol=1e-9)
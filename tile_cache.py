@@ -0,0 +1,255 @@
+import math
+import os
+import urllib.request
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+
+# Half the width of the Web Mercator world, in metres
+ORIGIN_SHIFT = 20037508.342789244
+
+POSITRON = {
+    'name': 'CartoDB.Positron',
+    'url': 'https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png',
+    'subdomains': 'abcd',
+    'max_zoom': 20,
+    'attribution': '(C) OpenStreetMap contributors (C) CARTO',
+}
+
+DEFAULT_STORE_DIR = os.path.join('.hvi_cache', 'tiles')
+DEFAULT_STORE_BYTES = 512 * 1024 * 1024
+MOSAIC_MEMO_SIZE = 32
+
+settings = {
+    # Render only from the store / tile_dir, never touching the network
+    'offline': os.environ.get('HVI_OFFLINE_TILES', '') not in ('', '0'),
+    # Optional read-only directory laid out as {z}/{x}/{y}.png
+    'tile_dir': os.environ.get('HVI_TILE_DIR'),
+    'store_dir': DEFAULT_STORE_DIR,
+    'max_bytes': DEFAULT_STORE_BYTES,
+}
+
+_mosaics = OrderedDict()
+
+
+def configure(**options):
+    """Change tile settings (offline, tile_dir, store_dir, max_bytes) for this process"""
+    unknown = set(options) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown tile settings: {', '.join(sorted(unknown))}")
+    settings.update(options)
+
+
+def basemap_state(source=None):
+    """What besides the extent decides the pixels a basemap draws: provider and tile settings"""
+    provider = provider_info(source)
+    return (provider['name'], provider.get('url'), settings['offline'], settings['tile_dir'])
+
+
+def evict_lru(directory, max_bytes, suffix='.png'):
+    """Drop least recently used ``suffix`` files under ``directory`` until it fits in ``max_bytes``"""
+    entries = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            # Files still being written by this or another process are left alone
+            if name.endswith(suffix) and '.tmp' not in name:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def provider_info(source):
+    """Normalise a provider (dict, URL template or xyzservices provider) to a dict"""
+    if source is None:
+        return POSITRON
+    if isinstance(source, str):
+        return {'name': source, 'url': source, 'subdomains': 'abc', 'max_zoom': 22,
+                'attribution': None}
+    if hasattr(source, 'build_url'):
+        return {'name': source.get('name', 'provider'), 'build_url': source.build_url,
+                'max_zoom': source.get('max_zoom', 22), 'attribution': source.get('attribution')}
+    return source
+
+
+def tile_url(provider, x, y, z):
+    if 'build_url' in provider:
+        return provider['build_url'](x=x, y=y, z=z)
+    subdomains = provider.get('subdomains') or 'a'
+    return provider['url'].format(s=subdomains[(x + y) % len(subdomains)], x=x, y=y, z=z, r='')
+
+
+def mercator_to_lonlat(x, y):
+    lon = x / ORIGIN_SHIFT * 180.0
+    lat = math.degrees(2 * math.atan(math.exp(y / ORIGIN_SHIFT * math.pi)) - math.pi / 2)
+    return lon, lat
+
+
+def auto_zoom(west, south, east, north, max_zoom):
+    """Zoom level contextily would pick for a lon/lat bounding box.
+
+    As contextily's ``_calculate_zoom``, the longer side decides: the
+    smaller of the per-axis zooms.
+    """
+    zoom_lon = math.ceil(math.log2(360 * 2.0 / max(east - west, 1e-9)))
+    zoom_lat = math.ceil(math.log2(360 * 2.0 / max(north - south, 1e-9)))
+    return int(min(zoom_lon, zoom_lat, max_zoom))
+
+
+def tile_range(left, bottom, right, top, zoom):
+    """Inclusive x/y tile index ranges covering a Web Mercator extent"""
+    n = 2 ** zoom
+    span = 2 * ORIGIN_SHIFT / n
+
+    def clamp(value):
+        return min(max(value, 0), n - 1)
+
+    x0 = clamp(int(math.floor((left + ORIGIN_SHIFT) / span)))
+    x1 = clamp(int(math.floor((right + ORIGIN_SHIFT) / span)))
+    y0 = clamp(int(math.floor((ORIGIN_SHIFT - top) / span)))
+    y1 = clamp(int(math.floor((ORIGIN_SHIFT - bottom) / span)))
+    return x0, x1, y0, y1
+
+
+class TileStore:
+    """Persistent {provider}/{z}/{x}/{y}.png tile store with size-based eviction"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, max_bytes=DEFAULT_STORE_BYTES):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+
+    def path(self, provider, x, y, z):
+        name = provider['name'].replace('/', '_')
+        return os.path.join(self.store_dir, name, str(z), str(x), f"{y}.png")
+
+    def get(self, provider, x, y, z):
+        path = self.path(provider, x, y, z)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, provider, x, y, z, data):
+        path = self.path(provider, x, y, z)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Drop least recently used tiles until the store fits in ``max_bytes``"""
+        evict_lru(self.store_dir, self.max_bytes)
+
+
+def fetch_tile(provider, x, y, z, store):
+    """Tile bytes from the local tile directory, the store, or (online) the server"""
+    if settings['tile_dir']:
+        local_path = os.path.join(settings['tile_dir'], str(z), str(x), f"{y}.png")
+        if os.path.exists(local_path):
+            with open(local_path, 'rb') as f:
+                return f.read()
+
+    data = store.get(provider, x, y, z)
+    if data is not None or settings['offline']:
+        return data
+
+    request = urllib.request.Request(tile_url(provider, x, y, z),
+                                     headers={'User-Agent': 'hvi-johannesburg/1.0'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        data = response.read()
+    store.put(provider, x, y, z, data)
+    return data
+
+
+def decode_tile(data):
+    from PIL import Image
+    return np.asarray(Image.open(BytesIO(data)).convert('RGBA'))
+
+
+def tile_mosaic(provider, x0, x1, y0, y1, zoom):
+    """Stitch the decoded tiles of a range into one RGBA image, memoised in-process.
+
+    Returns the mosaic and the number of tiles left blank because they were
+    not available offline.
+    """
+    key = (provider['name'], provider.get('url'), zoom, x0, x1, y0, y1,
+           settings['offline'], settings['tile_dir'])
+    if key in _mosaics:
+        _mosaics.move_to_end(key)
+        return _mosaics[key]
+
+    store = TileStore(settings['store_dir'], settings['max_bytes'])
+    tiles = {}
+    missing = 0
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            data = fetch_tile(provider, x, y, zoom, store)
+            if data is None:
+                missing += 1
+            else:
+                tiles[(x, y)] = decode_tile(data)
+    if missing:
+        print(f"Basemap: {missing} tile(s) at zoom {zoom} not in the offline store; left blank")
+    store.evict()
+
+    size = next(iter(tiles.values())).shape[0] if tiles else 256
+    mosaic = np.zeros(((y1 - y0 + 1) * size, (x1 - x0 + 1) * size, 4), dtype=np.uint8)
+    for (x, y), tile in tiles.items():
+        mosaic[(y - y0) * size:(y - y0 + 1) * size, (x - x0) * size:(x - x0 + 1) * size] = tile
+
+    _mosaics[key] = (mosaic, missing)
+    while len(_mosaics) > MOSAIC_MEMO_SIZE:
+        _mosaics.popitem(last=False)
+    return mosaic, missing
+
+
+def add_basemap(ax, source=None, zoom='auto', alpha=None, interpolation='bilinear',
+                attribution=None, attribution_size=8):
+    """Draw a cached web-tile basemap under a Web Mercator (EPSG:3857) axes.
+
+    A drop-in for ``contextily.add_basemap`` for the maps in this repo:
+    tiles come from the local store first, identical extents reuse the
+    already decoded mosaic, and with ``configure(offline=True)`` (or
+    ``HVI_OFFLINE_TILES=1``) nothing is fetched from the network.
+    Returns the number of tiles left blank because they were unavailable
+    offline.
+    """
+    provider = provider_info(source)
+    xmin, xmax, ymin, ymax = ax.axis()
+
+    if zoom == 'auto':
+        west, south = mercator_to_lonlat(xmin, ymin)
+        east, north = mercator_to_lonlat(xmax, ymax)
+        zoom = auto_zoom(west, south, east, north, provider.get('max_zoom', 22))
+
+    x0, x1, y0, y1 = tile_range(xmin, ymin, xmax, ymax, zoom)
+    mosaic, missing = tile_mosaic(provider, x0, x1, y0, y1, zoom)
+
+    span = 2 * ORIGIN_SHIFT / 2 ** zoom
+    extent = (x0 * span - ORIGIN_SHIFT, (x1 + 1) * span - ORIGIN_SHIFT,
+              ORIGIN_SHIFT - (y1 + 1) * span, ORIGIN_SHIFT - y0 * span)
+    ax.imshow(mosaic, extent=extent, interpolation=interpolation, alpha=alpha, zorder=0)
+    ax.axis((xmin, xmax, ymin, ymax))
+
+    attribution = provider.get('attribution') if attribution is None else attribution
+    if attribution:
+        ax.text(0.005, 0.005, attribution, transform=ax.transAxes,
+                size=attribution_size, ha='left', va='bottom', wrap=True,
+                bbox={'facecolor': 'white', 'edgecolor': 'none', 'alpha': 0.6, 'pad': 1})
+    return missing
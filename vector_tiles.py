@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+
+import shapely
+
+from tile_cache import ORIGIN_SHIFT, tile_range
+from ward_topology import clean_property
+
+try:
+    import mapbox_vector_tile
+except ImportError:
+    mapbox_vector_tile = None
+
+# Served as-is by any static file server, e.g. `python -m http.server`
+TILE_DIR = 'vector_tiles'
+MANIFEST = 'manifest.json'
+LAYER_NAME = 'wards'
+MIN_ZOOM = 8
+MAX_ZOOM = 14
+# Tile coordinate grid and the margin kept around each tile to hide seams
+EXTENT = 4096
+BUFFER = 64
+# Geometry is simplified to this fraction of a 256 px screen pixel per zoom
+SIMPLIFY_PIXELS = 0.5
+
+
+def tile_bounds(x, y, z):
+    """Web Mercator bounds (minx, miny, maxx, maxy) of an XYZ tile"""
+    span = 2 * ORIGIN_SHIFT / 2 ** z
+    return (x * span - ORIGIN_SHIFT, ORIGIN_SHIFT - (y + 1) * span,
+            (x + 1) * span - ORIGIN_SHIFT, ORIGIN_SHIFT - y * span)
+
+
+def zoom_tolerance(z):
+    return 2 * ORIGIN_SHIFT / 2 ** z / 256 * SIMPLIFY_PIXELS
+
+
+def covering_tiles(bounds, z):
+    """Keys "z/x/y" of the tiles a Web Mercator bounding box touches"""
+    minx, miny, maxx, maxy = bounds
+    x0, x1, y0, y1 = tile_range(minx, miny, maxx, maxy, z)
+    return [f"{z}/{x}/{y}" for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def feature_records(gdf, id_column, properties):
+    """Feature ids, pruned attribute dicts and content hashes, in row order"""
+    ids = gdf[id_column].astype(str).tolist()
+    columns = [c for c in properties if c != id_column]
+    records = gdf[columns].to_dict(orient='records') if columns else [{}] * len(gdf)
+    wkb = shapely.to_wkb(gdf.geometry.values)
+
+    pruned, hashes = [], []
+    for feature_id, record, geometry in zip(ids, records, wkb):
+        # Missing values are left out rather than sent as nulls
+        props = {id_column: feature_id}
+        props.update((key, value) for key, value in
+                     ((key, clean_property(value)) for key, value in record.items())
+                     if value is not None)
+        pruned.append(props)
+        digest = hashlib.sha256(geometry)
+        digest.update(json.dumps(props, sort_keys=True).encode('utf-8'))
+        hashes.append(digest.hexdigest()[:16])
+    return ids, pruned, hashes
+
+
+def load_manifest(tile_dir):
+    try:
+        with open(os.path.join(tile_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def tile_path(tile_dir, key):
+    return os.path.join(tile_dir, *key.split('/')) + '.pbf'
+
+
+def remove_tile(tile_dir, key):
+    """Delete one tile file and any {z}/{x} directories it leaves empty"""
+    path = tile_path(tile_dir, key)
+    if os.path.exists(path):
+        os.remove(path)
+    for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+
+
+def encode_tile(key, tree, geometries, ids, properties, layer_name):
+    """Clip, quantize and encode the features that touch one tile.
+
+    Returns the tile bytes and the ids of the features in it, or
+    ``(None, [])`` when nothing reaches the tile.
+    """
+    z, x, y = (int(part) for part in key.split('/'))
+    minx, miny, maxx, maxy = tile_bounds(x, y, z)
+    margin = (maxx - minx) * BUFFER / EXTENT
+    clip_box = (minx - margin, miny - margin, maxx + margin, maxy + margin)
+
+    features, members = [], []
+    for i in sorted(tree.query(shapely.box(*clip_box))):
+        clipped = shapely.clip_by_rect(geometries[i], *clip_box)
+        if clipped.is_empty:
+            continue
+        feature = {'geometry': clipped, 'properties': properties[i]}
+        if ids[i].isdigit():
+            feature['id'] = int(ids[i])
+        features.append(feature)
+        members.append(ids[i])
+    if not features:
+        return None, []
+
+    data = mapbox_vector_tile.encode(
+        [{'name': layer_name, 'features': features}],
+        default_options={'quantize_bounds': (minx, miny, maxx, maxy), 'extents': EXTENT}
+    )
+    return data, members
+
+
+def export_vector_tiles(gdf, tile_dir=TILE_DIR, id_column='WardID_', properties=(),
+                        min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, layer_name=LAYER_NAME):
+    """Write a Mapbox Vector Tile pyramid as {tile_dir}/{z}/{x}/{y}.pbf.
+
+    Geometry is simplified per zoom to about half a screen pixel and only
+    ``id_column`` plus ``properties`` are written, with floats rounded.
+    A manifest records a content hash per feature and the features in each
+    tile, so a re-export rewrites only the tiles touched by added, changed
+    or removed features (and deletes tiles left empty). Changing the zoom
+    range, layer or attribute list deletes the tiles of the old export and
+    rebuilds everything. Returns the number of tiles written.
+    """
+    if mapbox_vector_tile is None:
+        raise ImportError("Vector tile export needs the mapbox-vector-tile package "
+                          "(pip install mapbox-vector-tile)")
+    if gdf.crs is None or gdf.crs.to_epsg() != 3857:
+        gdf = gdf.to_crs(epsg=3857)
+
+    properties = [id_column] + [c for c in properties if c != id_column]
+    options = {'zooms': [min_zoom, max_zoom], 'layer': layer_name, 'properties': properties,
+               'extent': EXTENT, 'buffer': BUFFER, 'simplify_pixels': SIMPLIFY_PIXELS}
+    ids, props, hashes = feature_records(gdf, id_column, properties)
+    current = dict(zip(ids, hashes))
+
+    manifest = load_manifest(tile_dir)
+    if manifest is None or manifest.get('options') != options:
+        # Tiles of the old export that the new one does not cover would
+        # otherwise be served alongside it
+        for key in (manifest or {}).get('tiles', {}):
+            remove_tile(tile_dir, key)
+        manifest = {'options': options, 'features': {}, 'tiles': {}}
+    previous = manifest['features']
+    changed = {fid for fid in set(current) | set(previous) if current.get(fid) != previous.get(fid)}
+
+    # Tiles that held a changed feature before, plus those covering it now
+    dirty = {key for key, members in manifest['tiles'].items() if changed.intersection(members)}
+    geometry_bounds = shapely.bounds(gdf.geometry.values)
+    for z in range(min_zoom, max_zoom + 1):
+        for fid, bounds in zip(ids, geometry_bounds):
+            if fid in changed:
+                dirty.update(covering_tiles(bounds, z))
+
+    trees = {}
+    written = 0
+    for key in sorted(dirty, key=lambda k: tuple(int(p) for p in k.split('/'))):
+        z = int(key.split('/')[0])
+        if z not in trees:
+            simplified = shapely.simplify(gdf.geometry.values, zoom_tolerance(z),
+                                          preserve_topology=True)
+            trees[z] = (shapely.STRtree(simplified), simplified)
+        tree, simplified = trees[z]
+
+        data, members = encode_tile(key, tree, simplified, ids, props, layer_name)
+        if data is None:
+            manifest['tiles'].pop(key, None)
+            remove_tile(tile_dir, key)
+            continue
+        write_file(tile_path(tile_dir, key), data)
+        manifest['tiles'][key] = members
+        written += 1
+
+    manifest['features'] = current
+    west, south, east, north = gdf.to_crs(epsg=4326).total_bounds
+    manifest['bounds'] = [west, south, east, north]
+    write_file(os.path.join(tile_dir, MANIFEST),
+               json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+    print(f"Vector tiles: {len(changed)} changed feature(s), {written} tile(s) written, "
+          f"{len(manifest['tiles'])} in {tile_dir}")
+    return written
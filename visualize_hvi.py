@@ -1,19 +1,17 @@
-import geopandas as gpd
-import folium
-import matplotlib.pyplot as plt
-import seaborn as sns
+import matplotlib
 import numpy as np
-import contextily as ctx
-from matplotlib.patches import Patch
 from matplotlib.colors import LinearSegmentedColormap
 
-# Set basic style
-plt.rcParams['figure.facecolor'] = 'white'
-plt.rcParams['axes.facecolor'] = 'white'
-sns.set_style("white")
+from ward_data import load_ward_arrays, load_wards
+from ward_layer import plot_column
+
+# pyplot, the tile cache and the panel cache are imported by the functions
+# that draw them, and the map functions load wards as plain arrays, so
+# nothing imports pandas or geopandas before a static map is drawn
 
-# Read the GeoJSON file
-gdf = gpd.read_file('HVI_with_CVI.geojson')
+# Set basic style
+matplotlib.rcParams['figure.facecolor'] = 'white'
+matplotlib.rcParams['axes.facecolor'] = 'white'
 
 # Custom color maps
 hvi_colors = ['#440154', '#414487', '#2a788e', '#22a884', '#7ad151', '#fde725']
@@ -29,82 +27,105 @@ cvi_cmap = LinearSegmentedColormap.from_list('custom_cvi', cvi_colors)
 
 def add_basemap(ax):
     """Add a light basemap to provide geographic context"""
+    import tile_cache
     ax.set_facecolor('#F0F0F0')  # Light gray background
-    ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, alpha=0.3)
+    tile_cache.add_basemap(ax, source=tile_cache.POSITRON, alpha=0.3)
 
-def create_static_maps():
-    # Set up the figure with multiple subplots
-    fig, axes = plt.subplots(2, 2, figsize=(20, 20))
-    fig.patch.set_facecolor('white')
-    
-    # Add title with styling
-    fig.suptitle('Heat Vulnerability Analysis - Johannesburg\nSpatial Distribution of Key Indicators', 
-                fontsize=20, fontweight='bold', y=0.95)
-
-    # HVI Map
-    gdf.plot(column='HVI_weighted_standardized', cmap=hvi_cmap, legend=True,
-             legend_kwds={'label': 'Heat Vulnerability Index',
-                         'orientation': 'horizontal',
-                         'shrink': 0.8,
-                         'aspect': 40,
-                         'pad': 0.01},
-             ax=axes[0, 0])
-    axes[0, 0].set_title('Heat Vulnerability Index', pad=20, fontsize=14, fontweight='bold')
-    add_basemap(axes[0, 0])
-    axes[0, 0].axis('off')
-
-    # LST Map
-    gdf.plot(column='LST', cmap=lst_cmap, legend=True,
-             legend_kwds={'label': 'Land Surface Temperature (°C)',
-                         'orientation': 'horizontal',
-                         'shrink': 0.8,
-                         'aspect': 40,
-                         'pad': 0.01},
-             ax=axes[0, 1])
-    axes[0, 1].set_title('Land Surface Temperature', pad=20, fontsize=14, fontweight='bold')
-    add_basemap(axes[0, 1])
-    axes[0, 1].axis('off')
-
-    # NDVI Map
-    gdf.plot(column='NDVI', cmap=ndvi_cmap, legend=True,
-             legend_kwds={'label': 'Vegetation Index',
-                         'orientation': 'horizontal',
-                         'shrink': 0.8,
-                         'aspect': 40,
-                         'pad': 0.01},
-             ax=axes[1, 0])
-    axes[1, 0].set_title('Normalized Difference Vegetation Index', pad=20, fontsize=14, fontweight='bold')
-    add_basemap(axes[1, 0])
-    axes[1, 0].axis('off')
-
-    # CVI Map
-    gdf.plot(column='CVI_standardized', cmap=cvi_cmap, legend=True,
-             legend_kwds={'label': 'Climate Vulnerability Index',
-                         'orientation': 'horizontal',
-                         'shrink': 0.8,
-                         'aspect': 40,
-                         'pad': 0.01},
-             ax=axes[1, 1])
-    axes[1, 1].set_title('Climate Vulnerability Index', pad=20, fontsize=14, fontweight='bold')
-    add_basemap(axes[1, 1])
-    axes[1, 1].axis('off')
+def create_static_maps(gdf=None):
+    from panel_cache import Panel, compose_panels
 
-    # Add explanatory text
-    fig.text(0.02, 0.02, 
-             'Data sources: Health Vulnerability Index (HVI) combines socio-economic and environmental factors\n' +
-             'LST derived from satellite data, NDVI indicates vegetation density, CVI represents climate vulnerability',
-             fontsize=10, ha='left')
+    if gdf is None:
+        # Web Mercator, to line up with the basemap tiles
+        gdf = load_ward_arrays(crs=3857)
 
-    # Adjust layout
-    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    
-    # Save with high quality
-    plt.savefig('johannesburg_vulnerability_maps.png', 
-                dpi=300, bbox_inches='tight', 
+    # Layers are rasterized once and reused from .hvi_cache/panels on later runs
+    compose_panels(gdf, [
+        Panel('HVI_weighted_standardized', hvi_cmap, 'Heat Vulnerability Index', 'Heat Vulnerability Index'),
+        Panel('LST', lst_cmap, 'Land Surface Temperature', 'Land Surface Temperature (°C)'),
+        Panel('NDVI', ndvi_cmap, 'Normalized Difference Vegetation Index', 'Vegetation Index'),
+        Panel('CVI_standardized', cvi_cmap, 'Climate Vulnerability Index', 'Climate Vulnerability Index'),
+    ], 'johannesburg_vulnerability_maps.png', nrows=2, ncols=2, figsize=(20, 20),
+        title_kwds={'pad': 20, 'fontsize': 14, 'fontweight': 'bold'},
+        legend_kwds={'orientation': 'horizontal', 'shrink': 0.8, 'aspect': 40, 'pad': 0.01},
+        facecolor='#F0F0F0', basemap_alpha=0.3,
+        suptitle='Heat Vulnerability Analysis - Johannesburg\nSpatial Distribution of Key Indicators',
+        suptitle_kwds={'fontsize': 20, 'fontweight': 'bold', 'y': 0.95},
+        footer='Data sources: Health Vulnerability Index (HVI) combines socio-economic and environmental factors\n' +
+               'LST derived from satellite data, NDVI indicates vegetation density, CVI represents climate vulnerability',
+        tight_layout_rect=[0, 0.03, 1, 0.95])
+
+def create_single_map(column, title, cmap, label, output_path, gdf=None):
+    """Render one indicator map straight from the cached ward data"""
+    if gdf is None:
+        gdf = load_ward_arrays(columns=[column], crs=3857)
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(15, 15))
+    fig.patch.set_facecolor('white')
+    plot_column(gdf, column, ax, cmap=cmap, legend=True,
+                legend_kwds={'label': label,
+                            'orientation': 'horizontal',
+                            'shrink': 0.8,
+                            'aspect': 40,
+                            'pad': 0.01})
+    ax.set_title(title, pad=20, fontsize=14, fontweight='bold')
+    add_basemap(ax)
+    ax.axis('off')
+
+    plt.savefig(output_path,
+                dpi=300, bbox_inches='tight',
                 facecolor='white', edgecolor='none')
     plt.close()
 
-def create_interactive_map():
+# Indicators offered first in the interactive map, as
+# (column, name, ColorBrewer scheme, legend caption)
+INTERACTIVE_INDICATORS = [
+    ('HVI_weighted_standardized', 'Heat Vulnerability Index', 'YlOrRd', 'Heat Vulnerability Index'),
+    ('LST', 'Land Surface Temperature', 'YlOrRd', 'Land Surface Temperature (°C)'),
+    ('NDVI', 'Vegetation Index', 'YlGn', 'Vegetation Index'),
+    ('CVI_standardized', 'Climate Vulnerability Index', 'YlOrRd', 'Climate Vulnerability Index'),
+]
+
+def interactive_indicators(gdf):
+    """The main indicators followed by every other numeric column of the HVI table"""
+    indicators = [ind for ind in INTERACTIVE_INDICATORS if ind[0] in gdf.columns]
+    listed = {ind[0] for ind in indicators}
+    for column in gdf.select_dtypes('float').columns:
+        if column not in listed:
+            indicators.append((column, column, 'YlOrRd', column))
+    return indicators
+
+# Shown in every ward tooltip, with their labels
+INTERACTIVE_FIELDS = ['WardID_', 
+                      'HVI_weighted_standardized', 
+                      'LST', 
+                      'NDVI', 
+                      'CVI_standardized']
+INTERACTIVE_ALIASES = ['Ward ID:', 
+                       'Heat Vulnerability Index:', 
+                       'Land Surface Temperature (°C):', 
+                       'Vegetation Index:', 
+                       'Climate Vulnerability:']
+
+def export_ward_tiles(tile_dir=None, gdf=None):
+    """Write (or incrementally update) the ward vector tiles the interactive map can read"""
+    from vector_tiles import TILE_DIR, export_vector_tiles
+
+    if gdf is None:
+        gdf = load_wards(crs=3857)
+    columns = [ind[0] for ind in interactive_indicators(gdf)] + INTERACTIVE_FIELDS
+    return export_vector_tiles(gdf, tile_dir or TILE_DIR, id_column='WardID_',
+                               properties=list(dict.fromkeys(columns)))
+
+def create_interactive_map(gdf=None, indicators=None, tiles_url=None):
+    import folium
+    from interactive_layers import WardIndicatorLayer, WardVectorTileLayer
+
+    if gdf is None:
+        gdf = load_wards()
+    if indicators is None:
+        indicators = interactive_indicators(gdf)
+
     # Convert to WGS84 for folium
     gdf_wgs84 = gdf.to_crs(epsg=4326)
 
@@ -113,64 +134,31 @@ def create_interactive_map():
                   zoom_start=10,
                   tiles='cartodbpositron')
 
-    # Create choropleth layer with improved styling
-    folium.Choropleth(
-        geo_data=gdf_wgs84,
+    layer_kwargs = dict(
         name='Heat Vulnerability Index',
-        data=gdf_wgs84,
-        columns=['WardID_', 'HVI_weighted_standardized'],
-        key_on='feature.properties.WardID_',
-        fill_color='YlOrRd',
+        fields=INTERACTIVE_FIELDS,
+        aliases=INTERACTIVE_ALIASES,
         fill_opacity=0.7,
         line_opacity=0.2,
-        legend_name='Heat Vulnerability Index',
-        smooth_factor=0.5,
-        highlight=True
-    ).add_to(m)
-
-    # Add hover functionality with improved styling
-    style_function = lambda x: {
-        'fillColor': '#ffffff',
-        'color': '#000000',
-        'fillOpacity': 0.1,
-        'weight': 0.5
-    }
-    
-    highlight_function = lambda x: {
-        'fillColor': '#000000',
-        'color': '#000000',
-        'fillOpacity': 0.5,
-        'weight': 1
-    }
-
-    # Add tooltips with improved formatting
-    tooltip = folium.features.GeoJsonTooltip(
-        fields=['WardID_', 
-                'HVI_weighted_standardized', 
-                'LST', 
-                'NDVI', 
-                'CVI_standardized'],
-        aliases=['Ward ID:', 
-                'Heat Vulnerability Index:', 
-                'Land Surface Temperature (°C):', 
-                'Vegetation Index:', 
-                'Climate Vulnerability:'],
-        style=('background-color: white; '
-               'color: #333333; '
-               'font-family: arial; '
-               'font-size: 12px; '
-               'padding: 10px; '
-               'border-radius: 3px; '
-               'box-shadow: 3px 3px 10px rgba(0,0,0,0.2);')
+        highlight={'fillColor': '#000000',
+                   'color': '#000000',
+                   'fillOpacity': 0.5,
+                   'weight': 1},
+        tooltip_style=('background-color: white; '
+                       'color: #333333; '
+                       'font-family: arial; '
+                       'font-size: 12px; '
+                       'padding: 10px; '
+                       'border-radius: 3px; '
+                       'box-shadow: 3px 3px 10px rgba(0,0,0,0.2);')
     )
-
-    # Add GeoJson layer with tooltips
-    folium.GeoJson(
-        gdf_wgs84,
-        style_function=style_function,
-        highlight_function=highlight_function,
-        tooltip=tooltip
-    ).add_to(m)
+    if tiles_url:
+        # Geometry comes from the exported vector tiles (see export_ward_tiles)
+        WardVectorTileLayer(tiles_url, gdf_wgs84, indicators, **layer_kwargs).add_to(m)
+    else:
+        # Ward geometry is embedded once; each indicator is a small typed array
+        # and switching between them only restyles the polygons in the browser
+        WardIndicatorLayer(gdf_wgs84, indicators, smooth_factor=0.5, **layer_kwargs).add_to(m)
 
     # Add title
     title_html = '''
@@ -199,7 +187,14 @@ def create_interactive_map():
     # Save the map
     m.save('johannesburg_interactive_map.html')
 
-def create_statistical_plots():
+def create_statistical_plots(gdf=None):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style("white")
+
+    if gdf is None:
+        gdf = load_wards()
+
     # Set up the figure with improved styling
     fig = plt.figure(figsize=(20, 15))
     fig.patch.set_facecolor('white')
@@ -280,6 +275,69 @@ def create_statistical_plots():
                 facecolor='white', edgecolor='none')
     plt.close()
 
+def create_pixel_density_plots(lst_path, ndvi_path, hvi_path=None, gdf=None, hexagonal=False,
+                               bins=None, output_path='johannesburg_pixel_density.png'):
+    """LST/NDVI diagnostics at pixel scale, aggregated before drawing.
+
+    Pixels are streamed strip by strip into fixed histogram and 2D (or
+    hexagonal) bins, so memory depends on the bin count, not the number of
+    pixels. The binned map is coloured by the mean HVI of the pixels in
+    each bin, read from ``hvi_path`` or, without it, taken from the ward
+    each pixel falls in.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    from density_plots import (BinnedDensity, BinnedHistogram, DEFAULT_BINS, HEX_GRIDSIZE,
+                               pixel_chunks, value_ranges)
+
+    if hvi_path is None and gdf is None:
+        gdf = load_wards(['HVI_weighted_standardized'])
+    chunk_kwargs = {'value_path': hvi_path, 'gdf': gdf,
+                    'value_column': 'HVI_weighted_standardized'}
+    if bins is None:
+        bins = HEX_GRIDSIZE if hexagonal else DEFAULT_BINS
+
+    # First pass fixes the bin edges, second pass fills them
+    lst_range, ndvi_range = value_ranges(lst_path, ndvi_path, **chunk_kwargs)
+    density = BinnedDensity(lst_range, ndvi_range, bins=bins, hexagonal=hexagonal)
+    lst_hist = BinnedHistogram(lst_range)
+    ndvi_hist = BinnedHistogram(ndvi_range)
+    for lst, ndvi, hvi in pixel_chunks(lst_path, ndvi_path, **chunk_kwargs):
+        density.add(lst, ndvi, hvi)
+        lst_hist.add(lst)
+        ndvi_hist.add(ndvi)
+
+    fig, axes = plt.subplots(2, 2, figsize=(20, 15), gridspec_kw={'hspace': 0.3, 'wspace': 0.3})
+    fig.suptitle(f'Pixel-level LST and NDVI ({density.counts.sum():,} pixels)',
+                 fontsize=20, fontweight='bold', y=0.95)
+
+    lst_hist.draw(axes[0, 0], color='#f03b20')
+    axes[0, 0].set_title('Distribution of Land Surface Temperature', fontsize=14, pad=20)
+    axes[0, 0].set_xlabel('Land Surface Temperature (°C)')
+    axes[0, 0].set_ylabel('Pixels')
+
+    ndvi_hist.draw(axes[0, 1], color='#41ab5d')
+    axes[0, 1].set_title('Distribution of Vegetation Index', fontsize=14, pad=20)
+    axes[0, 1].set_xlabel('Vegetation Index')
+    axes[0, 1].set_ylabel('Pixels')
+
+    counts = density.counts.astype(float)
+    collection = density.draw(axes[1, 0], counts, cmap='magma',
+                              norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+    fig.colorbar(collection, ax=axes[1, 0], label='Pixels per bin')
+    axes[1, 0].set_title('Pixel Density: LST vs NDVI', fontsize=14, pad=20)
+
+    collection = density.draw(axes[1, 1], density.mean(), cmap='viridis')
+    fig.colorbar(collection, ax=axes[1, 1], label='Mean Heat Vulnerability Index')
+    axes[1, 1].set_title('LST vs NDVI\nColored by mean HVI per bin', fontsize=14, pad=20)
+    for ax in axes[1]:
+        ax.set_xlabel('Land Surface Temperature (°C)')
+        ax.set_ylabel('Vegetation Index')
+
+    plt.savefig(output_path, dpi=300, bbox_inches='tight',
+                facecolor='white', edgecolor='none')
+    plt.close()
+
 if __name__ == "__main__":
     print("Creating enhanced static maps...")
     create_static_maps()
@@ -0,0 +1,173 @@
+import glob
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+import shapely
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+WARD_SOURCE = 'HVI_with_CVI.geojson'
+CACHE_DIR = '.hvi_cache'
+# Every cached file stores the wards pre-projected in both CRSs we use
+GEOMETRY_COLUMNS = {4326: 'geometry', 3857: 'geometry_3857'}
+
+_source_hashes = {}
+_loaded = {}
+_arrays = {}
+
+
+class CachedCRS(namedtuple('CachedCRS', ['epsg'])):
+    """CRS of a cached geometry column, described without importing pyproj"""
+    __slots__ = ()
+
+    @property
+    def is_geographic(self):
+        return self.epsg == 4326
+
+    def __str__(self):
+        return f"EPSG:{self.epsg}"
+
+
+class WardArrays:
+    """Ward columns as numpy arrays and geometries as a shapely array.
+
+    What the map code reads of a GeoDataFrame -- ``wards[column]``,
+    ``columns``, ``geometry``, ``crs`` and ``total_bounds`` -- read from the
+    GeoParquet cache without pandas, geopandas or pyproj.
+    """
+
+    def __init__(self, data, geometry, crs):
+        self._data = data
+        self.geometry = geometry
+        self.crs = crs
+
+    def __len__(self):
+        return len(self.geometry)
+
+    def __getitem__(self, column):
+        return self._data[column]
+
+    @property
+    def columns(self):
+        return list(self._data)
+
+    @property
+    def total_bounds(self):
+        return shapely.total_bounds(self.geometry)
+
+
+def source_hash(path):
+    """SHA-256 of a source file, memoised on its size and modification time"""
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if stamp not in _source_hashes:
+        with open(path, 'rb') as f:
+            _source_hashes[stamp] = hashlib.sha256(f.read()).hexdigest()
+    return _source_hashes[stamp]
+
+
+def cache_path(source=WARD_SOURCE):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{source_hash(source)[:16]}.parquet")
+
+
+def build_cache(source=WARD_SOURCE):
+    """Convert the GeoJSON once into GeoParquet with 4326 and 3857 geometry columns"""
+    path = cache_path(source)
+    if os.path.exists(path):
+        return path
+
+    import geopandas as gpd
+    gdf = gpd.read_file(source).to_crs(epsg=4326)
+    gdf[GEOMETRY_COLUMNS[3857]] = gdf.geometry.to_crs(epsg=3857)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-*.parquet")):
+        os.remove(stale)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    gdf.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_wards(columns=None, crs=4326, source=WARD_SOURCE):
+    """Load the ward dataset with only the requested attribute columns.
+
+    The GeoJSON is parsed once into a GeoParquet cache (rebuilt when the
+    source file's hash changes). Reads pull just ``columns`` plus the
+    geometry already projected to ``crs`` (4326 or 3857), so no script has
+    to reproject. Returns a fresh copy the caller may modify.
+    """
+    if crs not in GEOMETRY_COLUMNS:
+        raise ValueError(f"Wards are cached in EPSG:4326 and EPSG:3857, not {crs}")
+    key = (source_hash(source), None if columns is None else tuple(columns), crs)
+
+    if key not in _loaded:
+        import geopandas as gpd
+        if pq is None:
+            # Without pyarrow fall back to parsing the GeoJSON directly
+            gdf = gpd.read_file(source).to_crs(epsg=crs)
+            if columns is not None:
+                gdf = gdf[list(columns) + ['geometry']]
+        else:
+            geometry_column = GEOMETRY_COLUMNS[crs]
+            path = build_cache(source)
+            if columns is None:
+                columns = [name for name in pq.read_schema(path).names
+                           if name not in GEOMETRY_COLUMNS.values()]
+            table = pq.read_table(path, columns=list(columns) + [geometry_column])
+            frame = table.to_pandas()
+            geometry = shapely.from_wkb(frame.pop(geometry_column).to_numpy())
+            gdf = gpd.GeoDataFrame(frame, geometry=geometry, crs=f"EPSG:{crs}")
+        _loaded[key] = gdf
+
+    return _loaded[key].copy()
+
+
+def column_array(column):
+    """A pyarrow column as a numpy array (NaN for nulls in numeric columns).
+
+    Goes through Python lists: pyarrow's own ``to_numpy`` imports pandas.
+    """
+    values = column.to_pylist()
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) \
+            or pa.types.is_boolean(column.type):
+        return np.array(values, dtype=float if column.null_count else None)
+    return np.array(values, dtype=object)
+
+
+def load_ward_arrays(columns=None, crs=4326, source=WARD_SOURCE):
+    """Load wards for drawing as WardArrays, skipping pandas and geopandas.
+
+    Reads the same GeoParquet cache as ``load_wards``, which is what keeps
+    map start-up short. Without pyarrow this falls back to ``load_wards``,
+    whose GeoDataFrame the map code takes just the same.
+    """
+    if pq is None:
+        return load_wards(columns, crs, source)
+    if crs not in GEOMETRY_COLUMNS:
+        raise ValueError(f"Wards are cached in EPSG:4326 and EPSG:3857, not {crs}")
+    key = (source_hash(source), None if columns is None else tuple(columns), crs)
+
+    if key not in _arrays:
+        geometry_column = GEOMETRY_COLUMNS[crs]
+        # ParquetFile reads without pyarrow.dataset, which would import pandas
+        parquet = pq.ParquetFile(build_cache(source))
+        if columns is None:
+            columns = [name for name in parquet.schema_arrow.names
+                       if name not in GEOMETRY_COLUMNS.values() and not name.startswith('__')]
+        table = parquet.read(columns=list(columns) + [geometry_column])
+        data = {name: column_array(table.column(name)) for name in columns}
+        geometry = shapely.from_wkb(column_array(table.column(geometry_column)))
+        _arrays[key] = (data, geometry)
+
+    data, geometry = _arrays[key]
+    return WardArrays({name: values.copy() for name, values in data.items()}, geometry.copy(),
+                      CachedCRS(crs))
@@ -0,0 +1,192 @@
+import hashlib
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+import shapely
+from matplotlib import colormaps
+from matplotlib.collections import PathCollection
+from matplotlib.colors import Normalize
+from matplotlib.path import Path
+
+# Prepared layers kept per process, keyed by geometry and CRS
+LAYER_MEMO_SIZE = 8
+
+_layers = OrderedDict()
+_closes_rings = None
+
+
+def geopandas_closes_rings():
+    """Whether the installed geopandas ends polygon rings with CLOSEPOLY.
+
+    geopandas 1.1 and later build ring paths with ``closed=True``; older
+    releases leave them open, which changes the line joins where a ring
+    starts. Read from the installed version, so drawing does not import
+    geopandas.
+    """
+    global _closes_rings
+    if _closes_rings is None:
+        try:
+            release = tuple(int(part) for part in version('geopandas').split('.')[:2])
+        except (PackageNotFoundError, ValueError):
+            release = (1, 1)
+        _closes_rings = release >= (1, 1)
+    return _closes_rings
+
+
+def ward_paths(geometries, closed=None):
+    """One compound matplotlib Path per (Multi)Polygon, holes included.
+
+    Built in a single vectorised pass over all rings instead of one
+    shapely-to-patch conversion per ward. Ring order matches geopandas'
+    polygon patches, and rings end in CLOSEPOLY only when the installed
+    geopandas closes them too (or ``closed`` says so), so maps render the
+    same.
+    """
+    closed = geopandas_closes_rings() if closed is None else closed
+    geometries = np.asarray(geometries, dtype=object)
+    parts, part_ward = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, vertex_ring = shapely.get_coordinates(rings, return_index=True)
+
+    # Each ring starts with MOVETO and ends on its repeated first vertex
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    ring_starts = np.flatnonzero(np.r_[True, np.diff(vertex_ring) != 0])
+    codes[ring_starts] = Path.MOVETO
+    if closed:
+        codes[np.r_[ring_starts[1:], len(coords)] - 1] = Path.CLOSEPOLY
+
+    vertex_ward = part_ward[ring_part[vertex_ring]]
+    bounds = np.searchsorted(vertex_ward, np.arange(len(geometries) + 1))
+    return [Path(coords[start:end], codes[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class WardCollection(PathCollection):
+    """The wards as drawn on one axes, recoloured in place.
+
+    Holds the per-axes state (the collection itself and which wards are
+    shown); the paths come from the shared ``WardLayer`` and are never
+    modified. ``set_values`` swaps the value array, colormap and
+    normalisation, so rendering another indicator, year or scenario on the
+    same axes costs only a colour update.
+    """
+
+    def __init__(self, layer, **style):
+        super().__init__(layer.paths, **style)
+        self.layer = layer
+        self.visible = np.ones(len(layer), dtype=bool)
+
+    def set_values(self, values, cmap=None, norm=None):
+        """Recolour the wards (colour bars follow along)"""
+        values = np.asarray(values, dtype=float)
+        if values.shape != (len(self.layer),):
+            raise ValueError(f"Expected {len(self.layer)} values, got {values.shape}")
+
+        if cmap is not None:
+            self.set_cmap(colormaps[cmap] if isinstance(cmap, str) else cmap)
+        if norm is None:
+            norm = Normalize(vmin=np.nanmin(values), vmax=np.nanmax(values))
+        self.set_norm(norm)
+        # NaN wards are dropped from the collection, as GeoDataFrame.plot leaves them out
+        visible = ~np.isnan(values)
+        if not np.array_equal(visible, self.visible):
+            self.set_paths([path for path, shown in zip(self.layer.paths, visible) if shown])
+            self.visible = visible
+        self.set_array(values[visible])
+        return self
+
+    def add_colorbar(self, ax, label=None, **legend_kwds):
+        """Colour bar tied to this collection, so later recolours update it"""
+        if label is not None:
+            legend_kwds = dict(legend_kwds, label=label)
+        return ax.figure.colorbar(self, ax=ax, **legend_kwds)
+
+
+class WardLayer:
+    """Ward polygons prepared once, drawn on any number of axes.
+
+    The geometry-to-path conversion happens when the layer is built, and
+    the paths and bounds are never changed afterwards, so one memoised
+    layer can serve every figure. Each ``draw`` creates its own
+    ``WardCollection`` around the shared paths.
+    """
+
+    def __init__(self, geometries, crs=None):
+        geometries = np.asarray(geometries, dtype=object)
+        self.paths = ward_paths(geometries)
+        self.crs = crs
+        self.bounds = shapely.total_bounds(geometries)
+        self.ward_bounds = shapely.bounds(geometries)
+
+    @classmethod
+    def from_gdf(cls, gdf):
+        return cls(np.asarray(gdf.geometry), crs=gdf.crs)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def set_aspect(self, ax):
+        """Same aspect rule as GeoDataFrame.plot"""
+        if self.crs is not None and self.crs.is_geographic:
+            ax.set_aspect(1 / np.cos(np.mean(self.bounds[[1, 3]]) * np.pi / 180))
+        else:
+            ax.set_aspect('equal')
+
+    def draw(self, ax, values=None, cmap=None, norm=None, **style):
+        """Add the wards to ``ax`` and return their new ``WardCollection``.
+
+        ``style`` takes collection keywords such as ``alpha``, ``facecolor``
+        or ``edgecolor``. Wards whose value is NaN are left out, and the
+        axis limits cover only the wards drawn, as GeoDataFrame.plot does.
+        """
+        collection = WardCollection(self, **style)
+        if values is not None:
+            collection.set_values(values, cmap=cmap, norm=norm)
+
+        self.set_aspect(ax)
+        ax.add_collection(collection, autolim=False)
+        if collection.visible.all():
+            minx, miny, maxx, maxy = self.bounds
+        else:
+            bounds = self.ward_bounds[collection.visible]
+            minx, miny = bounds[:, :2].min(axis=0) if len(bounds) else self.bounds[:2]
+            maxx, maxy = bounds[:, 2:].max(axis=0) if len(bounds) else self.bounds[2:]
+        ax.update_datalim([(minx, miny), (maxx, maxy)])
+        ax.autoscale_view()
+        return collection
+
+
+def geometry_key(gdf):
+    digest = hashlib.sha256(str(gdf.crs).encode('utf-8'))
+    digest.update(b''.join(shapely.to_wkb(np.asarray(gdf.geometry))))
+    return digest.hexdigest()
+
+
+def ward_layer(gdf):
+    """The prepared WardLayer for a frame's geometry, built once per projection.
+
+    Frames that share geometry and CRS (the same wards with different
+    attribute columns) get the same layer. It holds only the immutable
+    paths and bounds; each ``draw`` creates a new, cheap collection for its
+    axes, so figures drawn from the same layer never affect each other.
+    """
+    key = geometry_key(gdf)
+    if key in _layers:
+        _layers.move_to_end(key)
+        return _layers[key]
+
+    layer = WardLayer.from_gdf(gdf)
+    _layers[key] = layer
+    while len(_layers) > LAYER_MEMO_SIZE:
+        _layers.popitem(last=False)
+    return layer
+
+
+def plot_column(gdf, column, ax, cmap=None, legend=False, legend_kwds=None, **style):
+    """Draw one column of ``gdf`` like ``gdf.plot(column=...)`` from the prepared layer"""
+    collection = ward_layer(gdf).draw(ax, np.asarray(gdf[column], dtype=float), cmap=cmap,
+                                      **style)
+    if legend:
+        collection.add_colorbar(ax, **(legend_kwds or {}))
+    return collection
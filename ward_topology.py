@@ -0,0 +1,279 @@
+import json
+import math
+
+import numpy as np
+import shapely
+
+# Grid steps across the ward extent; 1e5 keeps vertices within a metre in Gauteng
+QUANTIZATION = 100000
+# Decimal places kept for float attributes sent to the browser
+PROPERTY_DIGITS = 4
+# Times simplify_shared halves the tolerance of arcs that cross another
+# before keeping them as they are
+SIMPLIFY_PASSES = 4
+
+
+def quantization_transform(geometries, quantization=QUANTIZATION):
+    """TopoJSON transform mapping an integer grid of ``quantization`` steps onto the extent"""
+    x0, y0, x1, y1 = shapely.total_bounds(np.asarray(geometries, dtype=object))
+    return {
+        'scale': [(x1 - x0) / (quantization - 1) or 1.0, (y1 - y0) / (quantization - 1) or 1.0],
+        'translate': [x0, y0],
+    }
+
+
+def quantize_rings(geometries, transform):
+    """Quantized integer rings per polygon part, as nested lists [ward][part][ring].
+
+    Consecutive vertices that land on the same grid cell are merged; rings
+    are returned open (without the repeated closing vertex).
+    """
+    (kx, ky), (x0, y0) = transform['scale'], transform['translate']
+    wards = []
+    for geometry in geometries:
+        polygons = []
+        for polygon in shapely.get_parts(geometry):
+            rings = []
+            for ring in shapely.get_rings(polygon):
+                coords = shapely.get_coordinates(ring)
+                q = np.column_stack([np.round((coords[:, 0] - x0) / kx),
+                                     np.round((coords[:, 1] - y0) / ky)]).astype(np.int64)
+                keep = np.r_[True, np.any(np.diff(q, axis=0) != 0, axis=1)]
+                q = q[keep]
+                if len(q) > 1 and (q[0] == q[-1]).all():
+                    q = q[:-1]
+                if len(q) >= 3:
+                    rings.append([tuple(point) for point in q.tolist()])
+            if rings:
+                polygons.append(rings)
+        wards.append(polygons)
+    return wards
+
+
+def find_junctions(wards):
+    """Vertices where shared boundaries start or end.
+
+    A vertex is a junction when it is reached from different neighbouring
+    vertices in different rings, i.e. where two wards stop sharing an edge.
+    """
+    neighbours = {}
+    junctions = set()
+    for polygons in wards:
+        for rings in polygons:
+            for ring in rings:
+                n = len(ring)
+                for i, point in enumerate(ring):
+                    a, b = ring[i - 1], ring[(i + 1) % n]
+                    pair = (a, b) if a <= b else (b, a)
+                    seen = neighbours.setdefault(point, pair)
+                    if seen != pair:
+                        junctions.add(point)
+    return junctions
+
+
+def _closed_ring_key(ring):
+    """Rotation-independent key for a ring with no junctions"""
+    start = ring.index(min(ring))
+    rotated = ring[start:] + ring[:start]
+    return tuple(rotated + rotated[:1])
+
+
+class ArcIndex:
+    """Deduplicated arcs; a shared boundary is stored once and referenced twice"""
+
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def add(self, arc, reverse_key=None):
+        key = tuple(arc)
+        if key in self.index:
+            return self.index[key]
+        reverse_key = tuple(reversed(arc)) if reverse_key is None else reverse_key
+        if reverse_key in self.index:
+            return ~self.index[reverse_key]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(key)
+        return self.index[key]
+
+    def ring_arcs(self, ring, junctions):
+        """Split an open ring at its junctions and return the arc references"""
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            key = _closed_ring_key(ring)
+            return [self.add(list(key), reverse_key=_closed_ring_key(ring[::-1]))]
+
+        ring = ring[cuts[0]:] + ring[:cuts[0]]
+        cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+        closed = ring + ring[:1]
+        return [self.add(closed[start:end + 1]) for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+def arc_coordinates(arc, transform):
+    """Coordinates of a quantized arc in the units of the original geometries"""
+    (kx, ky), (x0, y0) = transform['scale'], transform['translate']
+    points = np.asarray(arc, dtype=float)
+    return np.column_stack([x0 + points[:, 0] * kx, y0 + points[:, 1] * ky])
+
+
+def _drop_repeats(coords):
+    return coords[np.r_[True, np.any(np.diff(coords, axis=0) != 0, axis=1)]]
+
+
+def _round_lines(lines, digits):
+    """Vertices of each line, rounded to ``digits`` decimals, without repeated points"""
+    arcs = []
+    for line in lines:
+        coords = shapely.get_coordinates(line)
+        if digits is not None:
+            coords = np.round(coords, digits)
+        arcs.append(_drop_repeats(coords))
+    return arcs
+
+
+def crossing_arcs(arcs):
+    """Mask of arcs that cross themselves or touch another arc anywhere but at shared end points"""
+    lines = np.array([shapely.linestrings(arc if len(arc) > 1 else np.vstack([arc, arc]))
+                      for arc in arcs], dtype=object)
+    bad = ~shapely.is_simple(lines)
+    ends = [{tuple(arc[0]), tuple(arc[-1])} for arc in arcs]
+    first, second = shapely.STRtree(lines).query(lines, predicate='intersects')
+    for i, j in zip(first, second):
+        if i >= j or (bad[i] and bad[j]):
+            continue
+        meeting = shapely.intersection(lines[i], lines[j])
+        points = {tuple(point) for point in shapely.get_coordinates(meeting)}
+        if shapely.get_type_id(meeting) not in (0, 4) or not points <= (ends[i] & ends[j]):
+            bad[i] = bad[j] = True
+    return bad
+
+
+def simplify_shared(geometries, tolerance, digits=None, quantization=QUANTIZATION):
+    """Simplify polygons along the boundaries they share, so neighbours still meet.
+
+    Simplifying each ward on its own moves the two copies of a shared edge
+    differently and leaves gaps and overlaps between neighbours. Here the
+    rings are split into arcs as in ``encode_topology``, each arc is
+    simplified once (Douglas-Peucker, its end points fixed) at ``tolerance``
+    and rounded to ``digits`` decimals, and every ring is rebuilt from the
+    shared arcs. Arcs that would cross another are simplified less. Holes
+    that collapse are dropped; a ward whose outer rings all collapse keeps
+    its original geometry.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    transform = quantization_transform(geometries, quantization)
+    wards = quantize_rings(geometries, transform)
+    junctions = find_junctions(wards)
+    arc_index = ArcIndex()
+    references = [[[arc_index.ring_arcs(ring, junctions) for ring in rings] for rings in polygons]
+                  for polygons in wards]
+
+    # Arcs simplified apart can cross each other; those are simplified
+    # again at half the tolerance, and kept unsimplified as a last resort
+    lines = np.array([shapely.linestrings(arc_coordinates(arc, transform))
+                      for arc in arc_index.arcs], dtype=object)
+    tolerances = np.full(len(lines), float(tolerance))
+    arcs = _round_lines(shapely.simplify(lines, tolerances), digits)
+    for _ in range(SIMPLIFY_PASSES):
+        bad = crossing_arcs(arcs)
+        if not bad.any():
+            break
+        tolerances[bad] /= 2
+        simplified = _round_lines(shapely.simplify(lines[bad], tolerances[bad]), digits)
+        for i, arc in zip(np.flatnonzero(bad), simplified):
+            arcs[i] = arc
+    else:
+        bad = crossing_arcs(arcs)
+        for i, arc in zip(np.flatnonzero(bad), _round_lines(lines[bad], digits)):
+            arcs[i] = arc
+
+    simplified = []
+    for geometry, polygons in zip(geometries, references):
+        parts = []
+        for rings in polygons:
+            coords = []
+            for ring in rings:
+                pieces = [arcs[ref] if ref >= 0 else arcs[~ref][::-1] for ref in ring]
+                ring_coords = _drop_repeats(np.vstack([pieces[0]] + [piece[1:] for piece in pieces[1:]]))
+                coords.append(ring_coords if len(ring_coords) >= 4 else None)
+            if coords and coords[0] is not None:
+                parts.append(shapely.Polygon(coords[0], [hole for hole in coords[1:] if hole is not None]))
+        if not parts:
+            simplified.append(geometry)
+            continue
+        polygon = parts[0] if len(parts) == 1 else shapely.MultiPolygon(parts)
+        if not polygon.is_valid:
+            # Repairs self-intersections without moving any boundary
+            polygon = shapely.make_valid(polygon, method='structure', keep_collapsed=False)
+        simplified.append(geometry if polygon.is_empty else polygon)
+    return np.array(simplified, dtype=object)
+
+
+def delta_encode(arc):
+    points = np.asarray(arc, dtype=np.int64)
+    return np.vstack([points[:1], np.diff(points, axis=0)]).tolist()
+
+
+def clean_property(value, digits=PROPERTY_DIGITS):
+    """JSON-safe attribute value, with floats rounded and NaN sent as null"""
+    if isinstance(value, (np.integer, int)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        value = round(float(value), digits)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+def encode_topology(gdf, id_column='WardID_', properties=(), quantization=QUANTIZATION,
+                    digits=PROPERTY_DIGITS, object_name='wards'):
+    """Encode ward polygons as a quantized TopoJSON topology.
+
+    Coordinates are snapped to an integer grid of ``quantization`` steps
+    across the extent and stored as delta-encoded arcs. Boundaries shared
+    by neighbouring wards are stored once, so every ward edge is sent a
+    single time. Each geometry object, in row order, carries the
+    ``id_column`` value as its id and only the requested ``properties``,
+    with floats rounded to ``digits`` decimals.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+
+    geometries = gdf.geometry.values
+    transform = quantization_transform(geometries, quantization)
+
+    wards = quantize_rings(geometries, transform)
+    junctions = find_junctions(wards)
+    arc_index = ArcIndex()
+
+    ids = gdf[id_column].tolist() if id_column in gdf.columns else gdf.index.tolist()
+    properties = list(dict.fromkeys(properties))
+    records = gdf[properties].to_dict(orient='records') if properties else [{}] * len(gdf)
+    objects = []
+    for polygons, feature_id, record in zip(wards, ids, records):
+        # Empty wards stay as null geometries so objects line up with rows
+        geometry = {'type': None}
+        if polygons:
+            arcs = [[arc_index.ring_arcs(ring, junctions) for ring in rings] for rings in polygons]
+            geometry = {'type': 'Polygon' if len(arcs) == 1 else 'MultiPolygon',
+                        'arcs': arcs[0] if len(arcs) == 1 else arcs}
+        geometry['id'] = clean_property(feature_id, digits)
+        if record:
+            geometry['properties'] = {key: clean_property(value, digits)
+                                      for key, value in record.items()}
+        objects.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': transform,
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': objects}},
+        'arcs': [delta_encode(arc) for arc in arc_index.arcs],
+    }
+
+
+def topology_size(topology):
+    """Size in bytes of the topology as embedded in a page"""
+    return len(json.dumps(topology, separators=(',', ':')).encode('utf-8'))
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+from rasterio import features
+
+from raster_io import WindowedRaster
+
+DEFAULT_STATS = ('mean', 'sum', 'count', 'min', 'max')
+
+
+def rasterize_labels(geometries, out_shape, transform):
+    """Burn 1-based polygon labels into a grid aligned with a raster window.
+
+    Pixel 0 means "outside every polygon". Labels follow the order of
+    ``geometries``, so label ``k`` belongs to ``geometries[k - 1]``. An
+    empty window (polygons entirely off the raster) gives an empty grid.
+    """
+    shapes = ((geom, label) for label, geom in enumerate(geometries, start=1)
+              if geom is not None and not geom.is_empty)
+    dtype = 'uint16' if len(geometries) < np.iinfo(np.uint16).max else 'uint32'
+    if 0 in out_shape:
+        return np.zeros(out_shape, dtype=dtype)
+    return features.rasterize(shapes,
+                              out_shape=out_shape,
+                              transform=transform,
+                              fill=0,
+                              all_touched=False,
+                              dtype=dtype)
+
+
+def valid_mask(data, nodata):
+    """Return a boolean mask of pixels that hold real values"""
+    mask = np.isfinite(data) if np.issubdtype(data.dtype, np.floating) \
+        else np.ones(data.shape, dtype=bool)
+    if nodata is not None and not np.isnan(nodata):
+        mask &= data != nodata
+    return mask
+
+
+def grouped_statistics(labels, values, n_labels, stats=DEFAULT_STATS, percentiles=()):
+    """Compute per-label statistics for flat label/value arrays in one pass.
+
+    ``labels`` are 1-based (0 is ignored) and ``values`` must already be
+    restricted to valid pixels. Returns a dict of arrays of length
+    ``n_labels``; labels without pixels get NaN (and 0 for ``count``).
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    inside = labels > 0
+    labels, values = labels[inside], values[inside]
+
+    counts = np.bincount(labels, minlength=n_labels + 1)[1:]
+    has_data = counts > 0
+    result = {}
+
+    if 'count' in stats:
+        result['count'] = counts
+    if 'sum' in stats or 'mean' in stats:
+        sums = np.bincount(labels, weights=values, minlength=n_labels + 1)[1:]
+        if 'sum' in stats:
+            result['sum'] = np.where(has_data, sums, np.nan)
+        if 'mean' in stats:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result['mean'] = np.where(has_data, sums / counts, np.nan)
+
+    order_stats = {'min', 'max'} & set(stats)
+    if order_stats or len(percentiles):
+        if not len(values):
+            for name in sorted(order_stats) + [f'p{q:g}' for q in percentiles]:
+                result[name] = np.full(n_labels, np.nan)
+            return result
+
+        # One sort by (label, value) gives min, max and every percentile
+        sorted_values = values[np.lexsort((values, labels))]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        starts = np.minimum(starts, len(sorted_values) - 1)
+        last = np.minimum(starts + np.maximum(counts - 1, 0), len(sorted_values) - 1)
+
+        if 'min' in order_stats:
+            result['min'] = np.where(has_data, sorted_values[starts], np.nan)
+        if 'max' in order_stats:
+            result['max'] = np.where(has_data, sorted_values[last], np.nan)
+
+        for q in percentiles:
+            # Linear interpolation, matching numpy.percentile's default method
+            position = starts + (q / 100.0) * np.maximum(counts - 1, 0)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, last)
+            fraction = position - lower
+            value = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+            result[f'p{q:g}'] = np.where(has_data, value, np.nan)
+
+    return result
+
+
+def zonal_statistics(gdf, raster_path, stats=DEFAULT_STATS, percentiles=(),
+                     id_column='WardID_', band=1, nodata=None):
+    """Compute zonal statistics for every polygon with a single raster read.
+
+    The polygons are burned into a label grid covering their combined
+    bounds, so each raster is read (block by block, see ``raster_io``) and
+    labelled once no matter how many wards there are. Pixels equal to the
+    raster's nodata value (or the ``nodata`` override) and non-finite
+    pixels are ignored.
+
+    Returns a DataFrame indexed by ``id_column`` with one column per statistic
+    (percentiles are named ``p50``, ``p90`` ...). Wards without valid pixels,
+    including wards off the raster, get NaN statistics and a count of 0.
+    """
+    with WindowedRaster(raster_path, band=band) as src:
+        if gdf.crs is not None and src.crs is not None and gdf.crs != src.crs:
+            gdf = gdf.to_crs(src.crs)
+        if nodata is None:
+            nodata = src.nodata
+        # Only the blocks under the wards are read, not the national raster
+        data, transform = src.read_bounds(gdf.total_bounds)
+
+    labels = rasterize_labels(list(gdf.geometry), data.shape, transform)
+    keep = valid_mask(data, nodata) & (labels > 0)
+    result = grouped_statistics(labels[keep], data[keep], len(gdf),
+                                stats=stats, percentiles=percentiles)
+
+    index = gdf[id_column] if id_column in gdf.columns else gdf.index
+    return pd.DataFrame(result, index=pd.Index(index, name=id_column))